@@ -0,0 +1,130 @@
+"""
+生成用于性能测试的合成工作簿
+
+标准值是类似零件号的编码 (如 AB1234-X5)，待匹配列从标准值中按重复率抽取，
+再按比例加入拼写错误、大小写、分隔符和缺失数字等噪声。
+
+用法:
+    python -m benchmarks.generate out.xlsx --rows 100000 --columns 3
+"""
+
+import argparse
+import random
+import string
+import pandas as pd
+
+# 标准列的列名，待匹配列依次命名为 列1、列2 ...
+REFERENCE_COLUMN = "标准型号"
+
+# 默认的噪声比例 (每种扰动独立发生)
+DEFAULT_NOISE = {
+    "typo": 0.05,  # 替换一个字符
+    "case": 0.2,  # 改变大小写
+    "separator": 0.2,  # 替换或删除分隔符
+    "missing_digit": 0.05,  # 删除一个数字
+}
+
+
+def make_codes(count, rng):
+    """生成 count 个不重复的零件号编码"""
+    codes = {}
+    while len(codes) < count:
+        letters = "".join(rng.choices(string.ascii_uppercase, k=rng.randint(2, 3)))
+        digits = "".join(rng.choices(string.digits, k=rng.randint(3, 5)))
+        suffix = rng.choice(string.ascii_uppercase) + rng.choice(string.digits)
+        codes[f"{letters}{digits}-{suffix}"] = None
+    return list(codes)
+
+
+def perturb(code, noise, rng):
+    """按噪声比例对编码施加扰动"""
+    value = code
+    if rng.random() < noise.get("separator", 0):
+        value = value.replace("-", rng.choice(["", " ", "_", "/"]))
+    if rng.random() < noise.get("case", 0):
+        value = rng.choice([value.lower(), value.title(), f" {value} "])
+    if rng.random() < noise.get("missing_digit", 0):
+        positions = [i for i, char in enumerate(value) if char.isdigit()]
+        if positions:
+            i = rng.choice(positions)
+            value = value[:i] + value[i + 1 :]
+    if rng.random() < noise.get("typo", 0) and value.strip():
+        i = rng.randrange(len(value))
+        value = value[:i] + rng.choice(string.ascii_uppercase) + value[i + 1 :]
+    return value
+
+
+def generate_frame(rows, columns=1, duplication=0.9, noise=None, seed=0):
+    """
+    生成合成数据表
+
+    Args:
+        rows: 行数
+        columns: 待匹配列数
+        duplication: 重复率，标准值个数约为 rows * (1 - duplication)
+        noise: 各种噪声的比例，默认 DEFAULT_NOISE
+        seed: 随机种子，相同参数生成的数据完全相同
+
+    Returns:
+        DataFrame，第一列为标准列，其余为待匹配列
+    """
+    rng = random.Random(seed)
+    noise = DEFAULT_NOISE if noise is None else noise
+    standards = make_codes(max(1, int(rows * (1 - duplication))), rng)
+
+    data = {REFERENCE_COLUMN: [standards[i % len(standards)] for i in range(rows)]}
+    for index in range(1, columns + 1):
+        data[f"列{index}"] = [
+            perturb(rng.choice(standards), noise, rng) for _ in range(rows)
+        ]
+    return pd.DataFrame(data)
+
+
+def generate_workbook(path, rows, columns=1, duplication=0.9, noise=None, seed=0):
+    """生成合成工作簿并写入 path (.xlsx 或 .csv)，返回数据表"""
+    df = generate_frame(rows, columns, duplication, noise, seed)
+    if path.lower().endswith(".csv"):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+    return df
+
+
+def add_arguments(parser):
+    """生成参数，run.py 复用同一组参数"""
+    parser.add_argument("--rows", type=int, default=100_000, help="行数")
+    parser.add_argument("--columns", type=int, default=2, help="待匹配列数")
+    parser.add_argument(
+        "--duplication", type=float, default=0.9, help="重复率 (0-1)，默认 0.9"
+    )
+    for name, rate in DEFAULT_NOISE.items():
+        parser.add_argument(
+            f"--{name.replace('_', '-')}",
+            type=float,
+            default=rate,
+            help=f"{name} 噪声比例，默认 {rate}",
+        )
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+
+
+def noise_from_args(args):
+    return {name: getattr(args, name) for name in DEFAULT_NOISE}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成性能测试用的合成工作簿")
+    parser.add_argument("path", help="输出文件路径 (.xlsx 或 .csv)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    generate_workbook(
+        args.path,
+        args.rows,
+        args.columns,
+        args.duplication,
+        noise_from_args(args),
+        args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
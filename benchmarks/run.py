@@ -0,0 +1,299 @@
+"""
+匹配和读写路径的性能测试，结果以 JSON 输出，便于在不同提交之间比较
+
+每个阶段记录耗时、吞吐量 (每秒处理的行数或值数) 和峰值内存 (RSS)。
+数据库和文件都放在临时目录中，不影响开发环境的数据。
+
+用法:
+    python -m benchmarks.run --rows 100000 --columns 2 --output result.json
+    python -m benchmarks.run --input data.xlsx --reference-column 型号 --match-columns 规格
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from . import generate
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(workdir):
+    """初始化 Django，数据库和媒体目录指向临时目录"""
+    sys.path.insert(0, REPO_ROOT)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "web_django.settings")
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = os.path.join(workdir, "db.sqlite3")
+    settings.MEDIA_ROOT = os.path.join(workdir, "media")
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+
+def reset_peak_rss():
+    """重置本进程的峰值 RSS (仅 Linux 支持)，返回是否成功"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """本进程的峰值 RSS (MB)：优先读取 /proc 中可重置的 VmHWM"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # ru_maxrss 在 Linux 上单位为 KB，在 macOS 上为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Recorder:
+    """记录各阶段的耗时、吞吐量和峰值内存"""
+
+    def __init__(self):
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name, items):
+        """
+        计时一个阶段
+
+        Args:
+            name: 阶段名称
+            items: 该阶段处理的行数或值数，用于计算吞吐量
+        """
+        per_phase = reset_peak_rss()
+        result = {}
+        start = time.perf_counter()
+        yield result
+        seconds = time.perf_counter() - start
+        result.update(
+            {
+                "seconds": round(seconds, 4),
+                "items": items,
+                "items_per_second": round(items / seconds, 1) if seconds else None,
+                "peak_rss_mb": peak_rss_mb(),
+                # 无法重置时峰值是进程启动以来的最大值
+                "peak_rss_scope": "phase" if per_phase else "process",
+            }
+        )
+        self.phases[name] = result
+        print(f"{name}: {seconds:.3f}s", file=sys.stderr)
+
+
+def run(args, workdir):
+    from django.conf import settings
+    from django.core.files import File
+    from excel_matcher.services.excel_service import ExcelService, FuzzyMatcher
+    from excel_matcher.services.upload_store import UploadStore
+
+    if args.blocking:
+        settings.EXCEL_MATCHER_BLOCKING = args.blocking
+
+    if args.input:
+        filepath = args.input
+        reference_column = args.reference_column
+        match_columns = args.match_columns
+    else:
+        filepath = os.path.join(workdir, "synthetic.xlsx")
+        start = time.perf_counter()
+        generate.generate_workbook(
+            filepath,
+            args.rows,
+            args.columns,
+            args.duplication,
+            generate.noise_from_args(args),
+            args.seed,
+        )
+        print(f"generate: {time.perf_counter() - start:.3f}s", file=sys.stderr)
+        reference_column = generate.REFERENCE_COLUMN
+        match_columns = [f"列{index}" for index in range(1, args.columns + 1)]
+
+    # 与 Web 上传一样保存到 (临时目录中的) 上传存储，只有上传的文件使用解析缓存
+    store = UploadStore()
+    with open(filepath, "rb") as f:
+        digest = store.save(File(f, name=os.path.basename(filepath)))
+    filepath = store.get_path(digest, filepath)
+
+    recorder = Recorder()
+    service = ExcelService()
+    summary = service.get_excel_summary(filepath)
+    rows = summary["row_estimate"] or 0
+    columns = [reference_column] + match_columns
+
+    with recorder.phase("get_excel_columns", 1):
+        service.get_excel_columns(filepath)
+
+    # 第一次预览包含解析工作簿的时间，第二次直接读取解析缓存
+    for name in ("preview_matches_cold", "preview_matches_warm"):
+        with recorder.phase(name, rows * len(match_columns)) as result:
+            service.preview_matches(
+                filepath,
+                columns,
+                args.threshold,
+                "REFERENCE",
+                reference_column,
+                time_budget=args.preview_time_budget,
+                sample_size=args.preview_sample_size,
+            )
+            result["stats"] = service.stats
+
+    df = service._read_dataframe(filepath, columns)
+    rows = len(df)
+    reference = df[reference_column]
+    values = df[match_columns[0]]
+
+    with recorder.phase("learn_patterns", rows):
+        FuzzyMatcher().learn_patterns(reference)
+
+    # match 逐个匹配去重后的值，match_many 批量匹配整列
+    unique_values = values.dropna().unique()
+    matcher = FuzzyMatcher(reference_values=reference.dropna().unique())
+    with recorder.phase("match", len(unique_values)) as result:
+        for value in unique_values:
+            matcher.match(value, args.threshold)
+        result["matcher_stats"] = dict(matcher.stats)
+
+    matcher = FuzzyMatcher(reference_values=reference.dropna().unique())
+    with recorder.phase("match_many", rows) as result:
+        matcher.match_many(values, args.threshold)
+        result["matcher_stats"] = dict(matcher.stats)
+
+    # 预览打分 (阈值为 0) 时各候选筛选方式的打分规模：
+    # brute_force_comparisons 为快速匹配未命中的值逐个与全部模式比较时的打分次数
+    for blocking in FuzzyMatcher.BLOCKING_STRATEGIES:
+        matcher = FuzzyMatcher(
+            reference_values=reference.dropna().unique(), blocking=blocking
+        )
+        with recorder.phase(f"score_many_{blocking}", len(unique_values)) as result:
+            matcher.score_many(unique_values)
+        pending = (
+            len(unique_values)
+            - matcher.stats["exact_hits"]
+            - matcher.stats["signature_hits"]
+        )
+        result["matcher_stats"] = dict(matcher.stats)
+        result["brute_force_comparisons"] = pending * len(matcher.patterns)
+
+    for mode in ("REFERENCE", "SELF_LEARNING"):
+        with recorder.phase(
+            f"process_excel_file_{mode.lower()}", rows * len(match_columns)
+        ) as result:
+            output = service.process_excel_file(
+                filepath, columns, args.threshold, mode, reference_column
+            )
+            result["stats"] = service.stats
+        os.remove(output)
+
+    return {
+        "config": {
+            "input": args.input,
+            "rows": rows,
+            "match_columns": len(match_columns),
+            "threshold": args.threshold,
+            "blocking": getattr(settings, "EXCEL_MATCHER_BLOCKING", "primary_key"),
+            "duplication": None if args.input else args.duplication,
+            "noise": None if args.input else generate.noise_from_args(args),
+            "seed": None if args.input else args.seed,
+            "file_size_bytes": os.path.getsize(filepath),
+        },
+        "environment": environment(),
+        "phases": recorder.phases,
+    }
+
+
+def environment():
+    """运行环境信息：提交、Python 和主要依赖的版本"""
+    import openpyxl
+    import pandas
+    import rapidfuzz
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pandas.__version__,
+        "openpyxl": openpyxl.__version__,
+        "rapidfuzz": rapidfuzz.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="匹配和读写路径的性能测试")
+    generate.add_arguments(parser)
+    parser.add_argument("--input", help="使用已有文件代替合成工作簿")
+    parser.add_argument("--reference-column", help="使用 --input 时的标准列")
+    parser.add_argument("--match-columns", nargs="+", help="使用 --input 时的待匹配列")
+    parser.add_argument("--threshold", type=int, default=80, help="匹配阈值")
+    parser.add_argument(
+        "--blocking",
+        choices=["primary_key", "qgram"],
+        help="模糊匹配的候选筛选方式，默认使用 EXCEL_MATCHER_BLOCKING",
+    )
+    parser.add_argument(
+        "--preview-time-budget",
+        type=float,
+        default=0,
+        help="预览的时间预算 (秒)，默认 0 表示不限制",
+    )
+    parser.add_argument(
+        "--preview-sample-size",
+        type=int,
+        default=0,
+        help="预览每列最多匹配的唯一值数，默认 0 表示不抽样",
+    )
+    parser.add_argument("--output", help="JSON 结果的写入路径，默认输出到标准输出")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录")
+    args = parser.parse_args()
+    if args.input and not (args.reference_column and args.match_columns):
+        parser.error("使用 --input 时需要指定 --reference-column 和 --match-columns")
+
+    workdir = tempfile.mkdtemp(prefix="excel_matcher_bench_")
+    try:
+        setup_django(workdir)
+        result = run(args, workdir)
+    finally:
+        if args.keep:
+            print(f"临时目录: {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
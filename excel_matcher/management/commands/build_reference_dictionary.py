@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from excel_matcher.services.excel_service import ExcelService
+
+
+class Command(BaseCommand):
+    help = (
+        "用标准值列表文件构建 (或重新构建) 命名参照词典，适合 Web 上传过慢的大型主数据"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", help="词典名称，已存在时重新构建")
+        parser.add_argument("file", help="标准值列表文件 (Excel/CSV/Parquet)")
+        parser.add_argument("--column", required=True, help="标准值所在的列")
+
+    def handle(self, *args, **options):
+        service = ExcelService()
+        try:
+            record = service.build_reference_dictionary(
+                options["name"], options["file"], options["column"]
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        timings = service.stats.get("timings", {})
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"参照词典 {record.name} 已构建：{record.standard_count} 个标准值，"
+                f"{record.pattern_count} 个模式 ({timings.get('total', 0)}s)"
+            )
+        )
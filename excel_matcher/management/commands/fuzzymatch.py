@@ -0,0 +1,351 @@
+import glob
+import json
+import multiprocessing
+import os
+import queue
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, wait
+from django.core.management.base import BaseCommand, CommandError
+from excel_matcher.services.excel_service import ExcelService, FuzzyMatcher
+from excel_matcher.services.worker_pool import create_pool, worker_count
+
+# 子进程上报进度的最小间隔 (秒)
+PROGRESS_INTERVAL = 1.0
+
+
+class Command(BaseCommand):
+    help = "批量处理文件 (不经过 Web 界面)，并发处理多个文件并输出 JSON 汇总"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "inputs",
+            nargs="+",
+            help="输入文件或通配符，如 'data/**/*.xlsx' (需加引号，支持 **)",
+        )
+        parser.add_argument(
+            "--columns",
+            nargs="+",
+            required=True,
+            help="需要模糊匹配的列名 (参照标准模式下包含标准列)",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=["SELF_LEARNING", "REFERENCE"],
+            default="SELF_LEARNING",
+            help="处理模式，默认自学习标准化",
+        )
+        parser.add_argument(
+            "--reference-column",
+            help="标准列名称，参照标准模式下必填 (使用 --reference-dictionary 时不需要)",
+        )
+        parser.add_argument(
+            "--reference-dictionary",
+            help="参照标准模式下使用的参照词典名称 (见 build_reference_dictionary)",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=int,
+            default=80,
+            help="模糊匹配阈值 (0-100)，默认 80",
+        )
+        parser.add_argument(
+            "--sheets",
+            nargs="+",
+            help="要处理的工作表名称，默认只处理第一个工作表；未选中的工作表原样保留",
+        )
+        parser.add_argument(
+            "--blocking",
+            choices=FuzzyMatcher.BLOCKING_STRATEGIES,
+            help="模糊匹配的候选筛选方式，默认使用 EXCEL_MATCHER_BLOCKING",
+        )
+        parser.add_argument(
+            "--output-format",
+            choices=ExcelService.OUTPUT_FORMATS,
+            default="xlsx",
+            help="输出格式，默认 xlsx",
+        )
+        parser.add_argument(
+            "--output-dir",
+            help="结果文件目录，默认与输入文件相同；按输入文件相对公共目录的路径保留目录结构",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="同时处理的文件数，默认使用全部 CPU 核心 (EXCEL_MATCHER_WORKERS)",
+        )
+        parser.add_argument(
+            "--summary",
+            help="JSON 汇总的写入路径，默认输出到标准输出",
+        )
+
+    def handle(self, *args, **options):
+        if (
+            options["mode"] == "REFERENCE"
+            and not options["reference_dictionary"]
+            and options["reference_column"] not in options["columns"]
+        ):
+            raise CommandError(
+                "参照标准匹配模式需要在 --columns 中包含 --reference-column，"
+                "或指定 --reference-dictionary"
+            )
+
+        if options["reference_dictionary"] and options["blocking"] == "qgram":
+            raise CommandError("参照词典只支持 primary_key 候选筛选")
+
+        files = expand_inputs(options["inputs"])
+        if not files:
+            raise CommandError("没有找到匹配的输入文件")
+        outputs = plan_outputs(files, options["output_dir"])
+        for directory, _ in outputs.values():
+            os.makedirs(directory, exist_ok=True)
+
+        task = {
+            "columns": options["columns"],
+            "threshold": options["threshold"],
+            "processing_mode": options["mode"],
+            "reference_column": options["reference_column"],
+            "reference_dictionary": options["reference_dictionary"],
+            "output_format": options["output_format"],
+            "sheets": options["sheets"],
+            "blocking": options["blocking"],
+        }
+        workers = min(options["workers"] or worker_count(), len(files))
+        self.stdout.write(f"共 {len(files)} 个文件，并发数 {workers}")
+
+        start = time.perf_counter()
+        if workers > 1:
+            results = self._run_in_pool(files, outputs, task, workers)
+        else:
+            results = self._run_inline(files, outputs, task)
+
+        summary = build_summary(results, time.perf_counter() - start)
+        text = json.dumps(summary, ensure_ascii=False, indent=2)
+        if options["summary"]:
+            with open(options["summary"], "w", encoding="utf-8") as f:
+                f.write(text)
+            self.stdout.write(f"汇总已写入 {options['summary']}")
+        else:
+            self.stdout.write(text)
+
+        failed = summary["total"]["failed"]
+        if failed:
+            raise CommandError(f"{failed} 个文件处理失败")
+
+    def _run_inline(self, files, outputs, task):
+        """单个文件或并发数为 1 时直接在本进程中处理"""
+        results = []
+        for index, filepath in enumerate(files, 1):
+            result = process_file(
+                filepath, outputs[filepath], task, _PrintReporter(self)
+            )
+            self._report_done(index, len(files), result)
+            results.append(result)
+        return results
+
+    def _run_in_pool(self, files, outputs, task, workers):
+        """
+        用进程池同时处理多个文件：子进程通过队列上报进度，
+        主进程在等待结果的间隙把进度输出到 stdout。
+        数据库的读写都在主进程中完成 (SQLite 不支持多个进程同时写入)：
+        自学习模式的已有模式预先加载后传给子进程，子进程返回学习到的模式，
+        由主进程逐个文件保存
+        """
+        # 文件之间已经并行，文件内不再启动进程池，避免进程数成倍超过 CPU 核心数
+        task = dict(task, single_process=True)
+        if task["processing_mode"] == "SELF_LEARNING":
+            task["patterns"] = {
+                column: FuzzyMatcher(column_name=column).patterns
+                for column in task["columns"]
+            }
+        results = []
+        with multiprocessing.Manager() as manager:
+            progress = manager.Queue()
+            with create_pool(workers) as executor:
+                pending = {
+                    executor.submit(
+                        process_file, filepath, outputs[filepath], task, progress
+                    )
+                    for filepath in files
+                }
+                while pending:
+                    done, pending = wait(
+                        pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED
+                    )
+                    self._drain_progress(progress)
+                    for future in done:
+                        result = future.result()
+                        save_learned_patterns(result.pop("patterns", {}))
+                        results.append(result)
+                        self._report_done(len(results), len(files), result)
+            self._drain_progress(progress)
+        # 汇总按输入顺序排列
+        order = {filepath: index for index, filepath in enumerate(files)}
+        return sorted(results, key=lambda result: order[result["input"]])
+
+    def _drain_progress(self, progress):
+        while True:
+            try:
+                filepath, percent, message = progress.get_nowait()
+            except queue.Empty:
+                return
+            self.stdout.write(f"[{percent:5.1f}%] {filepath}: {message}")
+
+    def _report_done(self, index, count, result):
+        if result["status"] == "success":
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"({index}/{count}) 完成 {result['input']} -> {result['output']} "
+                    f"({result['rows']} 行, {result['changed']} 处修改, {result['seconds']}s)"
+                )
+            )
+        else:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"({index}/{count}) 失败 {result['input']}: {result['error']}"
+                )
+            )
+
+
+class _PrintReporter:
+    """本进程处理时的进度输出，接口与进程间队列的 put 相同"""
+
+    def __init__(self, command):
+        self.command = command
+
+    def put(self, item):
+        filepath, percent, message = item
+        self.command.stdout.write(f"[{percent:5.1f}%] {filepath}: {message}")
+
+
+def expand_inputs(patterns):
+    """展开输入通配符，按绝对路径去重并保持顺序；跳过之前生成的处理结果文件"""
+    files = {}
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        for path in matches:
+            if os.path.isfile(path):
+                files.setdefault(os.path.abspath(path), path)
+    return [
+        path for path in files.values() if "_Processed." not in os.path.basename(path)
+    ]
+
+
+def plan_outputs(files, output_dir=None):
+    """
+    确定每个输入文件的输出位置，保证批量处理的结果不会互相覆盖
+
+    Args:
+        files: 输入文件路径列表 (已去重)
+        output_dir: 结果目录，为 None 时结果与输入文件放在同一目录；
+            指定时按输入文件相对公共目录的路径在其中保留目录结构
+
+    Returns:
+        {输入文件路径: (输出目录, 输出文件名 (不含 _Processed 后缀和扩展名))}；
+        同一目录下主文件名相同的输入 (如 report.xlsx 和 report.csv) 文件名加上原扩展名
+    """
+    paths = {filepath: os.path.abspath(filepath) for filepath in files}
+    if output_dir:
+        root = os.path.commonpath([os.path.dirname(path) for path in paths.values()])
+    locations = {}
+    for filepath, path in paths.items():
+        directory = os.path.dirname(path)
+        if output_dir:
+            directory = os.path.normpath(
+                os.path.join(output_dir, os.path.relpath(directory, root))
+            )
+        locations[filepath] = (directory, *os.path.splitext(os.path.basename(path)))
+
+    stems = Counter((directory, stem) for directory, stem, _ in locations.values())
+    outputs = {}
+    for filepath, (directory, stem, extension) in locations.items():
+        if stems[(directory, stem)] > 1:
+            stem = f"{stem}_{extension.lstrip('.')}"
+        outputs[filepath] = (directory, stem)
+    return outputs
+
+
+def save_learned_patterns(learned):
+    """在主进程中把子进程学习到的模式 {列名: 模式字典} 写入数据库 (只写入新增或变化的条目)"""
+    for column, patterns in learned.items():
+        matcher = FuzzyMatcher(column_name=column)
+        matcher.load_patterns(patterns)
+        matcher.save_patterns_to_db()
+
+
+def process_file(filepath, output, task, progress):
+    """
+    处理单个文件 (在子进程中执行)，返回该文件的结果摘要
+
+    Args:
+        filepath: 输入文件路径
+        output: (输出目录, 输出文件名)，见 plan_outputs
+        task: 处理参数 (列、模式、阈值、参照词典、工作表、候选筛选方式、输出格式)；
+            single_process 为真时文件内的多列匹配不再使用进程池；
+            patterns 为预加载的自学习模式，指定时不访问数据库，
+            学习到的模式在结果的 patterns 中返回
+        progress: 进度队列，写入 (文件路径, 百分比, 说明)
+    """
+    service = ExcelService(
+        workers=1 if task.get("single_process") else None,
+        blocking=task.get("blocking"),
+        patterns=task.get("patterns"),
+    )
+    service.processed_path, output_name = output
+    last_update = 0.0
+
+    def report(percent, message):
+        nonlocal last_update
+        now = time.monotonic()
+        if now - last_update < PROGRESS_INTERVAL:
+            return
+        last_update = now
+        progress.put((filepath, percent, message))
+
+    start = time.perf_counter()
+    result = {"input": filepath}
+    try:
+        result["output"] = service.process_excel_file(
+            filepath,
+            task["columns"],
+            task["threshold"],
+            task["processing_mode"],
+            task["reference_column"],
+            progress_callback=report,
+            output_format=task["output_format"],
+            sheets=task.get("sheets"),
+            reference_dictionary=task.get("reference_dictionary"),
+            output_name=output_name,
+        )
+        result["status"] = "success"
+        if task.get("patterns") is not None:
+            result["patterns"] = service.learned_patterns
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+
+    columns = service.stats.get("columns", {})
+    result["rows"] = max(
+        (stats.get("values", 0) for stats in columns.values()), default=0
+    )
+    result["changed"] = sum(stats.get("changed", 0) for stats in columns.values())
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    result["timings"] = service.stats.get("timings", {})
+    result["columns"] = columns
+    return result
+
+
+def build_summary(results, seconds):
+    """汇总所有文件的结果"""
+    succeeded = [result for result in results if result["status"] == "success"]
+    return {
+        "total": {
+            "files": len(results),
+            "succeeded": len(succeeded),
+            "failed": len(results) - len(succeeded),
+            "rows": sum(result["rows"] for result in succeeded),
+            "changed": sum(result["changed"] for result in succeeded),
+            "seconds": round(seconds, 3),
+        },
+        "files": results,
+    }
@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand
+from excel_matcher.services.job_runner import claim_next_job, recover_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "以数据库为队列执行后台匹配任务 (配合 EXCEL_JOB_RUNNER = 'worker' 使用)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="队列为空时的轮询间隔 (秒)",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="处理完当前队列中的任务后退出",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("匹配任务执行器已启动")
+        # 上次退出时中断的处理中任务标记为失败，等待中的任务由下面的循环领取
+        recover_jobs()
+        while True:
+            job_id = claim_next_job()
+            if job_id is None:
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+                continue
+
+            self.stdout.write(f"开始处理任务 {job_id}")
+            run_job(job_id, claimed=True)
+            self.stdout.write(f"任务 {job_id} 已结束")
@@ -0,0 +1,92 @@
+# Generated by Django 5.0.4 on 2026-10-18 00:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("excel_matcher", "0002_processedfile_processing_mode_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MatchJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "original_file",
+                    models.CharField(max_length=255, verbose_name="原始文件"),
+                ),
+                (
+                    "original_name",
+                    models.CharField(max_length=255, verbose_name="原始文件名"),
+                ),
+                ("columns_processed", models.JSONField(default=list)),
+                ("threshold", models.IntegerField(default=80, verbose_name="匹配阈值")),
+                (
+                    "processing_mode",
+                    models.CharField(
+                        choices=[
+                            ("SELF_LEARNING", "自学习标准化"),
+                            ("REFERENCE", "参照标准匹配"),
+                        ],
+                        default="SELF_LEARNING",
+                        max_length=20,
+                        verbose_name="处理模式",
+                    ),
+                ),
+                (
+                    "reference_column",
+                    models.CharField(
+                        blank=True, max_length=255, null=True, verbose_name="标准参照列"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "等待中"),
+                            ("RUNNING", "处理中"),
+                            ("SUCCESS", "已完成"),
+                            ("FAILED", "失败"),
+                        ],
+                        default="PENDING",
+                        max_length=20,
+                        verbose_name="状态",
+                    ),
+                ),
+                ("progress", models.FloatField(default=0, verbose_name="进度")),
+                (
+                    "message",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="进度说明"
+                    ),
+                ),
+                (
+                    "processed_file",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="处理后的文件"
+                    ),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="错误信息")),
+                ("stats", models.JSONField(blank=True, default=dict)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "匹配任务",
+                "verbose_name_plural": "匹配任务",
+                "ordering": ["created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.4 on 2026-10-18 00:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("excel_matcher", "0003_matchjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PatternVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "column_name",
+                    models.CharField(max_length=100, unique=True, verbose_name="列名"),
+                ),
+                (
+                    "version",
+                    models.PositiveIntegerField(default=0, verbose_name="版本"),
+                ),
+            ],
+            options={
+                "verbose_name": "模式版本",
+                "verbose_name_plural": "模式版本",
+            },
+        ),
+    ]
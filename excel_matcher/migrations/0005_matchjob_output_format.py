@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-18 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("excel_matcher", "0004_patternversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="matchjob",
+            name="output_format",
+            field=models.CharField(
+                choices=[("xlsx", "Excel"), ("csv", "CSV"), ("parquet", "Parquet")],
+                default="xlsx",
+                max_length=10,
+                verbose_name="输出格式",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 01:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("excel_matcher", "0005_matchjob_output_format"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processedfile",
+            name="stats",
+            field=models.JSONField(blank=True, default=dict, verbose_name="处理统计"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("excel_matcher", "0006_processedfile_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="matchjob",
+            name="sheets",
+            field=models.JSONField(blank=True, null=True, verbose_name="工作表"),
+        ),
+    ]
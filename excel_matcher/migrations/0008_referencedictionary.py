@@ -0,0 +1,67 @@
+# Generated by Django 5.0.4 on 2026-10-18 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("excel_matcher", "0007_matchjob_sheets"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReferenceDictionary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(max_length=100, unique=True, verbose_name="名称"),
+                ),
+                (
+                    "source_name",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="来源文件名"
+                    ),
+                ),
+                (
+                    "source_column",
+                    models.CharField(blank=True, max_length=255, verbose_name="来源列"),
+                ),
+                (
+                    "standard_count",
+                    models.PositiveIntegerField(default=0, verbose_name="标准值数"),
+                ),
+                (
+                    "pattern_count",
+                    models.PositiveIntegerField(default=0, verbose_name="模式数"),
+                ),
+                (
+                    "artifact",
+                    models.CharField(max_length=64, verbose_name="预编译目录"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "参照词典",
+                "verbose_name_plural": "参照词典",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.AddField(
+            model_name="matchjob",
+            name="reference_dictionary",
+            field=models.CharField(
+                blank=True, max_length=100, null=True, verbose_name="参照词典"
+            ),
+        ),
+    ]
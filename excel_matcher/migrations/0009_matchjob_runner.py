@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("excel_matcher", "0008_referencedictionary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="matchjob",
+            name="runner",
+            field=models.CharField(blank=True, max_length=255, verbose_name="执行者"),
+        ),
+    ]
@@ -19,6 +19,8 @@ class ProcessedFile(models.Model):
     reference_column = models.CharField(
         max_length=255, null=True, blank=True, verbose_name="标准参照列"
     )
+    # 分阶段耗时和每列的匹配计数 (ExcelService.stats)
+    stats = models.JSONField(default=dict, blank=True, verbose_name="处理统计")
 
     def __str__(self):
         return os.path.basename(self.original_file)
@@ -44,3 +46,108 @@ class FuzzyMatchPattern(models.Model):
         return (
             f"{self.column_name}: {self.original_pattern} -> {self.standardized_value}"
         )
+
+
+class PatternVersion(models.Model):
+    """每列匹配模式的版本号，保存模式时递增，用于让进程内的模式缓存失效"""
+
+    column_name = models.CharField(max_length=100, unique=True, verbose_name="列名")
+    version = models.PositiveIntegerField(default=0, verbose_name="版本")
+
+    class Meta:
+        verbose_name = "模式版本"
+        verbose_name_plural = "模式版本"
+
+    def __str__(self):
+        return f"{self.column_name}: v{self.version}"
+
+
+class MatchJob(models.Model):
+    """后台模糊匹配处理任务"""
+
+    STATUS_PENDING = "PENDING"
+    STATUS_RUNNING = "RUNNING"
+    STATUS_SUCCESS = "SUCCESS"
+    STATUS_FAILED = "FAILED"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "等待中"),
+        (STATUS_RUNNING, "处理中"),
+        (STATUS_SUCCESS, "已完成"),
+        (STATUS_FAILED, "失败"),
+    ]
+
+    original_file = models.CharField(max_length=255, verbose_name="原始文件")
+    original_name = models.CharField(max_length=255, verbose_name="原始文件名")
+    columns_processed = models.JSONField(default=list)
+    threshold = models.IntegerField(default=80, verbose_name="匹配阈值")
+    processing_mode = models.CharField(
+        max_length=20,
+        choices=[("SELF_LEARNING", "自学习标准化"), ("REFERENCE", "参照标准匹配")],
+        default="SELF_LEARNING",
+        verbose_name="处理模式",
+    )
+    reference_column = models.CharField(
+        max_length=255, null=True, blank=True, verbose_name="标准参照列"
+    )
+    output_format = models.CharField(
+        max_length=10,
+        choices=[("xlsx", "Excel"), ("csv", "CSV"), ("parquet", "Parquet")],
+        default="xlsx",
+        verbose_name="输出格式",
+    )
+    # 要处理的工作表名称列表，为空时只处理第一个工作表
+    sheets = models.JSONField(null=True, blank=True, verbose_name="工作表")
+    # 参照标准模式下使用的参照词典名称，为空时使用文件中的标准列
+    reference_dictionary = models.CharField(
+        max_length=100, null=True, blank=True, verbose_name="参照词典"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="状态",
+    )
+    progress = models.FloatField(default=0, verbose_name="进度")
+    message = models.CharField(max_length=255, blank=True, verbose_name="进度说明")
+    processed_file = models.CharField(
+        max_length=255, blank=True, verbose_name="处理后的文件"
+    )
+    error = models.TextField(blank=True, verbose_name="错误信息")
+    stats = models.JSONField(default=dict, blank=True)
+    # 领取任务的执行者 ("主机名:进程号:启动标识")，用于识别进程退出后遗留的处理中任务
+    runner = models.CharField(max_length=255, blank=True, verbose_name="执行者")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        verbose_name = "匹配任务"
+        verbose_name_plural = "匹配任务"
+
+    def __str__(self):
+        return f"{self.original_name} ({self.get_status_display()})"
+
+
+class ReferenceDictionary(models.Model):
+    """命名参照词典 (主数据)：标准值列表预编译后保存在磁盘上，任务按名称选择"""
+
+    name = models.CharField(max_length=100, unique=True, verbose_name="名称")
+    source_name = models.CharField(
+        max_length=255, blank=True, verbose_name="来源文件名"
+    )
+    source_column = models.CharField(max_length=255, blank=True, verbose_name="来源列")
+    standard_count = models.PositiveIntegerField(default=0, verbose_name="标准值数")
+    pattern_count = models.PositiveIntegerField(default=0, verbose_name="模式数")
+    # MEDIA_ROOT/dictionaries/ 下的预编译目录名，每次重新构建时更换
+    artifact = models.CharField(max_length=64, verbose_name="预编译目录")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["name"]
+        verbose_name = "参照词典"
+        verbose_name_plural = "参照词典"
+
+    def __str__(self):
+        return f"{self.name} ({self.standard_count})"
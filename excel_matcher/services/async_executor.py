@@ -0,0 +1,62 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+# 异步视图中执行阻塞操作的有界线程池，首次使用时创建：
+# "cpu" 解析文件和匹配，"io" 保存上传文件、读取结果等读写操作，
+# 分开后上传和下载不会排在耗时的预览后面
+POOLS = {
+    "cpu": ("EXCEL_ASYNC_WORKERS", 4),
+    "io": ("EXCEL_ASYNC_IO_WORKERS", 16),
+}
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(pool):
+    with _executors_lock:
+        if pool not in _executors:
+            setting, default = POOLS[pool]
+            _executors[pool] = ThreadPoolExecutor(
+                max_workers=max(1, getattr(settings, setting, default)),
+                thread_name_prefix=f"excel-{pool}",
+            )
+        return _executors[pool]
+
+
+def _call(func, args, kwargs):
+    # 线程池中的线程不经过请求周期，自行关闭失效的数据库连接
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def _run(pool, func, args, kwargs):
+    return await sync_to_async(
+        _call, thread_sensitive=False, executor=_get_executor(pool)
+    )(func, args, kwargs)
+
+
+async def run_cpu(func, *args, **kwargs):
+    """
+    在匹配线程池中执行耗时的同步函数 (解析文件、匹配)，不占用事件循环；
+    同时执行的调用数不超过 EXCEL_ASYNC_WORKERS，超出的调用排队等待，
+    客户端在排队期间断开时对应的调用会被取消
+
+    Args:
+        func: 同步函数
+        *args, **kwargs: 传给 func 的参数
+
+    Returns:
+        func 的返回值
+    """
+    return await _run("cpu", func, args, kwargs)
+
+
+async def run_io(func, *args, **kwargs):
+    """在读写线程池中执行同步函数 (保存上传文件、读取结果)，并发上限为 EXCEL_ASYNC_IO_WORKERS"""
+    return await _run("io", func, args, kwargs)
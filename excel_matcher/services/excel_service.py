@@ -1,22 +1,109 @@
 import pandas as pd
 import numpy as np
-import re
 import os
 import time
+import hashlib
+import json
+import logging
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import as_completed
+from contextlib import contextmanager
 from rapidfuzz import process, fuzz
 from django.conf import settings
-from django.core.files.storage import FileSystemStorage
+from django.db import transaction
 from ..models import FuzzyMatchPattern
+from .upload_store import UploadStore
+from .frame_cache import FrameCache, select_columns
+from .pattern_store import PatternStore
+from .qgram_index import QGramIndex
+from .reference_dictionary import CompiledDictionary, DictionaryStore
+from .normalization import (
+    clean_value,
+    compute_signature,
+    extract_primary_key,
+    normalize_series,
+    signature_series,
+)
+from .worker_pool import create_pool, worker_count
 import openpyxl
-from openpyxl.styles import PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+try:
+    import pyarrow.parquet as pq
+
+    HAS_PYARROW = True
+except ImportError:  # pragma: no cover - 取决于运行环境
+    HAS_PYARROW = False
+
+logger = logging.getLogger(__name__)
+
+# LRU 缓存中表示“未命中”的哨兵值 (缓存值 None 表示已确认无法匹配)
+_CACHE_MISS = object()
 
 
 class FuzzyMatcher:
     """模糊匹配处理器，负责学习匹配模式并应用到新数据"""
 
-    def __init__(self, column_name=None, reference_values=None):
+    # 单次 cdist 打分矩阵的最大单元数
+    CDIST_MAX_CELLS = 2_000_000
+    # 打分矩阵达到该单元数时才启用多线程
+    CDIST_PARALLEL_CELLS = 10_000
+    # qgram 方式每个值最多打分的候选数 (取分数上界最高的)，短编码共有 q-gram 多时候选可能很多
+    QGRAM_MAX_CANDIDATES = 2_000
+    # qgram 方式按分数上界顺序分块打分的块大小
+    QGRAM_SCORE_BLOCK = 64
+    # qgram 方式先按该阈值 (不低于匹配阈值) 筛选候选，找不到达到该分数的候选时再按匹配阈值筛选
+    QGRAM_FIRST_THRESHOLD = 80
+    # 匹配结果 LRU 缓存的默认容量
+    CACHE_SIZE = 100_000
+    # 模糊匹配的候选筛选方式：primary_key 只在主键相同的模式中打分，
+    # qgram 用 q-gram 倒排索引按共有 q-gram 数筛选 (主键有拼写错误时也能匹配)
+    BLOCKING_STRATEGIES = ("primary_key", "qgram")
+    # 匹配计数的键：
+    # values/unique 为输入值数和去重后的值数，cache_hits/cache_misses 为 LRU 缓存命中情况；
+    # exact_hits/signature_hits/fuzzy_matches/misses 为缓存未命中的值最终落在哪一步；
+    # fuzzy_queries 为有候选并进入模糊打分的值数，candidate_comparisons 为打分的 (值, 候选) 对数
+    COUNTER_KEYS = (
+        "values",
+        "unique",
+        "cache_hits",
+        "cache_misses",
+        "exact_hits",
+        "signature_hits",
+        "fuzzy_matches",
+        "misses",
+        "fuzzy_queries",
+        "candidate_comparisons",
+    )
+
+    def __init__(
+        self, column_name=None, reference_values=None, cache_size=None, blocking=None
+    ):
         self.patterns = {}  # 存储学习到的模式: {cleaned_or_signature: standardized_value}
+        # 主键索引: {primary_key: {pattern_key: standardized_value}}，随模式增量维护
+        self.primary_key_index = {}
+        # 候选筛选方式，为 None 时使用 settings.EXCEL_MATCHER_BLOCKING
+        self.blocking = blocking or getattr(
+            settings, "EXCEL_MATCHER_BLOCKING", "primary_key"
+        )
+        if self.blocking not in self.BLOCKING_STRATEGIES:
+            raise ValueError(f"不支持的候选筛选方式: {self.blocking}")
+        # q-gram 索引和对应的标准值列表，第一次模糊匹配时构建，模式变化后重建
+        self._qgram_index = None
+        self._qgram_standards = None
         self.column_name = column_name
+        # 数据库中已保存的模式快照，保存时只写入新增或变化的条目
+        self._saved_patterns = {}
+        # patterns/primary_key_index 是否为模式缓存中共享的只读对象 (写入前需要复制)
+        self._shared_patterns = False
+
+        # 匹配结果 LRU 缓存: {(cleaned_value, threshold): standardized_value 或 None}
+        # 同一匹配器处理多列时 (参照标准模式) 缓存可跨列复用
+        self._match_cache = OrderedDict()
+        self.cache_size = cache_size or self.CACHE_SIZE
+        # 匹配计数，键见 COUNTER_KEYS
+        self.stats = Counter()
 
         # 如果有列名，从数据库加载已学习的模式
         if column_name and not reference_values:
@@ -29,201 +116,916 @@ class FuzzyMatcher:
     def load_reference_values(self, reference_values):
         """加载参照标准值作为匹配模式"""
         for value in reference_values:
-            if not isinstance(value, str) or not value.strip():
+            cleaned = clean_value(value)
+            if cleaned is None:
                 continue
 
-            # 清理值并存储原始形式
-            original_standard = value.strip()  # 保留原始大小写形式作为标准值
-            cleaned_value = original_standard.upper()
-            self.patterns[cleaned_value] = original_standard
+            # 清理值并存储原始形式 (保留原始大小写形式作为标准值)
+            original_standard, cleaned_value = cleaned
+            self._set_pattern(cleaned_value, original_standard)
 
             # 同时存储签名形式
-            alpha_part = re.sub(r"[^A-Za-z]", "", cleaned_value)
-            numeric_part = re.sub(r"[^0-9]", "", cleaned_value)
-            signature = f"{alpha_part}_{numeric_part}"
+            signature = compute_signature(cleaned_value)
             if signature not in self.patterns:
                 # 签名也映射到原始大小写的标准值
-                self.patterns[signature] = original_standard
+                self._set_pattern(signature, original_standard)
 
-    def load_patterns_from_db(self):
-        """从数据库加载该列已有的匹配模式"""
-        patterns = FuzzyMatchPattern.objects.filter(column_name=self.column_name)
+    def load_patterns(self, patterns):
+        """加载已有的模式字典 {pattern_key: standardized_value}，值相同的条目保持不变"""
+        for pattern_key, standardized_value in patterns.items():
+            if self.patterns.get(pattern_key, _CACHE_MISS) != standardized_value:
+                self._set_pattern(pattern_key, standardized_value)
 
-        for pattern in patterns:
-            # original_pattern 存储的是 cleaned 或 signature
-            # standardized_value 存储的是原始大小写的标准值
-            self.patterns[pattern.original_pattern] = pattern.standardized_value
+    def load_patterns_from_db(self):
+        """从进程内模式缓存加载该列已有的匹配模式 (版本变化时才访问数据库)"""
+        self.patterns, self.primary_key_index = PatternStore().get(
+            self.column_name, self._compile_patterns
+        )
+        # original_pattern 存储的是 cleaned 或 signature
+        # standardized_value 存储的是原始大小写的标准值
+        self._saved_patterns = self.patterns
+        self._shared_patterns = True
+        self._match_cache.clear()
+        self._qgram_index = None
+
+    @classmethod
+    def _compile_patterns(cls, patterns):
+        """将 {original_pattern: standardized_value} 编译为模式字典和主键索引"""
+        matcher = cls()
+        matcher.load_patterns(patterns)
+        return matcher.patterns, matcher.primary_key_index
+
+    @classmethod
+    def from_dictionary(cls, dictionary, blocking=None):
+        """
+        用预编译的参照词典 (CompiledDictionary) 创建匹配器，模式直接读取内存映射的文件，
+        结果与用同一组标准值创建的参照匹配器一致
 
-    def learn_patterns(self, column_data):
-        """从现有数据中学习匹配模式"""
+        只按预编译的主键桶筛选候选：qgram 需要解码全部键构建索引，失去内存映射的意义，
+        显式指定时报错；EXCEL_MATCHER_BLOCKING 为 qgram 时词典仍按主键筛选
+        """
+        if blocking == "qgram":
+            raise ValueError("预编译的参照词典只支持 primary_key 候选筛选")
+        matcher = cls(blocking="primary_key")
+        matcher.patterns = dictionary
+        matcher.primary_key_index = dictionary.buckets
+        # 词典是只读的，写入模式前会复制为普通字典
+        matcher._shared_patterns = True
+        return matcher
+
+    def learn_patterns(self, column_data, save=True):
+        """从现有数据中学习匹配模式 (save 为 False 时不保存到数据库，如预览)"""
         unique_values = column_data.dropna().unique()
         learned_standards = {}  # 临时存储签名 -> 最早出现的原始值
 
         for value in unique_values:
-            if not isinstance(value, str) or not value.strip():
+            cleaned = clean_value(value)
+            if cleaned is None:
                 continue
 
-            original_value = value.strip()  # 保留原始大小写
-            cleaned_value = original_value.upper()
+            original_value, cleaned_value = cleaned  # 保留原始大小写
 
             # 规则提取：提取字母部分和数字部分
-            alpha_part = re.sub(r"[^A-Za-z]", "", cleaned_value)
-            numeric_part = re.sub(r"[^0-9]", "", cleaned_value)
-            signature = f"{alpha_part}_{numeric_part}"
+            signature = compute_signature(cleaned_value)
 
             # 如果这个签名是第一次遇到，将当前原始值作为该签名的标准形式
             if signature not in learned_standards:
                 learned_standards[signature] = original_value
                 # 将签名映射到标准值
                 if signature not in self.patterns:
-                    self.patterns[signature] = original_value
+                    self._set_pattern(signature, original_value)
 
             # 将清理后的大写形式也映射到其对应的标准值 (通过签名查找)
             standard_for_cleaned = learned_standards[signature]
             if cleaned_value not in self.patterns:
-                self.patterns[cleaned_value] = standard_for_cleaned
+                self._set_pattern(cleaned_value, standard_for_cleaned)
 
         # 学习完成后，保存到数据库
-        if self.column_name:
+        if self.column_name and save:
             self.save_patterns_to_db()
 
         return self.patterns
 
     def save_patterns_to_db(self):
-        """保存学习到的模式到数据库"""
-        # 需要注意，现在 self.patterns 的 key 可能是 cleaned_value 或 signature
+        """
+        保存学习到的模式到数据库
+
+        与已加载的快照比较，只写入新增或变化的模式，
+        在一个事务中批量 upsert (按 column_name + original_pattern 冲突时更新标准值)
+        """
+        # self.patterns 的 key 是 cleaned_value 或 signature，对应数据库的 original_pattern
         # value 是原始大小写的 standardized_value
-        # 我们需要确保数据库中存储的是正确的映射关系
-        # 这里简化处理：仅将在 learn_patterns 中新学习到的模式存入数据库
-        # 或者，更健壮的方式是重新整理 patterns 以匹配数据库结构
-        # 为避免复杂性，暂时维持原有的保存逻辑，但需意识到可能的不一致性
-        # 更好的方法是调整数据库模型或保存逻辑
-        for original_key, standardized_value in self.patterns.items():
-            # 假设 original_key 对应数据库的 original_pattern
-            # standardized_value 对应数据库的 standardized_value
-            FuzzyMatchPattern.objects.update_or_create(
-                column_name=self.column_name,
-                original_pattern=original_key,  # 这可能不完全准确，取决于key是cleaned还是signature
-                defaults={"standardized_value": standardized_value},
+        pending = {
+            pattern_key: standardized_value
+            for pattern_key, standardized_value in self.patterns.items()
+            if self._saved_patterns.get(pattern_key, _CACHE_MISS) != standardized_value
+        }
+        if not pending:
+            return
+
+        with transaction.atomic():
+            FuzzyMatchPattern.objects.bulk_create(
+                [
+                    FuzzyMatchPattern(
+                        column_name=self.column_name,
+                        original_pattern=pattern_key,
+                        standardized_value=standardized_value,
+                    )
+                    for pattern_key, standardized_value in pending.items()
+                ],
+                update_conflicts=True,
+                unique_fields=["column_name", "original_pattern"],
+                update_fields=["standardized_value"],
             )
+            PatternStore().bump_version(self.column_name)
+        # 快照可能与模式缓存共享，不能原地修改
+        self._saved_patterns = {**self._saved_patterns, **pending}
+
+    def _set_pattern(self, pattern_key, standardized_value):
+        """写入一条模式，并同步更新主键索引"""
+        if self._shared_patterns:
+            # 写时复制：不修改模式缓存中共享的对象
+            self.patterns = dict(self.patterns)
+            self.primary_key_index = {
+                primary_key: dict(bucket)
+                for primary_key, bucket in self.primary_key_index.items()
+            }
+            self._shared_patterns = False
+
+        if pattern_key in self.patterns:
+            # 覆盖已有模式时，先从旧的主键桶中移除
+            old_primary_key = self._pattern_primary_key(
+                pattern_key, self.patterns[pattern_key]
+            )
+            bucket = self.primary_key_index.get(old_primary_key)
+            if bucket is not None:
+                bucket.pop(pattern_key, None)
+                if not bucket:
+                    del self.primary_key_index[old_primary_key]
+
+        self.patterns[pattern_key] = standardized_value
+        # 模式变化后，缓存的匹配结果和 q-gram 索引可能失效
+        self._match_cache.clear()
+        self._qgram_index = None
+        primary_key = self._pattern_primary_key(pattern_key, standardized_value)
+        if primary_key is not None:
+            self.primary_key_index.setdefault(primary_key, {})[
+                pattern_key
+            ] = standardized_value
+
+    def _pattern_primary_key(self, pattern_key, standardized_value):
+        """计算模式的主键：优先从 pattern_key 提取，失败时从标准值提取"""
+        primary_key = self._extract_primary_key(pattern_key)
+        # 如果 pattern_key 是签名，可能无法直接提取，尝试从其对应的标准值提取
+        if primary_key is None:
+            primary_key = self._extract_primary_key(standardized_value)
+        return primary_key
 
     def _extract_primary_key(self, value):
         """提取字符串开头的重要部分（字母数字序列）作为主键"""
-        if not isinstance(value, str):
+        return extract_primary_key(value)
+
+    def _best_candidate(self, cleaned_value, primary_key, threshold):
+        """
+        在候选中取 fuzz.ratio 最高的模式 (同分时取第一个)：
+        primary_key 方式在主键相同的模式中打分，qgram 方式见 _qgram_best
+
+        Returns:
+            (标准值, 分数)，没有候选时返回 None
+        """
+        if self.blocking == "qgram":
+            return self._qgram_best(cleaned_value, threshold)
+        candidates = self.primary_key_index.get(primary_key)
+        if not candidates:
             return None
-        # 匹配开头的字母或数字序列
-        match = re.match(r"^[A-Za-z0-9]+", value.strip())
-        # 返回大写形式的主键，如果匹配不到则返回None
-        return match.group(0).upper() if match else None
+        self.stats["fuzzy_queries"] += 1
+        self.stats["candidate_comparisons"] += len(candidates)
+        # 使用 cleaned_value 与候选的 pattern_key (cleaned 或 signature) 进行比较
+        match_key, score, _ = process.extractOne(
+            cleaned_value, list(candidates.keys()), scorer=fuzz.ratio
+        )
+        return candidates[match_key], score
+
+    def _qgram_best(self, cleaned_value, threshold):
+        """
+        qgram 方式的最佳候选：通过计数过滤的候选按分数上界从高到低分块打分，
+        已得到的最高分超过剩余候选的上界时停止，结果与全部打分一致 (同分时取序号最小的)；
+        每次筛选最多打分 QGRAM_MAX_CANDIDATES 个候选。
+        先按 QGRAM_FIRST_THRESHOLD 筛选，最高分达到该值时未通过筛选的模式分数一定更低，
+        否则再按 threshold 筛选 (阈值较低时候选很多，大部分值不需要这一步)
+
+        Returns:
+            (标准值, 分数)，没有候选时返回 None
+        """
+        if self._qgram_index is None:
+            self._qgram_index = QGramIndex(self.patterns.keys())
+            self._qgram_standards = list(self.patterns.values())
+        keys = self._qgram_index.keys
+        first = max(threshold, self.QGRAM_FIRST_THRESHOLD)
+        tiers = (first, threshold) if first > threshold else (threshold,)
+        best_id, best_score = None, -1.0
+        for tier in tiers:
+            ids, bounds = self._qgram_index.ranked_candidates(
+                cleaned_value, tier, limit=self.QGRAM_MAX_CANDIDATES
+            )
+            for start in range(0, len(ids), self.QGRAM_SCORE_BLOCK):
+                if best_score > bounds[start]:
+                    break
+                block = ids[start : start + self.QGRAM_SCORE_BLOCK]
+                self.stats["candidate_comparisons"] += len(block)
+                scores = process.cdist(
+                    [cleaned_value],
+                    [keys[i] for i in block],
+                    scorer=fuzz.ratio,
+                    score_cutoff=threshold,
+                    dtype=np.float64,
+                )[0]
+                top = scores.max()
+                if top >= best_score:
+                    block_best = block[scores == top].min()
+                    if top > best_score or block_best < best_id:
+                        best_id = block_best
+                    best_score = top
+            if best_score >= tier:
+                break
+        if best_id is None:
+            return None
+        self.stats["fuzzy_queries"] += 1
+        return self._qgram_standards[best_id], best_score
 
     def match(self, value, threshold=80):
         """
         对给定值进行分层模糊匹配：
         0. 尝试直接匹配和签名匹配 (优化)。
         1. 提取主键 (开头的字母数字部分)。
-        2. 筛选出主键相同的候选标准值。
+        2. 通过主键索引直接取出主键相同的候选标准值 (qgram 方式改为用 q-gram 索引筛选候选)。
         3. 在筛选出的候选中进行整体模糊匹配。
 
         返回 (标准化值, 是否进行了修改)
         """
-        if not isinstance(value, str) or not value.strip():
-            return value, False  # 对于非字符串或空字符串，直接返回
+        result, changed, _, _ = self._match_one(value, threshold)
+        return result, changed
+
+    def _match_one(self, value, threshold):
+        """
+        match 的实现，另外返回分数和匹配方式
 
-        original_value = value.strip()  # 保留原始输入值
-        cleaned_value = original_value.upper()  # 用于匹配的大写版本
-        input_primary_key = self._extract_primary_key(cleaned_value)  # 提取输入值的主键
+        Returns:
+            (标准化值, 是否修改, 分数, match_type)：match_type 为 exact / signature / fuzzy / none，
+            直接匹配和签名匹配的分数记为 100，未匹配的为 None
+        """
+        cleaned = clean_value(value)
+        if cleaned is None:
+            return value, False, None, "none"  # 对于非字符串或空字符串，直接返回
+
+        # 保留原始输入值，cleaned_value 为用于匹配的大写版本
+        original_value, cleaned_value = cleaned
+        input_primary_key = extract_primary_key(cleaned_value)  # 提取输入值的主键
 
         # 如果无法提取主键或没有候选模式，直接返回原始值
         if not input_primary_key or not self.patterns:
-            return original_value, False
+            self.stats["misses"] += 1
+            return original_value, False, None, "none"
 
         # --- 优化：尝试快速匹配 ---
-        # 0a. 直接匹配 (使用 cleaned_value)
-        if cleaned_value in self.patterns:
-            result = self.patterns[cleaned_value]  # 获取对应的标准值
+        # 0a. 直接匹配 (使用 cleaned_value)，用 get 只查找一次 (预编译词典的查找需要计算哈希)
+        result = self.patterns.get(cleaned_value, _CACHE_MISS)
+        if result is not _CACHE_MISS:
+            self.stats["exact_hits"] += 1
             # 比较标准值和原始输入值是否不同
-            return result, result != original_value
+            return result, result != original_value, 100.0, "exact"
 
         # 0b. 签名匹配
-        alpha_part = re.sub(r"[^A-Za-z]", "", cleaned_value)
-        numeric_part = re.sub(r"[^0-9]", "", cleaned_value)
-        signature = f"{alpha_part}_{numeric_part}"
-        if signature in self.patterns:
-            result = self.patterns[signature]  # 获取对应的标准值
+        signature = compute_signature(cleaned_value)
+        result = self.patterns.get(signature, _CACHE_MISS)
+        if result is not _CACHE_MISS:
+            self.stats["signature_hits"] += 1
             # 比较标准值和原始输入值是否不同
-            return result, result != original_value
+            return result, result != original_value, 100.0, "signature"
         # --- 快速匹配结束 ---
 
         # --- 分层匹配逻辑 ---
-        # 1. 筛选主键相同的候选标准值
-        primary_key_candidates = {}  # 存储 {pattern_key: standardized_value}
-        for pattern_key, standardized_value in self.patterns.items():
-            # 尝试从 pattern_key (可能是 cleaned 或 signature) 提取主键
-            candidate_primary_key = self._extract_primary_key(pattern_key)
-            # 如果 pattern_key 是签名，可能无法直接提取，尝试从其对应的标准值提取
-            if candidate_primary_key is None:
-                candidate_primary_key = self._extract_primary_key(standardized_value)
-
-            # 如果候选主键与输入主键相同，则加入候选列表
-            if candidate_primary_key == input_primary_key:
-                primary_key_candidates[pattern_key] = standardized_value
-
-        # 如果经过主键筛选后没有候选者，则认为无法匹配
-        if not primary_key_candidates:
-            return original_value, False
-
-        # 2. 在主键匹配的候选中进行模糊匹配 (比较整个字符串)
-        # 使用 cleaned_value 与候选的 pattern_key 进行比较
-        # process.extractOne 的 choices 需要是可迭代的 key
-        match_key, score, _ = process.extractOne(
-            cleaned_value,  # 输入的清理后的大写值
-            list(
-                primary_key_candidates.keys()
-            ),  # 候选的 pattern_keys (cleaned 或 signature)
-            scorer=fuzz.ratio,  # 使用 Levenshtein 距离比例
-        )
+        # 1-2. 在候选 (主键相同或共有足够多的 q-gram) 中进行模糊匹配 (比较整个字符串)
+        best = self._best_candidate(cleaned_value, input_primary_key, threshold)
+
+        # 如果经过筛选后没有候选者，则认为无法匹配
+        if best is None:
+            self.stats["misses"] += 1
+            return original_value, False, None, "none"
+        result, score = best
 
         # 3. 如果找到足够相似的匹配
         if score >= threshold:
-            result = primary_key_candidates[match_key]  # 获取最佳匹配对应的标准值
+            self.stats["fuzzy_matches"] += 1
             # 比较标准值和原始输入值是否不同
-            return result, result != original_value
+            return result, result != original_value, float(score), "fuzzy"
         # --- 分层匹配逻辑结束 ---
 
         # 如果以上所有步骤都没有找到合适的匹配，返回原始值
-        return original_value, False
+        self.stats["misses"] += 1
+        return original_value, False, None, "none"
+
+    def match_many(self, values, threshold=80):
+        """
+        批量匹配，结果与逐个调用 match 一致：
+        0. 用 pd.factorize 对输入去重，只处理唯一值，结果再广播回每一行。
+        1. 唯一值先查 LRU 缓存，命中则直接复用。
+        2. 用 pandas 向量化字符串操作完成直接匹配和签名匹配。
+        3. 剩余唯一值按主键分桶，每个桶调用一次 process.cdist 打分 (qgram 方式逐个筛选候选打分)。
+
+        返回 (标准化值数组, 是否修改的布尔数组)，与输入逐项对齐
+        """
+        values = np.asarray(values, dtype=object)
+        results = values.copy()
+        changed = np.zeros(len(values), dtype=bool)
+        if len(values) == 0:
+            return results, changed
+
+        # 去重：codes 为每个输入在唯一值中的位置，空值为 -1
+        codes, uniques = pd.factorize(values)
+        uniques = pd.Series(uniques, dtype=object)
+        self.stats["values"] += len(values)
+        self.stats["unique"] += len(uniques)
+
+        # 只有非空字符串参与匹配，其余值原样返回
+        stripped, cleaned, primary_keys = normalize_series(uniques)
+        if stripped.empty:
+            return results, changed
+
+        unique_results = uniques.to_numpy(dtype=object, copy=True)
+        unique_changed = np.zeros(len(uniques), dtype=bool)
+        # 未匹配到的字符串返回去除首尾空格后的原始值
+        unique_results[stripped.index] = stripped.to_numpy()
+
+        if self.patterns and not cleaned.empty:
+            standards = self._lookup_standards(cleaned, primary_keys, threshold)
+            matched = standards.dropna()
+            unique_results[matched.index] = matched.to_numpy()
+            unique_changed[matched.index] = (
+                matched.to_numpy() != stripped[matched.index].to_numpy()
+            )
+
+        # 将唯一值的结果映射回每个输入位置 (仅限字符串唯一值)
+        is_text = np.zeros(len(uniques), dtype=bool)
+        is_text[stripped.index] = True
+        positions = np.flatnonzero(codes >= 0)
+        positions = positions[is_text[codes[positions]]]
+        results[positions] = unique_results[codes[positions]]
+        changed[positions] = unique_changed[codes[positions]]
+        return results, changed
+
+    def score_many(self, values, deadline=None):
+        """
+        为每个值计算最佳候选及其分数，与阈值无关，用于一次打分得到所有阈值下的结果：
+        直接匹配和签名匹配的分数记为 100，没有候选的记为 -1。
+        阈值为 t 时的匹配结果为 scores >= t 的候选，未命中时与 match 一样返回原始值。
+        不使用 LRU 缓存，调用方应传入去重后的值。
+        指定 deadline (time.monotonic 时间) 时超时后不再模糊打分，未打分的值分数为 NaN。
+
+        Returns:
+            (最佳候选标准值数组, 候选是否与原始值不同的布尔数组, 分数数组)
+        """
+        values = pd.Series(np.asarray(values, dtype=object), dtype=object)
+        candidates = values.to_numpy(copy=True)
+        differs = np.zeros(len(values), dtype=bool)
+        scores = np.full(len(values), -1.0)
+
+        stripped, cleaned, primary_keys = normalize_series(values)
+        if stripped.empty or not self.patterns:
+            return candidates, differs, scores
+        candidates[stripped.index] = stripped.to_numpy()
+
+        matched = self._quick_lookup(cleaned).dropna()
+        candidates[matched.index] = matched.to_numpy()
+        scores[matched.index] = 100.0
+
+        # 其余值在候选中取最高分的候选 (阈值为 0，不过滤)
+        pending = cleaned.drop(matched.index)
+        scored, skipped = self._score_pending(pending, primary_keys, 0, deadline)
+        for position, (standard, score) in scored.items():
+            candidates[position] = standard
+            scores[position] = score
+        if skipped:
+            scores[skipped] = np.nan
+
+        scored = np.flatnonzero(scores >= 0)
+        differs[scored] = candidates[scored] != stripped.loc[scored].to_numpy()
+        return candidates, differs, scores
+
+    def match_details(self, values, threshold=80):
+        """
+        逐值匹配并给出分数和匹配方式，供匹配接口使用，结果与 match 一致 (不使用 LRU 缓存)；
+        面向小批量 (如 100 个值)，逐个查找比 match_many 的向量化流程开销更低
+
+        Returns:
+            [(标准化值, 是否修改, 分数, match_type)]，与输入逐项对齐，取值见 _match_one
+        """
+        self.stats["values"] += len(values)
+        return [self._match_one(value, threshold) for value in values]
+
+    def _lookup_standards(self, cleaned, primary_keys, threshold):
+        """
+        为清理后的唯一值查找标准值，先查 LRU 缓存，未命中的再走匹配流程
+
+        Returns:
+            与 cleaned 索引对齐的 Series，无法匹配的为 NaN
+        """
+        cached = {}
+        for position, cleaned_value in cleaned.items():
+            cache_key = (cleaned_value, threshold)
+            standard = self._match_cache.get(cache_key, _CACHE_MISS)
+            if standard is not _CACHE_MISS:
+                self._match_cache.move_to_end(cache_key)
+                cached[position] = standard
+        self.stats["cache_hits"] += len(cached)
+
+        misses = cleaned.drop(list(cached)) if cached else cleaned
+        self.stats["cache_misses"] += len(misses)
+        standards = pd.Series(cached, index=cleaned.index, dtype=object)
+        if misses.empty:
+            return standards
+
+        # --- 快速匹配：直接匹配，其次签名匹配 ---
+        resolved = self._quick_lookup(misses)
+
+        # --- 分层匹配：在候选中批量打分 ---
+        scored, _ = self._score_pending(
+            misses[resolved.isna()], primary_keys, threshold
+        )
+        fuzzy_matched = {
+            position: standard for position, (standard, _) in scored.items()
+        }
+        if fuzzy_matched:
+            resolved[list(fuzzy_matched)] = list(fuzzy_matched.values())
+        self.stats["fuzzy_matches"] += len(fuzzy_matched)
+        self.stats["misses"] += int(resolved.isna().sum())
+
+        # 写入缓存 (包括无法匹配的结果)，超出容量时淘汰最久未使用的条目
+        for cleaned_value, standard in zip(misses.to_numpy(), resolved.to_numpy()):
+            self._match_cache[(cleaned_value, threshold)] = (
+                None if pd.isna(standard) else standard
+            )
+        while len(self._match_cache) > self.cache_size:
+            self._match_cache.popitem(last=False)
+
+        standards.update(resolved)
+        return standards
+
+    def _quick_lookup(self, cleaned):
+        """直接匹配，其次签名匹配；返回与 cleaned 索引对齐的 Series，未命中的为 NaN"""
+        exact = self._map_patterns(cleaned)
+        # 只为直接匹配未命中的值计算签名
+        signatures = signature_series(cleaned[exact.isna()])
+        by_signature = self._map_patterns(signatures)
+        self.stats["exact_hits"] += int(exact.notna().sum())
+        self.stats["signature_hits"] += int(by_signature.notna().sum())
+        return exact.fillna(by_signature).astype(object)
+
+    def _map_patterns(self, keys):
+        """按模式字典查找 keys，未命中的为 NaN (预编译词典用批量二分查找，不展开为字典)"""
+        if isinstance(self.patterns, CompiledDictionary):
+            return self.patterns.lookup_many(keys)
+        return keys.map(self.patterns)
+
+    def _score_pending(self, pending, primary_keys, threshold, deadline=None):
+        """
+        为快速匹配未命中的值做模糊打分：primary_key 方式按主键分桶，每个桶调用一次 cdist；
+        qgram 方式逐个值筛选候选后打分。
+        指定 deadline (time.monotonic 时间) 时超时即停止，剩余的值不打分
+
+        Returns:
+            ({位置: (标准值, 分数)}, 因超时未打分的位置列表)，前者只包含分数不低于 threshold 的值
+        """
+        matched = {}
+        if self.blocking == "qgram":
+            for i, (position, cleaned_value) in enumerate(pending.items()):
+                if deadline is not None and time.monotonic() > deadline:
+                    return matched, list(pending.index[i:])
+                best = self._qgram_best(cleaned_value, threshold)
+                if best is not None and best[1] >= threshold:
+                    matched[position] = best
+            return matched, []
+
+        skipped = []
+        for primary_key, group in pending.groupby(
+            primary_keys[pending.index], sort=False
+        ):
+            if deadline is not None and time.monotonic() > deadline:
+                skipped.extend(group.index)
+                continue
+            bucket = self.primary_key_index.get(primary_key)
+            if bucket:
+                matched.update(
+                    self._score_bucket(group, bucket, threshold, deadline, skipped)
+                )
+        return matched, skipped
+
+    def _score_bucket(self, queries, bucket, threshold, deadline=None, skipped=None):
+        """
+        用 process.cdist 为同一主键桶内的查询值选出最佳候选，
+        超过 deadline 时剩余的查询位置加入 skipped
+
+        Returns:
+            {位置: (标准值, 分数)}，只包含分数不低于 threshold 的查询
+        """
+        choices = list(bucket.keys())
+        standards = list(bucket.values())
+        self.stats["fuzzy_queries"] += len(queries)
+        self.stats["candidate_comparisons"] += len(queries) * len(choices)
+        # 按矩阵规模对查询分块，避免超大桶一次性占用过多内存
+        chunk_size = max(1, self.CDIST_MAX_CELLS // len(choices))
+        matched = {}
+        for start in range(0, len(queries), chunk_size):
+            if deadline is not None and time.monotonic() > deadline:
+                skipped.extend(queries.index[start:])
+                break
+            chunk = queries.iloc[start : start + chunk_size]
+            # 小矩阵用多线程反而更慢
+            parallel = len(chunk) * len(choices) >= self.CDIST_PARALLEL_CELLS
+            scores = process.cdist(
+                chunk.to_numpy(),
+                choices,
+                scorer=fuzz.ratio,
+                score_cutoff=threshold,
+                dtype=np.float64,
+                workers=-1 if parallel else 1,
+            )
+            # argmax 取第一个最高分，与 extractOne 的选择一致
+            best = scores.argmax(axis=1)
+            best_scores = scores[np.arange(len(chunk)), best]
+            for position, choice_idx, score in zip(chunk.index, best, best_scores):
+                if score >= threshold:
+                    matched[position] = (standards[choice_idx], score)
+        return matched
+
+
+def match_unique_values(patterns, uniques, threshold, learn, blocking=None):
+    """
+    进程池任务：在子进程中用给定模式构建匹配器并匹配一列的唯一值，不访问数据库
+
+    Args:
+        blocking: 候选筛选方式，由父进程传入 (子进程中看不到父进程运行时修改的设置)
+
+    Returns:
+        (结果数组, 是否修改数组, 学习后的模式 (learn 为 False 时为 None), 匹配计数)
+    """
+    if isinstance(patterns, CompiledDictionary):
+        # 预编译词典只传递目录，子进程中重新内存映射
+        matcher = FuzzyMatcher.from_dictionary(patterns, blocking=blocking)
+    else:
+        matcher = FuzzyMatcher(blocking=blocking)
+        matcher.load_patterns(patterns)
+    if learn:
+        matcher.learn_patterns(pd.Series(uniques, dtype=object))
+    results, changed = matcher.match_many(uniques, threshold)
+    return results, changed, matcher.patterns if learn else None, dict(matcher.stats)
 
 
 class ExcelService:
     """处理Excel文件上传、处理和下载的服务"""
 
-    UPLOAD_DIR = "uploads"
     PROCESSED_DIR = "processed"
+    # 列式格式的输入输出 (不经过 openpyxl)
+    COLUMNAR_EXTENSIONS = (".csv", ".parquet")
+    OUTPUT_FORMATS = ("xlsx", "csv", "parquet")
+    # CSV 按文本读取，前导零等原样保留 (不推断为数字)；只有空单元格视为缺失值，"NA"、"null" 等按原文保留
+    CSV_READ_OPTIONS = {"dtype": str, "keep_default_na": False, "na_values": [""]}
     YELLOW_FILL = PatternFill(
         start_color="FFFF00", end_color="FFFF00", fill_type="solid"
     )
-
-    def __init__(self):
-        # 确保上传和处理目录存在
-        self.upload_path = os.path.join(settings.MEDIA_ROOT, self.UPLOAD_DIR)
+    HEADER_FONT = Font(bold=True)
+    HEADER_BORDER = Border(
+        left=Side(style="thin"),
+        right=Side(style="thin"),
+        top=Side(style="thin"),
+        bottom=Side(style="thin"),
+    )
+    HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+    # 流式写出时每次转换的行数
+    WRITE_CHUNK_SIZE = 10_000
+    # 处理时每次批量匹配的行数 (每块报告一次进度)
+    MATCH_CHUNK_SIZE = 100_000
+    # 流式读取大文件时每块的行数 (每块报告一次进度)
+    STREAM_CHUNK_SIZE = 10_000
+    # 无法从工作表尺寸得知行数时，按压缩后每行约占的字节数估算
+    BYTES_PER_ROW_ESTIMATE = 30
+    # .xlsx 工作表的最大列数 (XFD)，dimension 记录达到该值时视为整张表的范围
+    MAX_COLUMNS = 16_384
+    # 预览时每次批量匹配的唯一值数
+    PREVIEW_CHUNK_SIZE = 2_000
+    # 预览每列第一块的唯一值数 (不受时间预算限制)
+    PREVIEW_FIRST_CHUNK = 50
+    # 预览抽样估计的置信水平 (95%) 对应的 z 值
+    PREVIEW_CONFIDENCE_Z = 1.96
+
+    def __init__(self, workers=None, blocking=None, patterns=None):
+        """
+        Args:
+            workers: 多列匹配的进程池子进程数，为 None 时使用 EXCEL_MATCHER_WORKERS；
+                为 1 时不使用进程池
+            blocking: 模糊匹配的候选筛选方式，为 None 时使用 EXCEL_MATCHER_BLOCKING
+            patterns: 预加载的模式 {列名: {pattern_key: standardized_value}}；
+                指定时自学习模式不读写数据库，学习到的模式记录在 learned_patterns 中，
+                由调用方统一保存 (如命令行批量处理的多个子进程)
+        """
+        self.workers = workers
+        self.blocking = blocking
+        self.patterns = patterns
+        # 使用预加载模式时各列学习后的模式: {列名: {pattern_key: standardized_value}}
+        self.learned_patterns = {}
+        # 上传文件使用内容寻址存储，解析结果按摘要缓存，确保处理目录存在
+        self.upload_store = UploadStore()
+        self.frame_cache = FrameCache()
         self.processed_path = os.path.join(settings.MEDIA_ROOT, self.PROCESSED_DIR)
-        os.makedirs(self.upload_path, exist_ok=True)
         os.makedirs(self.processed_path, exist_ok=True)
-
-        self.fs = FileSystemStorage(location=self.upload_path)
+        # 最近一次预览/处理的统计信息: {"columns": {列名: {...}}}
+        self.stats = {"columns": {}}
+        # 进度回调 progress_callback(百分比, 说明)，由后台任务设置
+        self.progress_callback = None
+        # 结果的输出格式和文件名 (不含 _Processed 后缀和扩展名)，由 process_excel_file 设置
+        self.output_format = "xlsx"
+        self.output_name = None
+        self._progress_total = 0
+        self._progress_done = 0
 
     def save_uploaded_file(self, file):
         """保存上传的Excel文件并返回文件路径"""
-        filename = self.fs.save(file.name, file)
-        return os.path.join(self.upload_path, filename)
+        digest = self.upload_store.save(file)
+        return self.upload_store.get_path(digest, file.name)
+
+    def _frame_key(self, filepath, sheet=None):
+        """
+        解析缓存键：只缓存上传存储中的文件，键为内容摘要，指定工作表时每个工作表单独缓存；
+        其他文件 (命令行批量处理等直接读取的文件) 返回 None，不写入解析缓存
+        """
+        path = os.path.abspath(filepath)
+        if os.path.dirname(path) != os.path.abspath(self.upload_store.root):
+            return None
+        key = os.path.splitext(os.path.basename(path))[0]
+        if sheet is None:
+            return key
+        return hashlib.sha256(f"{key}:{sheet}".encode()).hexdigest()
+
+    def _read_dataframe(self, filepath, columns=None, sheet=None, nrows=None):
+        """
+        读取Excel文件为 DataFrame，同一上传文件只解析一次，之后从缓存加载
+
+        Args:
+            columns: 只需要的列，为 None 时返回全部列
+            sheet: 工作表名称，为 None 时读取第一个工作表
+            nrows: 未缓存时最多解析的数据行数 (预览使用，CSV/Parquet 不限制)；
+                读到 nrows 行的结果可能不完整，不写入缓存
+        """
+        if filepath.lower().endswith(self.COLUMNAR_EXTENSIONS):
+            if sheet is not None:
+                raise ValueError("CSV/Parquet 文件没有工作表")
+            # 列式格式读取本身很快且支持列裁剪，不经过解析缓存
+            with self._timed("read"):
+                return self._read_columnar(filepath, columns)
+
+        with self._timed("read"):
+            key = self._frame_key(filepath, sheet)
+            df = self.frame_cache.get(key, columns) if key else None
+            if df is None:
+                df = pd.read_excel(
+                    filepath, sheet_name=0 if sheet is None else sheet, nrows=nrows
+                )
+                if key and (nrows is None or len(df) < nrows):
+                    self.frame_cache.put(key, df)
+                df = select_columns(df, columns)
+            return df
+
+    def _read_sheets(self, filepath, sheets, columns=None, nrows=None):
+        """
+        读取多个工作表，返回按 sheets 顺序排列的 {工作表名称: DataFrame}
 
-    def get_excel_columns(self, filepath):
-        """获取Excel文件的列名"""
+        已缓存的工作表直接加载，其余工作表在一次 pd.read_excel 调用中解析 (工作簿只打开一次)，
+        未选中的工作表不会被解析；nrows 同 _read_dataframe
+        """
+        if filepath.lower().endswith(self.COLUMNAR_EXTENSIONS):
+            raise ValueError("CSV/Parquet 文件没有工作表")
+
+        frames = {}
+        with self._timed("read"):
+            missing = []
+            for sheet in sheets:
+                key = self._frame_key(filepath, sheet)
+                df = self.frame_cache.get(key, columns) if key else None
+                if df is None:
+                    missing.append(sheet)
+                else:
+                    frames[sheet] = df
+            if missing:
+                parsed = pd.read_excel(filepath, sheet_name=missing, nrows=nrows)
+                for sheet, df in parsed.items():
+                    key = self._frame_key(filepath, sheet)
+                    if key and (nrows is None or len(df) < nrows):
+                        self.frame_cache.put(key, df)
+                    frames[sheet] = select_columns(df, columns)
+        return {sheet: frames[sheet] for sheet in sheets}
+
+    def _read_columnar(self, filepath, columns=None):
+        """
+        读取 CSV/Parquet 文件，只解析需要的列 (安装 pyarrow 时使用 pyarrow 解析)；
+        CSV 的所有列按文本读取，见 CSV_READ_OPTIONS
+        """
+        if columns is not None:
+            header = self.get_excel_columns(filepath)
+            columns = [column for column in header if column in columns]
+        if filepath.lower().endswith(".parquet"):
+            if not HAS_PYARROW:
+                raise ValueError("读取 Parquet 文件需要安装 pyarrow")
+            return pd.read_parquet(filepath, columns=columns)
+        return pd.read_csv(
+            filepath,
+            usecols=columns,
+            engine="pyarrow" if HAS_PYARROW else "c",
+            **self.CSV_READ_OPTIONS,
+        )
+
+    def _read_columnar_summary(self, filepath):
+        """读取 CSV 表头或 Parquet 元数据，返回值同 get_excel_summary (没有工作表)"""
+        if filepath.lower().endswith(".parquet"):
+            if not HAS_PYARROW:
+                raise ValueError("读取 Parquet 文件需要安装 pyarrow")
+            metadata = pq.read_metadata(filepath)
+            names = metadata.schema.to_arrow_schema().names
+            return {
+                # 去掉 pandas 写入的索引列
+                "columns": [
+                    name for name in names if not name.startswith("__index_level_")
+                ],
+                "row_estimate": metadata.num_rows,
+                "sheets": [],
+            }
+        # 只解析表头，列名规则 (重复列名、Unnamed) 与 pd.read_csv 一致
+        return {
+            "columns": pd.read_csv(
+                filepath, nrows=0, **self.CSV_READ_OPTIONS
+            ).columns.tolist(),
+            "row_estimate": None,
+            "sheets": [],
+        }
+
+    def get_excel_columns(self, filepath, sheet=None):
+        """获取Excel文件的列名 (sheet 为 None 时读取第一个工作表)"""
+        return self.get_excel_summary(filepath, sheet)["columns"]
+
+    def get_excel_summary(self, filepath, sheet=None):
+        """
+        只读取表头获取列名，并根据工作表尺寸估算数据行数，耗时与文件大小无关
+
+        Args:
+            sheet: 工作表名称，为 None 时读取第一个工作表
+
+        Returns:
+            {"columns": 列名列表, "row_estimate": 估算的数据行数 (无法估算时为 None),
+             "sheets": 所有工作表名称 (CSV/Parquet 为空列表)}
+        """
+        try:
+            if filepath.lower().endswith(self.COLUMNAR_EXTENSIONS):
+                if sheet is not None:
+                    raise ValueError("CSV/Parquet 文件没有工作表")
+                return self._read_columnar_summary(filepath)
+            if filepath.lower().endswith(".xls"):
+                header, max_row, sheets = self._read_xls_header(filepath, sheet)
+            else:
+                header, max_row, sheets = self._read_xlsx_header(filepath, sheet)
+        except Exception as e:
+            raise ValueError(f"无法读取Excel文件: {str(e)}")
+
+        # 第一行为表头，其余行为数据
+        row_estimate = max(max_row - 1, 0) if max_row is not None else None
+        return {
+            "columns": self._normalize_header(header),
+            "row_estimate": row_estimate,
+            "sheets": sheets,
+        }
+
+    def get_sheet_columns(self, filepath):
+        """
+        读取所有工作表的表头 (只读取每个工作表的第一行)
+
+        Returns:
+            {工作表名称: 列名列表}，CSV/Parquet 返回空字典
+        """
+        if filepath.lower().endswith(self.COLUMNAR_EXTENSIONS):
+            return {}
         try:
-            df = pd.read_excel(filepath)
-            return df.columns.tolist()
+            if filepath.lower().endswith(".xls"):
+                sheets = self._read_xls_header(filepath)[2]
+                headers = {
+                    sheet: self._read_xls_header(filepath, sheet)[0] for sheet in sheets
+                }
+            else:
+                workbook = openpyxl.load_workbook(
+                    filepath, read_only=True, data_only=True
+                )
+                try:
+                    headers = {
+                        sheet.title: self._read_sheet_header(sheet)[0]
+                        for sheet in workbook.worksheets
+                    }
+                finally:
+                    workbook.close()
         except Exception as e:
             raise ValueError(f"无法读取Excel文件: {str(e)}")
+        return {
+            sheet: self._normalize_header(header) for sheet, header in headers.items()
+        }
+
+    @staticmethod
+    def _check_sheet(sheets, sheet):
+        """确认工作表存在，返回其序号 (sheet 为 None 时为第一个工作表)"""
+        if sheet is None:
+            return 0
+        if sheet not in sheets:
+            raise ValueError(f"工作表 '{sheet}' 不存在")
+        return sheets.index(sheet)
+
+    def _read_xlsx_header(self, filepath, sheet=None):
+        """
+        以只读模式流式读取第一行作为表头 (与 pd.read_excel 默认的 header=0 一致)
+
+        Returns:
+            (表头值列表, 工作表尺寸中的最大行号 (无法获取时为 None), 所有工作表名称)
+        """
+        workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            sheets = workbook.sheetnames
+            index = self._check_sheet(sheets, sheet)
+            return (*self._read_sheet_header(workbook.worksheets[index]), sheets)
+        finally:
+            workbook.close()
+
+    def _read_sheet_header(self, sheet):
+        """
+        读取只读工作表的表头，返回 (表头值列表, 最大行号)
+
+        只读模式下 max_row/max_column 来自工作表的 dimension 记录，不需要扫描数据；
+        记录缺失或不可靠时与 pd.read_excel 一样以实际读到的单元格为准，
+        此时最大行号返回 None (由调用方按文件大小估算)
+        """
+        max_row, max_column = sheet.max_row, sheet.max_column
+        # 过期的 dimension 记录会截断 iter_rows 读到的行和列，重置后按实际内容读取
+        sheet.reset_dimensions()
+        header = list(next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ()))
+        while header and header[-1] is None:
+            header.pop()
+        if max_column is not None and len(header) <= max_column < self.MAX_COLUMNS:
+            # 表头比数据窄时补齐，这些列会被命名为 Unnamed
+            header += [None] * (max_column - len(header))
+        else:
+            # 没有记录、记录比表头窄或是整张表的范围 (部分工具的写法)：
+            # 无法得知数据宽度，只保留表头的实际宽度，行数同样不可信
+            max_row = None
+        if (max_row or 0) <= 1 and all(value is None for value in header):
+            header = []  # 空工作表
+        return header, max_row
+
+    def _read_xls_header(self, filepath, sheet=None):
+        """读取 .xls 文件的表头 (按需加载工作表)，返回值同 _read_xlsx_header"""
+        import xlrd
+
+        workbook = xlrd.open_workbook(filepath, on_demand=True)
+        try:
+            sheets = workbook.sheet_names()
+            worksheet = workbook.sheet_by_index(self._check_sheet(sheets, sheet))
+            if worksheet.nrows == 0:
+                return [], 0, sheets
+            # xlrd 用空字符串表示空单元格，row_values 已按工作表宽度补齐
+            header = [
+                None if value == "" else value for value in worksheet.row_values(0)
+            ]
+            return header, worksheet.nrows, sheets
+        finally:
+            workbook.release_resources()
+
+    def _normalize_header(self, header):
+        """按 pd.read_excel 的规则处理表头：空列名、整数浮点和重复列名"""
+        columns = []
+        unnamed = []
+        for index, name in enumerate(header):
+            if name is None:
+                name = f"Unnamed: {index}"
+                unnamed.append(index)
+            elif isinstance(name, float) and name.is_integer():
+                name = int(name)
+            columns.append(name)
+
+        # 重复列名依次追加 .1、.2 后缀，跳过已存在的名称；空列名最后处理
+        counts = {}
+        named = [i for i in range(len(columns)) if i not in set(unnamed)]
+        for index in named + unnamed:
+            name = original = columns[index]
+            count = counts.get(name, 0)
+            while count > 0:
+                counts[original] = count + 1
+                name = f"{original}.{count}"
+                count = count + 1 if name in columns else counts.get(name, 0)
+            columns[index] = name
+            counts[name] = count + 1
+        return columns
 
     def preview_matches(
         self,
@@ -232,89 +1034,446 @@ class ExcelService:
         threshold=80,
         processing_mode="SELF_LEARNING",
         reference_column=None,
+        time_budget=None,
+        sample_size=None,
+        sheets=None,
+        reference_dictionary=None,
     ):
         """
         预览Excel文件的匹配结果
 
+        Args:
+            time_budget: 预览的时间预算 (秒)，从读取文件开始计时，超出后各列提前结束并给出估计值；
+                为 None 时使用 settings.EXCEL_PREVIEW_TIME_BUDGET，为 0 时不限制。
+                有时间预算时，未缓存的工作表最多解析前 EXCEL_PREVIEW_READ_ROWS 行，
+                自学习模式只从打分的唯一值学习，且预览不保存学习到的模式
+            sample_size: 每列最多匹配的唯一值数，超出时抽样估计；
+                为 None 时使用 settings.EXCEL_PREVIEW_SAMPLE_SIZE，为 0 时不限制
+            sheets: 要处理的工作表名称列表，为 None 时只处理第一个工作表；
+                指定时结果的键为 "工作表!列名"
+            reference_dictionary: 参照标准模式下使用的参照词典名称，指定时不使用标准列
+
         Returns:
             包含每列匹配统计和示例的字典
         """
+        self.stats = {"columns": {}}
+        if time_budget is None:
+            time_budget = getattr(settings, "EXCEL_PREVIEW_TIME_BUDGET", 0.8)
+        if sample_size is None:
+            sample_size = getattr(settings, "EXCEL_PREVIEW_SAMPLE_SIZE", 50_000)
+        deadline = time.monotonic() + time_budget if time_budget else None
+        started = time.perf_counter()
+        # 参照词典只用于参照标准模式，使用词典时不需要标准列
+        if processing_mode != "REFERENCE":
+            reference_dictionary = None
+        elif reference_dictionary:
+            reference_column = None
         try:
-            # 读取Excel文件
-            df = pd.read_excel(filepath)
+            # 只加载需要的列 (包括标准参照列)
+            needed_columns = list(columns_to_match)
+            if reference_column and reference_column not in needed_columns:
+                needed_columns.append(reference_column)
+            # 有时间预算时只解析前 read_rows 行，解析时间不随文件大小增长
+            read_rows = None
+            if deadline is not None:
+                read_rows = getattr(settings, "EXCEL_PREVIEW_READ_ROWS", 10_000) or None
+            if sheets:
+                frames = self._read_sheets(
+                    filepath, sheets, needed_columns, nrows=read_rows
+                )
+            else:
+                frames = {
+                    None: self._read_dataframe(
+                        filepath, needed_columns, nrows=read_rows
+                    )
+                }
+            # 只读取了部分行的工作表: {工作表名称: 估算的总行数 (无法估算时为 None)}
+            partial = {
+                sheet: self._partial_row_estimate(filepath, sheet, len(df), read_rows)
+                for sheet, df in frames.items()
+            }
 
             # 准备结果字典
             results = {}
 
             if processing_mode == "REFERENCE":
-                # 参照标准匹配模式
-                if reference_column not in df.columns:
-                    raise ValueError(f"标准参照列 '{reference_column}' 不存在")
+                # 参照标准匹配模式：所有工作表共用基于标准列 (或参照词典) 的匹配器
+                matcher = self._reference_matcher(
+                    frames, reference_column, reference_dictionary
+                )
 
-                # 获取标准列的唯一值作为匹配标准
-                standard_values = df[reference_column].dropna().unique()
+                # 处理选中的匹配列 (不包括标准列本身)
+                for sheet, df in frames.items():
+                    for column in columns_to_match:
+                        if column == reference_column or column not in df.columns:
+                            continue
+
+                        # 匹配该列的数据
+                        label = self._sheet_label(sheet, column)
+                        results[label] = self._preview_column(
+                            label,
+                            df[column],
+                            matcher,
+                            threshold,
+                            sample_size,
+                            deadline,
+                            row_estimate=partial[sheet],
+                        )
+            else:
+                # 自学习标准化模式：每个工作表的每列各自学习
+                for sheet, df in frames.items():
+                    for column in columns_to_match:
+                        if column not in df.columns:
+                            continue
+
+                        # 创建匹配器，在 _preview_column 中从打分的唯一值学习模式
+                        with self._timed("load_patterns"):
+                            matcher = self._learning_matcher(column)
+
+                        # 匹配该列的数据
+                        label = self._sheet_label(sheet, column)
+                        results[label] = self._preview_column(
+                            label,
+                            df[column],
+                            matcher,
+                            threshold,
+                            sample_size,
+                            deadline,
+                            learn=True,
+                            row_estimate=partial[sheet],
+                        )
 
-                # 创建基于标准列的匹配器
-                matcher = FuzzyMatcher(reference_values=standard_values)
+            return results
 
-                # 处理选中的匹配列 (不包括标准列本身)
-                for column in columns_to_match:
-                    if column == reference_column or column not in df.columns:
-                        continue
+        except Exception as e:
+            raise ValueError(f"预览Excel文件时发生错误: {str(e)}")
+        finally:
+            self._log_stats("预览", filepath, started)
 
-                    # 匹配该列的数据
-                    column_results = self._preview_column(
-                        df[column], matcher, threshold
-                    )
-                    results[column] = column_results
-            else:
-                # 自学习标准化模式
-                for column in columns_to_match:
-                    if column not in df.columns:
-                        continue
+    def _partial_row_estimate(self, filepath, sheet, rows, read_rows):
+        """
+        预览只解析了前 read_rows 行时返回工作表估算的数据行数，完整读取时返回 None
 
-                    # 创建匹配器并学习模式
-                    matcher = FuzzyMatcher(column_name=column)
-                    # 注意：learn_patterns 现在会处理签名和 cleaned_value
-                    matcher.learn_patterns(df[column])
+        Args:
+            filepath: Excel文件路径
+            sheet: 工作表名称 (None 表示第一个工作表)
+            rows: 实际读取的行数
+            read_rows: 预览最多解析的行数 (None 表示完整读取)
+        """
+        if read_rows is None or rows != read_rows:
+            return None
+        if filepath.lower().endswith(self.COLUMNAR_EXTENSIONS):
+            return None  # 列式格式总是完整读取
+        row_estimate = self.get_excel_summary(filepath, sheet)["row_estimate"]
+        if row_estimate is not None and row_estimate <= rows:
+            return None
+        return max(self._estimate_rows(filepath, row_estimate), rows)
 
-                    # 匹配该列的数据
-                    column_results = self._preview_column(
-                        df[column], matcher, threshold
-                    )
-                    results[column] = column_results
+    @staticmethod
+    def _sheet_label(sheet, column):
+        """结果和统计中使用的列标签：多工作表时为 "工作表!列名"，否则为列名"""
+        return column if sheet is None else f"{sheet}!{column}"
 
-            return results
+    def _reference_matcher(self, frames, reference_column, reference_dictionary=None):
+        """
+        用标准列的唯一值创建参照匹配器，指定参照词典时直接加载预编译的词典
+
+        Args:
+            frames: {工作表名称: DataFrame}，多个工作表时合并各表标准列的值
+            reference_dictionary: 参照词典名称
+        """
+        if reference_dictionary:
+            return self._dictionary_matcher(reference_dictionary)
+
+        columns = [
+            df[reference_column] for df in frames.values() if reference_column in df
+        ]
+        if not columns:
+            raise ValueError(f"标准参照列 '{reference_column}' 不存在")
+
+        # 获取标准列的唯一值作为匹配标准
+        standard_values = pd.concat(columns, ignore_index=True).dropna().unique()
+
+        # 创建基于标准列的匹配器
+        with self._timed("load_patterns"):
+            return FuzzyMatcher(
+                reference_values=standard_values, blocking=self.blocking
+            )
+
+    def _dictionary_matcher(self, name):
+        """按名称加载参照词典 (内存映射预编译文件，不重新构建) 并创建匹配器"""
+        with self._timed("load_patterns"):
+            return FuzzyMatcher.from_dictionary(
+                DictionaryStore().load(name), blocking=self.blocking
+            )
 
+    def _learning_matcher(self, column):
+        """
+        创建自学习模式的匹配器：默认从数据库加载该列已有的模式，
+        指定了预加载模式时从中加载 (同一列先学习的结果优先)，不访问数据库
+        """
+        if self.patterns is None:
+            return FuzzyMatcher(column_name=column, blocking=self.blocking)
+        matcher = FuzzyMatcher(blocking=self.blocking)
+        matcher.load_patterns(
+            self.learned_patterns.get(column) or self.patterns.get(column, {})
+        )
+        return matcher
+
+    def _keep_learned(self, column, matcher):
+        """保存学习到的模式：默认写入数据库，使用预加载模式时记录在 learned_patterns 中"""
+        if self.patterns is None:
+            matcher.save_patterns_to_db()
+        else:
+            self.learned_patterns[column] = matcher.patterns
+
+    def build_reference_dictionary(self, name, filepath, column, source_name=None):
+        """
+        用文件中一列的标准值构建 (或重新构建) 命名参照词典，大文件流式读取该列
+
+        Args:
+            name: 词典名称
+            filepath: 标准值列表文件 (Excel/CSV/Parquet)
+            column: 标准值所在的列
+            source_name: 记录的来源文件名，默认为文件名
+
+        Returns:
+            ReferenceDictionary 记录
+        """
+        self.stats = {"columns": {}}
+        started = time.perf_counter()
+        try:
+            if self._use_streaming_read(filepath):
+                workbook = openpyxl.load_workbook(
+                    filepath, read_only=True, data_only=True
+                )
+                try:
+                    sheet = workbook.worksheets[0]
+                    header = self._normalize_header(self._read_sheet_header(sheet)[0])
+                    if column not in header:
+                        raise ValueError(f"列 '{column}' 不存在")
+                    with self._timed("read"):
+                        values = self._collect_unique_values(sheet, header, [column])
+                    values = values[column]
+                finally:
+                    workbook.close()
+            else:
+                df = self._read_dataframe(filepath, [column])
+                if column not in df.columns:
+                    raise ValueError(f"列 '{column}' 不存在")
+                values = df[column].dropna().unique()
+
+            with self._timed("compile"):
+                return DictionaryStore().build(
+                    name,
+                    values,
+                    source_name or os.path.basename(filepath),
+                    column,
+                )
         except Exception as e:
-            raise ValueError(f"预览Excel文件时发生错误: {str(e)}")
+            raise ValueError(f"构建参照词典时发生错误: {str(e)}")
+        finally:
+            self._log_stats("构建参照词典", filepath, started)
 
-    def _preview_column(self, column_data, matcher, threshold):
-        """为单个列生成预览数据"""
+    def _preview_column(
+        self,
+        column,
+        column_data,
+        matcher,
+        threshold,
+        sample_size=0,
+        deadline=None,
+        learn=False,
+        row_estimate=None,
+    ):
+        """
+        为单个列生成预览数据
+
+        只对唯一值打分一次，修改数按 value_counts 的频次加权，并返回 0-100 各阈值下修改数的曲线。
+        唯一值超过 sample_size 或超出时间预算时提前结束：
+        频次最高的 sample_size/10 个唯一值 (分层的第一层) 全部匹配，其余唯一值按随机顺序匹配，
+        未匹配部分根据已匹配的随机样本估计修改数并给出置信区间
+
+        Args:
+            learn: 自学习模式，先从要打分的唯一值学习模式 (不保存到数据库)
+            row_estimate: 只解析了前几行时为工作表估算的总行数，结果只统计已解析的行
+        """
         total = len(column_data)
-        changed = 0
-        changed_pairs = []  # 存储 (原值, 标准值) 对
-
-        # 处理每个值
-        for value in column_data.dropna().tolist():
-            # 使用更新后的 match 方法
-            standardized, was_changed = matcher.match(value, threshold)
-            if was_changed:
-                changed += 1
-                # 只保存最多5个示例
-                if len(changed_pairs) < 5:
-                    # 确保存储的是原始值和匹配到的标准值
-                    changed_pairs.append((value, standardized))
+        before = matcher.stats.copy()
+        with self._timed("match"):
+            counts = column_data.dropna().value_counts()  # 按频次降序
+            uniques = counts.index.to_numpy(dtype=object)
+            weights = counts.to_numpy()
+
+            # 匹配顺序：高频层按频次，低频层随机打乱 (任意前缀都是随机样本)
+            limit = min(len(uniques), sample_size) if sample_size else len(uniques)
+            head_size = min(len(uniques), sample_size // 10) if sample_size else limit
+            tail_order = np.random.default_rng(0).permutation(len(uniques) - head_size)
+            order = np.concatenate([np.arange(head_size), head_size + tail_order])
+
+        if learn:
+            # 只从最多 sample_size 个要打分的唯一值学习，按在列中首次出现的顺序 (与处理时一致)
+            values = column_data
+            if limit < len(uniques):
+                first_seen = pd.Series(column_data.dropna().unique(), dtype=object)
+                values = first_seen[first_seen.isin(uniques[order[:limit]])]
+            with self._timed("learn"):
+                matcher.learn_patterns(values, save=False)
+
+        with self._timed("match"):
+            # 每个唯一值只打分一次，得到最佳候选和分数，任意阈值下的结果都可由此推出
+            candidates = uniques.copy()
+            differs = np.zeros(len(uniques), dtype=bool)
+            scores = np.full(len(uniques), -1.0)
+            evaluated = 0
+            while evaluated < limit:
+                # 每列的第一块不受时间预算限制，保证有可用于估计的样本
+                size = (
+                    self.PREVIEW_CHUNK_SIZE if evaluated else self.PREVIEW_FIRST_CHUNK
+                )
+                positions = order[evaluated : min(evaluated + size, limit)]
+                (
+                    candidates[positions],
+                    differs[positions],
+                    scores[positions],
+                ) = matcher.score_many(
+                    uniques[positions], deadline=deadline if evaluated else None
+                )
+                unscored = np.isnan(scores[positions])
+                if unscored.any():
+                    # 块内超时：只保留匹配顺序上连续打分的前缀，其余视为未匹配
+                    done = int(unscored.argmax())
+                    rest = positions[done:]
+                    candidates[rest] = uniques[rest]
+                    differs[rest] = False
+                    scores[rest] = -1.0
+                    evaluated += done
+                    break
+                evaluated += len(positions)
+                if deadline is not None and time.monotonic() > deadline:
+                    break
+
+        changed_flags = differs & (scores >= threshold)
+        # 只保存最多5个示例 (原值, 标准值)，按频次从高到低
+        matched_order = order[:evaluated]
+        example_positions = matched_order[changed_flags[matched_order]][:5]
+        changed_pairs = list(
+            zip(
+                uniques[example_positions].tolist(),
+                candidates[example_positions].tolist(),
+            )
+        )
+
+        # 阈值曲线：curve[t] 为阈值取 0-100 中的 t 时的修改数
+        curve = self._threshold_curve(weights, differs, scores, matched_order)
+        sampled = evaluated < len(uniques)
+        if sampled:
+            # 未匹配的唯一值按低频层的随机样本估计 (频次加权的比率估计)
+            sample = order[head_size:evaluated]
+            remaining_weight = weights[order[evaluated:]].sum()
+            if len(sample) >= 2:
+                ratio = self._threshold_curve(weights, differs, scores, sample)
+                curve = curve + ratio / weights[sample].sum() * remaining_weight
+            else:
+                curve = curve + remaining_weight / 2
+
+        changed = int(weights[changed_flags].sum())
+        self.stats["columns"][column] = {
+            "values": int(weights.sum()),
+            "unique": len(uniques),
+            "evaluated": evaluated,
+            "changed": changed,
+            # 预览打分与阈值无关，只统计快速匹配命中数和模糊打分规模
+            **self._counter_delta(
+                matcher,
+                before,
+                (
+                    "exact_hits",
+                    "signature_hits",
+                    "fuzzy_queries",
+                    "candidate_comparisons",
+                ),
+            ),
+        }
 
         # 计算百分比
         percentage = round((changed / total * 100), 1) if total > 0 else 0
-
-        return {
+        results = {
             "total": total,
             "changed": changed,
             "percentage": percentage,
             "examples": changed_pairs,
+            "sampled": sampled,
+            "threshold_curve": np.rint(curve).astype(int).tolist(),
+            "stats": self.stats["columns"][column],
+            # 只解析了前 total 行时为 True，row_estimate 为工作表估算的总行数
+            "partial": row_estimate is not None,
         }
+        if row_estimate is not None:
+            results["row_estimate"] = row_estimate
+
+        if sampled:
+            low, estimate, high = self._estimate_changed(
+                weights, changed_flags, order[head_size:evaluated], order[evaluated:]
+            )
+            results["changed"] = int(round(changed + estimate))
+            results["changed_range"] = [
+                int(np.floor(changed + low)),
+                int(np.ceil(changed + high)),
+            ]
+            results["percentage"] = (
+                round((results["changed"] / total * 100), 1) if total > 0 else 0
+            )
+            results["percentage_range"] = [
+                round((value / total * 100), 1) if total > 0 else 0
+                for value in results["changed_range"]
+            ]
+        return results
+
+    @staticmethod
+    def _threshold_curve(weights, differs, scores, positions):
+        """
+        按频次加权统计各阈值下的修改数，返回长度 101 的数组
+
+        分数 >= t 等价于 floor(分数) >= t，因此对 floor(分数) 做直方图后从高到低累加即可
+        """
+        positions = positions[differs[positions] & (scores[positions] >= 0)]
+        histogram = np.bincount(
+            np.floor(scores[positions]).astype(int).clip(0, 100),
+            weights=weights[positions],
+            minlength=101,
+        )
+        return histogram[::-1].cumsum()[::-1]
+
+    def _estimate_changed(self, weights, changed_flags, sampled, remaining):
+        """
+        用低频层已匹配的随机样本估计剩余唯一值的修改数 (按频次加权的比率估计)
+
+        Returns:
+            (置信下界, 估计值, 置信上界)
+        """
+        remaining_weight = float(weights[remaining].sum())
+        if len(sampled) < 2:
+            # 高频层都没有匹配完，没有可用的样本，只能给出上下界
+            return 0.0, remaining_weight / 2, remaining_weight
+
+        x = weights[sampled].astype(float)
+        y = x * changed_flags[sampled]
+        ratio = y.sum() / x.sum()
+        estimate = ratio * remaining_weight
+
+        # 比率估计的标准误差 (含有限总体校正)
+        n = len(sampled)
+        fpc = 1 - n / (n + len(remaining))
+        variance = fpc * ((y - ratio * x) ** 2).sum() / (n - 1) / n
+        error = (
+            self.PREVIEW_CONFIDENCE_Z * np.sqrt(variance) / x.mean() * remaining_weight
+        )
+        return (
+            max(0.0, estimate - error),
+            estimate,
+            min(remaining_weight, estimate + error),
+        )
 
     def process_excel_file(
         self,
@@ -323,6 +1482,11 @@ class ExcelService:
         threshold=80,
         processing_mode="SELF_LEARNING",
         reference_column=None,
+        progress_callback=None,
+        output_format="xlsx",
+        sheets=None,
+        reference_dictionary=None,
+        output_name=None,
     ):
         """
         处理Excel文件，根据选择的模式进行模糊匹配
@@ -333,98 +1497,121 @@ class ExcelService:
             threshold: 模糊匹配的阈值
             processing_mode: 处理模式，'SELF_LEARNING'(自学习) 或 'REFERENCE'(参照标准)
             reference_column: 标准参照列名称，仅在参照标准模式下使用
+            progress_callback: 进度回调 progress_callback(百分比, 说明)，按列和行块调用
+            output_format: 输出格式 'xlsx' (黄色高亮) / 'csv' / 'parquet'；
+                后两者另外写出一个同名的 _changes 文件记录每个单元格是否被标准化
+            sheets: 要处理的工作表名称列表，为 None 时只处理第一个工作表；
+                xlsx 输出时所有工作表写回同一个工作簿，CSV/Parquet 输出只能选择一个工作表
+            reference_dictionary: 参照标准模式下使用的参照词典名称，指定时不使用标准列，
+                所有选中的列都与词典匹配
+            output_name: 结果文件名 (不含 _Processed 后缀和扩展名)，默认为源文件名；
+                同一文件的多个处理结果同时存在时 (如后台任务) 需要指定不同的名称
 
         Returns:
             处理后的文件路径
         """
-        if processing_mode == "REFERENCE" and (
-            not reference_column or reference_column not in columns_to_match
+        # 参照词典只用于参照标准模式，使用词典时不需要标准列
+        if processing_mode != "REFERENCE":
+            reference_dictionary = None
+        elif reference_dictionary:
+            reference_column = None
+        if (
+            processing_mode == "REFERENCE"
+            and not reference_dictionary
+            and (not reference_column or reference_column not in columns_to_match)
         ):
             raise ValueError("参照标准匹配模式需要指定一个有效的标准列")
 
-        if processing_mode == "SELF_LEARNING":
-            return self.process_with_self_learning(
-                filepath, columns_to_match, threshold
-            )
-        else:
-            # 从列表中移除标准列，因为它不需要被匹配
-            match_columns = [col for col in columns_to_match if col != reference_column]
-            return self.process_with_reference_column(
-                filepath, reference_column, match_columns, threshold
-            )
+        if output_format not in self.OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {output_format}")
+
+        if sheets and len(set(sheets)) > 1 and output_format != "xlsx":
+            raise ValueError("处理多个工作表时只支持 xlsx 输出格式")
+
+        self.stats = {"columns": {}}
+        self.progress_callback = progress_callback
+        self.output_format = output_format
+        self.output_name = output_name
+
+        started = time.perf_counter()
+        try:
+            if sheets:
+                return self.process_sheets(
+                    filepath,
+                    sheets,
+                    columns_to_match,
+                    threshold,
+                    processing_mode,
+                    reference_column,
+                    reference_dictionary,
+                )
+
+            # 流式处理直接写出 xlsx，其他输出格式走 DataFrame 路径
+            if output_format == "xlsx" and self._use_streaming_read(filepath):
+                match_columns = columns_to_match
+                if processing_mode == "REFERENCE":
+                    match_columns = [
+                        col for col in columns_to_match if col != reference_column
+                    ]
+                return self.process_streaming(
+                    filepath,
+                    match_columns,
+                    threshold,
+                    processing_mode,
+                    reference_column,
+                    reference_dictionary,
+                )
+
+            if processing_mode == "SELF_LEARNING":
+                return self.process_with_self_learning(
+                    filepath, columns_to_match, threshold
+                )
+            else:
+                # 从列表中移除标准列，因为它不需要被匹配
+                match_columns = [
+                    col for col in columns_to_match if col != reference_column
+                ]
+                return self.process_with_reference_column(
+                    filepath,
+                    reference_column,
+                    match_columns,
+                    threshold,
+                    reference_dictionary,
+                )
+        finally:
+            self._log_stats("处理", filepath, started)
 
     def process_with_self_learning(self, filepath, columns_to_match, threshold=80):
         """使用自学习模式处理Excel文件"""
-        temp_filepath = None
         try:
-            # 读取Excel文件
-            df = pd.read_excel(filepath)
-
-            # 生成输出文件名
-            basename = os.path.basename(filepath)
-            name, ext = os.path.splitext(basename)
-            output_filepath = os.path.join(
-                self.processed_path, f"{name}_Processed{ext}"
-            )
+            # 读取Excel文件 (优先使用解析缓存)
+            df = self._read_dataframe(filepath)
+            self._start_progress(df, columns_to_match)
 
-            # 保存临时文件，以便稍后添加样式
-            temp_filepath = os.path.join(self.processed_path, f"{name}_temp{ext}")
+            # 对每个选中的列进行模糊匹配 (每列使用独立的匹配器)
+            columns = [column for column in columns_to_match if column in df.columns]
+            matches = self._match_columns(df, columns, threshold)
 
-            # 变化跟踪：(行索引, 列名, 原值, 新值)
-            changes = []
+            # 变化跟踪：{新列名: (原列名, 是否修改的布尔数组)}
+            changed_masks = {}
+            for column in columns:
+                # 新列名：原列名_标准
+                df = self._add_standardized_column(
+                    df, column, f"{column}_标准", *matches[column], changed_masks
+                )
 
-            # 对每个选中的列进行模糊匹配
-            for column in columns_to_match:
-                if column in df.columns:
-                    # 创建匹配器并学习模式
-                    matcher = FuzzyMatcher(column_name=column)
-                    matcher.learn_patterns(df[column])
-
-                    # 新列名：原列名_标准
-                    std_column_name = f"{column}_标准"
-
-                    # 应用模糊匹配并跟踪变化
-                    df[std_column_name] = df[column].copy()  # 初始化新列
-                    for idx, value in df[column].items():
-                        # 使用更新后的 match 方法
-                        matched_value, was_changed = matcher.match(value, threshold)
-                        df.at[idx, std_column_name] = matched_value
-                        if was_changed:
-                            # 记录变化，使用 std_column_name 作为列名
-                            changes.append((idx, std_column_name, value, matched_value))
-
-                    # 将新列插入到原列右侧
-                    column_index = df.columns.get_loc(column)
-                    columns = df.columns.tolist()
-                    # 确保新列不在旧列表中，然后插入
-                    if std_column_name in columns:
-                        columns.remove(std_column_name)
-                    columns.insert(column_index + 1, std_column_name)
-                    df = df[columns]
-
-            # 保存处理后的文件（不含样式）
-            df.to_excel(temp_filepath, index=False)
-
-            # 使用openpyxl添加样式
-            self._add_highlighting(temp_filepath, output_filepath, changes)
-
-            return output_filepath
+            return self._save_output(df, filepath, changed_masks)
 
         except Exception as e:
             raise ValueError(f"处理Excel文件时发生错误: {str(e)}")
 
-        finally:
-            # 确保临时文件被删除
-            if temp_filepath and os.path.exists(temp_filepath):
-                for _ in range(3):
-                    try:
-                        os.remove(temp_filepath)
-                        break
-                    except Exception:
-                        time.sleep(0.2)
-
     def process_with_reference_column(
-        self, filepath, reference_column, columns_to_match, threshold=80
+        self,
+        filepath,
+        reference_column,
+        columns_to_match,
+        threshold=80,
+        reference_dictionary=None,
     ):
         """
         使用参照标准列匹配模式处理Excel文件
@@ -434,108 +1621,828 @@ class ExcelService:
             reference_column: 作为标准的参照列名
             columns_to_match: 需要匹配的列名列表 (不含标准列)
             threshold: 模糊匹配的阈值
+            reference_dictionary: 参照词典名称，指定时用词典代替标准列
 
         Returns:
             处理后的文件路径
         """
-        temp_filepath = None
         try:
-            # 读取Excel文件
-            df = pd.read_excel(filepath)
+            # 读取Excel文件 (优先使用解析缓存)
+            df = self._read_dataframe(filepath)
 
-            # 确认标准列存在
-            if reference_column not in df.columns:
-                raise ValueError(f"标准参照列 '{reference_column}' 不存在")
+            # 创建基于标准列的匹配器 (同时确认标准列存在)
+            matcher = self._reference_matcher(
+                {None: df}, reference_column, reference_dictionary
+            )
+            self._start_progress(df, columns_to_match)
+
+            # 对每个选中的列进行模糊匹配 (所有列共用参照匹配器)
+            columns = [column for column in columns_to_match if column in df.columns]
+            matches = self._match_columns(df, columns, threshold, matcher)
+
+            # 变化跟踪：{新列名: (原列名, 是否修改的布尔数组)}
+            changed_masks = {}
+            for column in columns:
+                # 新列名：原列名_标准匹配
+                df = self._add_standardized_column(
+                    df, column, f"{column}_标准匹配", *matches[column], changed_masks
+                )
+
+            return self._save_output(df, filepath, changed_masks)
+
+        except Exception as e:
+            raise ValueError(f"处理Excel文件时发生错误: {str(e)}")
 
-            # 生成输出文件名
-            basename = os.path.basename(filepath)
-            name, ext = os.path.splitext(basename)
-            output_filepath = os.path.join(
-                self.processed_path, f"{name}_Processed{ext}"
+    def process_sheets(
+        self,
+        filepath,
+        sheets,
+        columns_to_match,
+        threshold=80,
+        processing_mode="SELF_LEARNING",
+        reference_column=None,
+        reference_dictionary=None,
+    ):
+        """
+        处理多个工作表：只解析选中的工作表，所有工作表的待匹配列一起并行匹配
+        (参照标准模式共用一个合并了各表标准列的匹配器，自学习模式每个工作表的每列各自学习)，
+        结果按原顺序写回同一个工作簿，未选中的工作表逐行复制，不解析为 DataFrame
+
+        Returns:
+            处理后的文件路径
+        """
+        try:
+            all_sheets = self.get_excel_summary(filepath)["sheets"]
+            for sheet in sheets:
+                self._check_sheet(all_sheets, sheet)
+
+            frames = self._read_sheets(filepath, list(dict.fromkeys(sheets)))
+
+            reference_matcher = None
+            suffix = "_标准"
+            match_columns = columns_to_match
+            if processing_mode == "REFERENCE":
+                reference_matcher = self._reference_matcher(
+                    frames, reference_column, reference_dictionary
+                )
+                suffix = "_标准匹配"
+                match_columns = [
+                    col for col in columns_to_match if col != reference_column
+                ]
+
+            # 任务：(标签, 列名, 列数据)，标签为 "工作表!列名"
+            tasks = [
+                (self._sheet_label(sheet, column), column, df[column])
+                for sheet, df in frames.items()
+                for column in match_columns
+                if column in df.columns
+            ]
+            # 进度：每个任务各算一遍行数，写出选中的工作表再算一遍
+            self._progress_total = max(
+                sum(len(values) for _, _, values in tasks)
+                + sum(len(df) for df in frames.values()),
+                1,
             )
+            self._progress_done = 0
+            matches = self._match_tasks(tasks, threshold, reference_matcher)
+
+            # 每个工作表的结果：{工作表名称: (DataFrame, 变化跟踪)}
+            outputs = {}
+            for sheet, df in frames.items():
+                changed_masks = {}
+                for column in match_columns:
+                    label = self._sheet_label(sheet, column)
+                    if label in matches:
+                        df = self._add_standardized_column(
+                            df,
+                            column,
+                            f"{column}{suffix}",
+                            *matches[label],
+                            changed_masks,
+                        )
+                outputs[sheet] = (df, changed_masks)
+
+            if self.output_format != "xlsx":
+                # 列式格式没有工作表，只输出选中的一个工作表
+                ((df, changed_masks),) = outputs.values()
+                return self._save_output(df, filepath, changed_masks)
+
+            output_filepath = self._output_path(filepath)
+            with self._timed("write"):
+                self._write_sheets(filepath, all_sheets, outputs, output_filepath)
+            return output_filepath
+
+        except Exception as e:
+            raise ValueError(f"处理Excel文件时发生错误: {str(e)}")
 
-            # 保存临时文件，以便稍后添加样式
-            temp_filepath = os.path.join(self.processed_path, f"{name}_temp{ext}")
-
-            # 获取标准列的唯一值作为匹配标准
-            standard_values = df[reference_column].dropna().unique()
-
-            # 创建基于标准列的匹配器
-            matcher = FuzzyMatcher(reference_values=standard_values)
-
-            # 变化跟踪：(行索引, 列名, 原值, 新值)
-            changes = []
-
-            # 对每个选中的列进行模糊匹配
-            for column in columns_to_match:
-                if column in df.columns:
-                    # 新列名：原列名_标准匹配
-                    std_column_name = f"{column}_标准匹配"
-
-                    # 应用模糊匹配并跟踪变化
-                    df[std_column_name] = df[column].copy()  # 初始化新列
-                    for idx, value in df[column].items():
-                        # 使用更新后的 match 方法
-                        matched_value, was_changed = matcher.match(value, threshold)
-                        df.at[idx, std_column_name] = matched_value
-                        if was_changed:
-                            # 记录变化，使用 std_column_name 作为列名
-                            changes.append((idx, std_column_name, value, matched_value))
-
-                    # 将新列插入到原列右侧
-                    column_index = df.columns.get_loc(column)
-                    columns = df.columns.tolist()
-                    # 确保新列不在旧列表中，然后插入
-                    if std_column_name in columns:
-                        columns.remove(std_column_name)
-                    columns.insert(column_index + 1, std_column_name)
-                    df = df[columns]
-
-            # 保存处理后的文件（不含样式）
-            df.to_excel(temp_filepath, index=False)
-
-            # 使用openpyxl添加样式
-            self._add_highlighting(temp_filepath, output_filepath, changes)
+    def _use_streaming_read(self, filepath):
+        """.xlsx 文件的数据行数达到 EXCEL_STREAMING_READ_ROWS 时改用流式处理"""
+        min_rows = getattr(settings, "EXCEL_STREAMING_READ_ROWS", 200_000)
+        if not min_rows or not filepath.lower().endswith((".xlsx", ".xlsm")):
+            return False
+        row_estimate = self.get_excel_summary(filepath)["row_estimate"]
+        return self._estimate_rows(filepath, row_estimate) >= min_rows
+
+    def _estimate_rows(self, filepath, row_estimate):
+        """数据行数估计：工作表没有尺寸记录时 (如 write_only 生成的文件) 按文件大小估算"""
+        if row_estimate is not None:
+            return row_estimate
+        return os.path.getsize(filepath) // self.BYTES_PER_ROW_ESTIMATE
+
+    def process_streaming(
+        self,
+        filepath,
+        columns_to_match,
+        threshold=80,
+        processing_mode="SELF_LEARNING",
+        reference_column=None,
+        reference_dictionary=None,
+    ):
+        """
+        流式处理大文件，内存占用只与块大小和模式表有关，与文件大小无关：
+        1. 第一遍只读取选中的列 (和标准列)，按块收集唯一值。
+        2. 学习模式或加载标准列，对每列的唯一值完成匹配。
+        3. 第二遍逐块读取整行，直接写入 write_only 工作簿并高亮。
+
+        与 pandas 路径不同，单元格按原值写出，不做类型推断和空值字符串转换
+
+        Args:
+            columns_to_match: 需要匹配的列名列表 (不含标准列)
+            reference_dictionary: 参照词典名称，指定时用词典代替标准列
+
+        Returns:
+            处理后的文件路径
+        """
+        # 使用参照词典时不需要读取标准列
+        use_reference_column = (
+            processing_mode == "REFERENCE" and not reference_dictionary
+        )
+        # 两遍读取共用同一个只读工作簿 (没有尺寸记录的工作表每次加载都要完整解析一遍)
+        workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            sheet = workbook.worksheets[0]
+            header, max_row = self._read_sheet_header(sheet)
+            header = self._normalize_header(header)
+            if use_reference_column and reference_column not in header:
+                raise ValueError(f"标准参照列 '{reference_column}' 不存在")
+            columns = [column for column in columns_to_match if column in header]
+            # 进度：读取一遍、写出一遍
+            row_estimate = max(max_row - 1, 0) if max_row is not None else None
+            self._progress_total = max(
+                self._estimate_rows(filepath, row_estimate) * 2, 1
+            )
+            self._progress_done = 0
+
+            needed_columns = list(columns)
+            if use_reference_column and reference_column not in columns:
+                needed_columns.append(reference_column)
+            with self._timed("read"):
+                uniques = self._collect_unique_values(sheet, header, needed_columns)
+
+            if reference_dictionary:
+                matcher = self._dictionary_matcher(reference_dictionary)
+                suffix = "_标准匹配"
+            elif processing_mode == "REFERENCE":
+                # 创建基于标准列的匹配器 (所有列共用)
+                with self._timed("load_patterns"):
+                    matcher = FuzzyMatcher(
+                        reference_values=uniques[reference_column],
+                        blocking=self.blocking,
+                    )
+                suffix = "_标准匹配"
+            else:
+                suffix = "_标准"
 
+            # 对每列的唯一值完成匹配
+            lookups = {}
+            for column in columns:
+                values = pd.Series(uniques[column], dtype=object)
+                if processing_mode != "REFERENCE":
+                    # 创建匹配器并学习模式
+                    self._report_progress(f"正在学习列 {column} 的匹配模式")
+                    with self._timed("load_patterns"):
+                        matcher = self._learning_matcher(column)
+                    with self._timed("learn"):
+                        matcher.learn_patterns(values, save=False)
+                        self._keep_learned(column, matcher)
+                self._report_progress(f"正在匹配列 {column}")
+                before = matcher.stats.copy()
+                with self._timed("match"):
+                    results, changed = matcher.match_many(values.to_numpy(), threshold)
+                    lookups[column] = self._unique_lookup(values, results, changed)
+                # values 在写出时改为实际行数
+                self.stats["columns"][column] = self._counter_delta(matcher, before)
+
+            output_filepath = self._output_path(filepath)
+            with self._timed("write"):
+                self._write_streaming(sheet, header, output_filepath, lookups, suffix)
             return output_filepath
 
         except Exception as e:
             raise ValueError(f"处理Excel文件时发生错误: {str(e)}")
+        finally:
+            workbook.close()
+
+    def _iter_sheet_chunks(self, sheet, width, **kwargs):
+        """逐块读取只读工作表的数据行 (不含表头)，每块为行元组的列表"""
+        chunk = []
+        for row in sheet.iter_rows(
+            min_row=2, max_col=width, values_only=True, **kwargs
+        ):
+            chunk.append(row)
+            if len(chunk) >= self.STREAM_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _collect_unique_values(self, sheet, header, columns):
+        """
+        第一遍：只读取需要的列，收集每列的非空唯一值
+
+        Returns:
+            {列名: 唯一值列表}，按首次出现的顺序 (与 Series.unique 一致)
+        """
+        indices = {column: header.index(column) for column in columns}
+        if not indices:
+            return {}
+        first = min(indices.values())
+        seen = {column: {} for column in columns}
+        for chunk in self._iter_sheet_chunks(
+            sheet, max(indices.values()) + 1, min_col=first + 1
+        ):
+            for column, index in indices.items():
+                seen[column].update(dict.fromkeys(row[index - first] for row in chunk))
+            self._report_progress("正在读取待匹配的列", advance=len(chunk))
+        for values in seen.values():
+            values.pop(None, None)
+        return {column: list(values) for column, values in seen.items()}
+
+    @staticmethod
+    def _unique_lookup(values, results, changed):
+        """
+        把唯一值的匹配结果整理为查找表：只有字符串会被匹配
+
+        Returns:
+            ({原值: 标准值} (只含与原值不同的), 被标准化的原值集合)
+        """
+        replacements = {}
+        changed_values = set()
+        for value, result, is_changed in zip(values, results, changed):
+            if not isinstance(value, str):
+                continue
+            if result != value:
+                replacements[value] = result
+            if is_changed:
+                changed_values.add(value)
+        return replacements, changed_values
+
+    def _write_streaming(self, sheet, header, output_file, lookups, suffix):
+        """
+        第二遍：逐块读取整行并写出，标准列插入到原列右侧，被标准化的单元格直接高亮。
+        与 pd.read_excel 一致，中间的空行保留，末尾的空行丢弃
+        """
+        workbook = openpyxl.Workbook(write_only=True)
+        output_sheet = workbook.create_sheet(title="Sheet1")
+
+        # 输出列布局: (源列位置, 匹配列名 或 None 表示原样输出)
+        std_names = {f"{column}{suffix}" for column in lookups}
+        layout = []
+        for index, name in enumerate(header):
+            if name in std_names and name not in lookups:
+                continue  # 与新生成的标准列同名的旧列被替换
+            layout.append((index, None))
+            if name in lookups:
+                layout.append((index, name))
+
+        # 表头样式与 pandas.DataFrame.to_excel 保持一致
+        header_cells = []
+        for index, column in layout:
+            name = header[index] if column is None else f"{column}{suffix}"
+            cell = WriteOnlyCell(output_sheet, value=name)
+            cell.font = self.HEADER_FONT
+            cell.border = self.HEADER_BORDER
+            cell.alignment = self.HEADER_ALIGNMENT
+            header_cells.append(cell)
+        output_sheet.append(header_cells)
+
+        counts = Counter()
+        total_rows = 0
+        empty_rows = 0
+        for chunk in self._iter_sheet_chunks(sheet, len(header)):
+            for row in chunk:
+                if all(value is None for value in row):
+                    empty_rows += 1  # 后面还有数据时才写出
+                    continue
+                for _ in range(empty_rows):
+                    output_sheet.append([None] * len(layout))
+                total_rows += empty_rows + 1
+                empty_rows = 0
+
+                output_row = []
+                for index, column in layout:
+                    value = row[index] if index < len(row) else None
+                    if column is None:
+                        output_row.append(value)
+                        continue
+                    if not isinstance(value, str):
+                        output_row.append(value)
+                        continue
+                    replacements, changed_values = lookups[column]
+                    result = replacements.get(value, value)
+                    if value in changed_values:
+                        counts[column] += 1
+                        result = WriteOnlyCell(output_sheet, value=result)
+                        result.fill = self.YELLOW_FILL
+                    output_row.append(result)
+                output_sheet.append(output_row)
+            self._report_progress("正在写出结果文件", advance=len(chunk))
+
+        for column in lookups:
+            self.stats["columns"][column]["values"] = total_rows
+            self.stats["columns"][column]["changed"] = counts[column]
+        self._report_progress("正在保存结果文件")
+        workbook.save(output_file)
+
+    def _match_columns(self, df, columns, threshold, reference_matcher=None):
+        """匹配一个数据表的多列，返回 {列名: (匹配结果数组, 是否修改的布尔数组)}"""
+        return self._match_tasks(
+            [(column, column, df[column]) for column in columns],
+            threshold,
+            reference_matcher,
+        )
+
+    def _match_tasks(self, tasks, threshold, reference_matcher=None):
+        """
+        匹配多个列任务，返回 {标签: (匹配结果数组, 是否修改的布尔数组)}
+
+        Args:
+            tasks: (标签, 列名, 列数据) 列表，标签用作结果和统计的键
+                (多工作表时为 "工作表!列名")，自学习模式按列名加载和保存模式
+            reference_matcher: 为 None 时为自学习模式，每个任务创建独立的匹配器并学习模式；
+                否则所有任务共用该参照匹配器。任务数和数据量足够大时使用进程池并行处理。
+        """
+        if self._use_process_pool(tasks):
+            return self._match_tasks_in_pool(tasks, threshold, reference_matcher)
+
+        matches = {}
+        for label, column, values in tasks:
+            matcher = reference_matcher
+            if matcher is None:
+                # 创建匹配器并学习模式
+                self._report_progress(f"正在学习列 {label} 的匹配模式")
+                with self._timed("load_patterns"):
+                    matcher = self._learning_matcher(column)
+                with self._timed("learn"):
+                    matcher.learn_patterns(values, save=False)
+                    self._keep_learned(column, matcher)
+            with self._timed("match"):
+                matches[label] = self._match_column(label, values, matcher, threshold)
+        return matches
+
+    def _use_process_pool(self, tasks):
+        """多列且数据量足够大时才使用进程池，小文件的进程启动开销得不偿失"""
+        min_cells = getattr(settings, "EXCEL_PARALLEL_MIN_CELLS", 200_000)
+        return (
+            (self.workers or worker_count()) > 1
+            and len(tasks) > 1
+            and sum(len(values) for _, _, values in tasks) >= min_cells
+        )
+
+    def _match_tasks_in_pool(self, tasks, threshold, reference_matcher):
+        """
+        用进程池并行匹配多列：每列只把唯一值和模式表发送给子进程，
+        子进程返回唯一值的结果 (自学习模式下还有学习到的模式)，
+        再由父进程广播回每一行；数据库的读写都在父进程中完成
+        """
+        if reference_matcher is None:
+            # 已有模式在父进程中从数据库 (或预加载的模式) 加载
+            with self._timed("load_patterns"):
+                matchers = {
+                    label: self._learning_matcher(column) for label, column, _ in tasks
+                }
+        else:
+            matchers = {label: reference_matcher for label, _, _ in tasks}
+        futures = {}
+        matches = {}
+        # 各列的学习、匹配和保存在进程池中交错进行，整体计入 match 阶段
+        with (
+            self._timed("match"),
+            create_pool(min(self.workers or worker_count(), len(tasks))) as executor,
+        ):
+            for label, column, series in tasks:
+                values = series.to_numpy(dtype=object)
+                codes, uniques = pd.factorize(values)
+                future = executor.submit(
+                    match_unique_values,
+                    matchers[label].patterns,
+                    uniques,
+                    threshold,
+                    reference_matcher is None,
+                    matchers[label].blocking,
+                )
+                futures[future] = (label, column, values, codes, uniques)
+
+            for future in as_completed(futures):
+                label, column, values, codes, uniques = futures[future]
+                unique_results, unique_changed, learned, counts = future.result()
+                if learned is not None:
+                    # 学习到的模式统一在父进程中保存
+                    matchers[label].load_patterns(learned)
+                    self._keep_learned(column, matchers[label])
+
+                matched_values, changed_mask = self._broadcast_unique_results(
+                    values, codes, uniques, unique_results, unique_changed
+                )
+                matches[label] = (matched_values, changed_mask)
+                column_stats = {
+                    key: counts.get(key, 0) for key in FuzzyMatcher.COUNTER_KEYS
+                }
+                column_stats["values"] = len(values)
+                column_stats["unique"] = len(uniques)
+                column_stats["changed"] = int(changed_mask.sum())
+                self.stats["columns"][label] = column_stats
+                self._report_progress(f"列 {label} 匹配完成", advance=len(values))
+        return matches
+
+    @staticmethod
+    def _broadcast_unique_results(
+        values, codes, uniques, unique_results, unique_changed
+    ):
+        """将唯一值的匹配结果映射回每一行 (只有字符串会被匹配，其余值保持原样)"""
+        matched_values = values.copy()
+        changed_mask = np.zeros(len(values), dtype=bool)
+        is_text = np.array([isinstance(value, str) for value in uniques], dtype=bool)
+        positions = np.flatnonzero(codes >= 0)
+        positions = positions[is_text[codes[positions]]]
+        matched_values[positions] = unique_results[codes[positions]]
+        changed_mask[positions] = unique_changed[codes[positions]]
+        return matched_values, changed_mask
+
+    def _match_column(self, column, values, matcher, threshold):
+        """
+        按行块批量匹配一列，每块报告一次进度，并记录该列的去重和缓存命中统计
+        (块之间重复的值由匹配器的 LRU 缓存复用)
+        """
+        before = matcher.stats.copy()
+        values = np.asarray(values, dtype=object)
+        matched_values = np.empty(len(values), dtype=object)
+        changed_mask = np.zeros(len(values), dtype=bool)
+        for start in range(0, len(values), self.MATCH_CHUNK_SIZE):
+            stop = start + self.MATCH_CHUNK_SIZE
+            matched_values[start:stop], changed_mask[start:stop] = matcher.match_many(
+                values[start:stop], threshold
+            )
+            self._report_progress(
+                f"正在匹配列 {column} ({min(stop, len(values))}/{len(values)})",
+                advance=len(values[start:stop]),
+            )
 
+        column_stats = self._counter_delta(matcher, before)
+        column_stats["changed"] = int(changed_mask.sum())
+        self.stats["columns"][column] = column_stats
+        return matched_values, changed_mask
+
+    def _add_standardized_column(
+        self, df, column, std_column_name, matched_values, changed_mask, changed_masks
+    ):
+        """
+        将一列的匹配结果作为新列插入到原列右侧，并记录变化
+
+        Returns:
+            插入新列后的 DataFrame
+        """
+        df[std_column_name] = matched_values
+        changed_masks[std_column_name] = (column, changed_mask)
+
+        # 将新列插入到原列右侧
+        column_index = df.columns.get_loc(column)
+        columns = df.columns.tolist()
+        # 确保新列不在旧列表中，然后插入
+        if std_column_name in columns:
+            columns.remove(std_column_name)
+        columns.insert(column_index + 1, std_column_name)
+        # 浅拷贝去掉 df[列表] 的视图标记，下一列再新增列时不会触发 SettingWithCopyWarning
+        return df[columns].copy(deep=False)
+
+    def _save_output(self, df, filepath, changed_masks):
+        """
+        保存处理结果并高亮被标准化的单元格
+
+        Returns:
+            处理后的文件路径
+        """
+        if self.output_format != "xlsx":
+            output_filepath = self._output_path(filepath, self.output_format)
+            with self._timed("write"):
+                self._write_columnar(df, output_filepath, changed_masks)
+            return output_filepath
+
+        output_filepath = self._output_path(filepath)
+
+        if getattr(settings, "EXCEL_STREAMING_WRITE", True):
+            with self._timed("write"):
+                self._write_with_highlighting(df, output_filepath, changed_masks)
+            return output_filepath
+
+        # 兼容路径：先用 pandas 写出，再重新加载工作簿添加高亮
+        temp_filepath = f"{os.path.splitext(output_filepath)[0]}_temp.xlsx"
+        try:
+            self._report_progress("正在写出结果文件")
+            with self._timed("write"):
+                df.to_excel(temp_filepath, index=False)
+            self._report_progress("正在添加高亮标记", advance=len(df))
+            # 单元格的值由 to_excel 直接写出，不需要再逐个核对
+            self._add_highlighting(
+                temp_filepath,
+                output_filepath,
+                self._collect_changes(df, changed_masks),
+                verify=False,
+            )
         finally:
             # 确保临时文件被删除
-            if temp_filepath and os.path.exists(temp_filepath):
+            if os.path.exists(temp_filepath):
                 for _ in range(3):
                     try:
                         os.remove(temp_filepath)
                         break
                     except Exception:
                         time.sleep(0.2)
+        return output_filepath
 
-    def _add_highlighting(self, input_file, output_file, changes):
-        """为已处理的Excel文件添加黄色高亮标记"""
-        workbook = openpyxl.load_workbook(input_file)
-        sheet = workbook.active
-
-        # Excel行索引从1开始，而且有表头，所以pandas的行索引需要+2
-        for row_idx, col_name, old_value, new_value in changes:
-            # 查找列的Excel索引 (列名现在是 *_标准 或 *_标准匹配)
-            col_idx = None
-            for i, cell in enumerate(sheet[1], 1):  # 遍历第一行（表头）
-                if cell.value == col_name:
-                    col_idx = i
-                    break
+    def _output_path(self, filepath, output_format="xlsx"):
+        """生成输出文件名：output_name (默认为源文件名) 加 _Processed 后缀"""
+        name = self.output_name or os.path.splitext(os.path.basename(filepath))[0]
+        return os.path.join(self.processed_path, f"{name}_Processed.{output_format}")
 
-            if col_idx is not None:
-                # 在Excel中应用高亮 (行索引是 pandas索引 + 2)
-                cell = sheet.cell(row=row_idx + 2, column=col_idx)
-                # 确认单元格值确实是匹配后的新值
-                # 注意：Excel读取的值可能是数字，需要与 new_value 类型匹配比较
-                cell_value_str = str(cell.value) if cell.value is not None else ""
-                new_value_str = str(new_value) if new_value is not None else ""
-                if cell_value_str == new_value_str:
-                    cell.fill = self.YELLOW_FILL
+    @staticmethod
+    def changes_path(output_file):
+        """CSV/Parquet 结果对应的变化标记文件路径"""
+        name, ext = os.path.splitext(output_file)
+        return f"{name}_changes{ext}"
+
+    def _write_columnar(self, df, output_file, changed_masks):
+        """
+        以 CSV/Parquet 写出结果，不使用单元格高亮：
+        另外写出 _changes 文件，每个标准列一列布尔值，标记该行的值是否被标准化
+        """
+        changes = pd.DataFrame(
+            {name: mask for name, (_, mask) in changed_masks.items()}, index=df.index
+        )
+        self._report_progress("正在写出结果文件")
+        if output_file.endswith(".parquet"):
+            if not HAS_PYARROW:
+                raise ValueError("写出 Parquet 文件需要安装 pyarrow")
+            self._arrow_compatible(df).to_parquet(output_file, index=False)
+            changes.to_parquet(self.changes_path(output_file), index=False)
+        else:
+            df.to_csv(output_file, index=False)
+            changes.to_csv(self.changes_path(output_file), index=False)
+        self._report_progress("正在保存结果文件", advance=len(df))
+
+    @staticmethod
+    def _arrow_compatible(df):
+        """Arrow 不支持混合类型的列：这类 object 列中的非字符串值转换为字符串"""
+        df = df.copy(deep=False)
+        for name in df.columns[df.dtypes == object]:
+            column = df[name]
+            kinds = column.dropna().map(type).unique()
+            if len(kinds) > 1:
+                df[name] = column.where(column.isna(), column.astype(str))
+        return df
+
+    def _write_with_highlighting(self, df, output_file, changed_masks):
+        """
+        单次流式写出处理结果：write_only 工作簿逐行写入，
+        被标准化的单元格在写入时直接加上黄色高亮，不需要临时文件和二次加载
+        """
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet(title="Sheet1")
+        self._write_frame(sheet, df, changed_masks)
 
-        # 保存带有样式的工作簿
+        self._report_progress("正在保存结果文件")
         workbook.save(output_file)
-        workbook.close()
+
+    def _write_frame(self, sheet, df, changed_masks):
+        """把 DataFrame 逐行写入 write_only 工作表，被标准化的单元格加上黄色高亮"""
+        # 表头样式与 pandas.DataFrame.to_excel 保持一致
+        header = []
+        for name in df.columns:
+            cell = WriteOnlyCell(sheet, value=name)
+            cell.font = self.HEADER_FONT
+            cell.border = self.HEADER_BORDER
+            cell.alignment = self.HEADER_ALIGNMENT
+            header.append(cell)
+        sheet.append(header)
+
+        masks = [
+            changed_masks[name][1] if name in changed_masks else None
+            for name in df.columns
+        ]
+        highlighted = [i for i, mask in enumerate(masks) if mask is not None]
+
+        # 按块把列转换为 Python 值，内存占用只与块大小有关
+        for start in range(0, len(df), self.WRITE_CHUNK_SIZE):
+            chunk = df.iloc[start : start + self.WRITE_CHUNK_SIZE]
+            columns = [
+                self._excel_values(chunk.iloc[:, i]) for i in range(chunk.shape[1])
+            ]
+            for offset, row in enumerate(zip(*columns)):
+                position = start + offset
+                if highlighted:
+                    row = list(row)
+                    for i in highlighted:
+                        if masks[i][position]:
+                            cell = WriteOnlyCell(sheet, value=row[i])
+                            cell.fill = self.YELLOW_FILL
+                            row[i] = cell
+                sheet.append(row)
+            self._report_progress("正在写出结果文件", advance=len(chunk))
+
+    def _write_sheets(self, filepath, sheet_names, outputs, output_file):
+        """
+        按原顺序把所有工作表写入同一个 write_only 工作簿：
+        处理过的工作表写出 DataFrame 并高亮，其余工作表从原文件逐行复制
+
+        Args:
+            sheet_names: 原文件中所有工作表的名称
+            outputs: {工作表名称: (DataFrame, 变化跟踪)}
+        """
+        is_xls = filepath.lower().endswith(".xls")
+        workbook = openpyxl.Workbook(write_only=True)
+        source = None
+        try:
+            for name in sheet_names:
+                sheet = workbook.create_sheet(title=name)
+                if name in outputs:
+                    self._write_frame(sheet, *outputs[name])
+                    continue
+
+                self._report_progress(f"正在复制工作表 {name}")
+                if source is None:
+                    source = self._open_source_workbook(filepath)
+                if is_xls:
+                    self._copy_xls_sheet(source, name, sheet)
+                else:
+                    self._copy_xlsx_sheet(source[name], sheet)
+        finally:
+            if source is not None:
+                if is_xls:
+                    source.release_resources()
+                else:
+                    source.close()
+
+        self._report_progress("正在保存结果文件")
+        workbook.save(output_file)
+
+    def _open_source_workbook(self, filepath):
+        """以只读方式打开原文件，用于复制未选中的工作表 (保留公式，不读取缓存值)"""
+        if filepath.lower().endswith(".xls"):
+            import xlrd
+
+            return xlrd.open_workbook(filepath, on_demand=True, formatting_info=False)
+        return openpyxl.load_workbook(filepath, read_only=True, data_only=False)
+
+    def _copy_xlsx_sheet(self, source_sheet, sheet):
+        """逐行复制只读工作表的值 (包括公式) 和单元格样式；列宽和合并单元格不保留"""
+        for row in source_sheet.iter_rows():
+            sheet.append([self._copy_cell(sheet, cell) for cell in row])
+
+    @staticmethod
+    def _copy_cell(sheet, cell):
+        """没有样式的单元格直接写值，有样式的复制为 WriteOnlyCell"""
+        if not getattr(cell, "has_style", False):
+            return cell.value
+        copied = WriteOnlyCell(sheet, value=cell.value)
+        copied.font = cell.font
+        copied.fill = cell.fill
+        copied.border = cell.border
+        copied.alignment = cell.alignment
+        copied.number_format = cell.number_format
+        copied.protection = cell.protection
+        return copied
+
+    def _copy_xls_sheet(self, workbook, name, sheet):
+        """逐行复制 .xls 工作表的值 (xlrd 不读取样式)，日期转换为 datetime"""
+        import xlrd
+
+        source_sheet = workbook.sheet_by_name(name)
+        for index in range(source_sheet.nrows):
+            row = []
+            for cell in source_sheet.row(index):
+                if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                    row.append(None)
+                elif cell.ctype == xlrd.XL_CELL_DATE:
+                    row.append(xlrd.xldate_as_datetime(cell.value, workbook.datemode))
+                elif cell.ctype == xlrd.XL_CELL_BOOLEAN:
+                    row.append(bool(cell.value))
+                elif cell.ctype == xlrd.XL_CELL_ERROR:
+                    row.append(xlrd.error_text_from_code.get(cell.value))
+                else:
+                    row.append(cell.value)
+            sheet.append(row)
+        workbook.unload_sheet(name)
+
+    @staticmethod
+    def _excel_values(series):
+        """将一列转换为可写入单元格的 Python 值列表，空值写为空单元格"""
+        return series.astype(object).where(series.notna(), None).tolist()
+
+    def _collect_changes(self, df, changed_masks):
+        """将变化掩码展开为 (行索引, 列名, 原值, 新值) 列表"""
+        changes = []
+        for std_column_name, (column, changed_mask) in changed_masks.items():
+            changes.extend(
+                zip(
+                    df.index[changed_mask],
+                    [std_column_name] * int(changed_mask.sum()),
+                    df[column].to_numpy(dtype=object)[changed_mask],
+                    df[std_column_name].to_numpy(dtype=object)[changed_mask],
+                )
+            )
+        return changes
+
+    def _add_highlighting(self, input_file, output_file, changes, verify=True):
+        """
+        为已处理的Excel文件添加黄色高亮标记
+
+        Args:
+            changes: (行索引, 列名, 原值, 新值) 列表
+            verify: 是否确认单元格的值确实是新值；写出方已保证时可跳过
+        """
+        with self._timed("highlight"):
+            workbook = openpyxl.load_workbook(input_file)
+            sheet = workbook.active
+
+            # 表头只扫描一次：{列名: Excel列号}，重名时取第一列
+            header_index = {}
+            for i, cell in enumerate(sheet[1], 1):
+                header_index.setdefault(cell.value, i)
+
+            # 按列分组 (列名现在是 *_标准 或 *_标准匹配)
+            grouped = defaultdict(list)
+            for row_idx, col_name, old_value, new_value in changes:
+                grouped[col_name].append((row_idx, new_value))
+
+            # Excel行索引从1开始，而且有表头，所以pandas的行索引需要+2
+            for col_name, rows in grouped.items():
+                col_idx = header_index.get(col_name)
+                if col_idx is None:
+                    continue
+                for row_idx, new_value in rows:
+                    cell = sheet.cell(row=row_idx + 2, column=col_idx)
+                    if verify:
+                        # 注意：Excel读取的值可能是数字，需要与 new_value 类型匹配比较
+                        cell_value_str = (
+                            str(cell.value) if cell.value is not None else ""
+                        )
+                        new_value_str = str(new_value) if new_value is not None else ""
+                        if cell_value_str != new_value_str:
+                            continue
+                    cell.fill = self.YELLOW_FILL
+
+            # 保存带有样式的工作簿
+            workbook.save(output_file)
+            workbook.close()
+
+    def _start_progress(self, df, columns_to_match):
+        """初始化进度：每个待匹配列各算一遍行数，写出结果再算一遍"""
+        match_columns = [column for column in columns_to_match if column in df.columns]
+        self._progress_total = max(len(df) * (len(match_columns) + 1), 1)
+        self._progress_done = 0
+
+    def _report_progress(self, message, advance=0):
+        """推进进度并通知回调 (未设置回调时不做任何事)"""
+        self._progress_done += advance
+        if self.progress_callback is None:
+            return
+        percent = min(self._progress_done / max(self._progress_total, 1) * 100, 100)
+        self.progress_callback(round(percent, 1), message)
+
+    @staticmethod
+    def _counter_delta(matcher, before, keys=FuzzyMatcher.COUNTER_KEYS):
+        """匹配器计数在 before 之后的增量"""
+        return {key: matcher.stats[key] - before[key] for key in keys}
+
+    def _log_stats(self, action, filepath, started):
+        """记录总耗时，并把本次的分阶段耗时和计数写入日志"""
+        timings = self.stats.setdefault("timings", {})
+        timings["total"] = round(time.perf_counter() - started, 4)
+        logger.info(
+            "%s %s: %s",
+            action,
+            os.path.basename(filepath),
+            json.dumps(self.stats, ensure_ascii=False),
+        )
+
+    @contextmanager
+    def _timed(self, phase):
+        """记录某个阶段的耗时 (秒)，累加到 self.stats["timings"]"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings = self.stats.setdefault("timings", {})
+            timings[phase] = round(
+                timings.get(phase, 0) + time.perf_counter() - start, 4
+            )
@@ -0,0 +1,141 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from django.conf import settings
+
+try:
+    import pyarrow.parquet as pq
+
+    HAS_PYARROW = True
+except ImportError:  # pragma: no cover - 取决于运行环境
+    HAS_PYARROW = False
+
+
+class FrameCache:
+    """
+    解析后 DataFrame 的两级缓存：
+    1. 磁盘：按上传摘要保存为 Parquet (需要 pyarrow)，无法转换时退回 pickle。
+    2. 进程内：LRU，按 DataFrame 占用的总字节数限制容量。
+    """
+
+    CACHE_DIR = os.path.join("cache", "frames")
+    # 进程内缓存默认上限 (字节)，可通过 settings.EXCEL_FRAME_CACHE_BYTES 覆盖
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    # 进程内 LRU 在所有实例间共享: {key: (DataFrame, 字节数)}
+    _memory = OrderedDict()
+    _memory_bytes = 0
+    _lock = threading.Lock()
+
+    def __init__(self, root=None, max_bytes=None, ttl=None):
+        self.root = root or os.path.join(settings.MEDIA_ROOT, self.CACHE_DIR)
+        self.max_bytes = (
+            max_bytes
+            if max_bytes is not None
+            else getattr(settings, "EXCEL_FRAME_CACHE_BYTES", self.DEFAULT_MAX_BYTES)
+        )
+        # 磁盘缓存与上传文件使用相同的保留时间
+        self.ttl = ttl if ttl is not None else getattr(settings, "EXCEL_UPLOAD_TTL", 0)
+        os.makedirs(self.root, exist_ok=True)
+
+    def get(self, key, columns=None):
+        """
+        读取缓存的 DataFrame，未缓存时返回 None
+
+        Args:
+            key: 缓存键 (上传文件摘要)
+            columns: 只需要的列，为 None 时返回全部列
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is not None:
+            return select_columns(entry[0], columns)
+
+        df = self._read_disk(key, columns)
+        if df is None:
+            return None
+        if columns is None:
+            self._remember(key, df)
+        return select_columns(df, columns)
+
+    def put(self, key, df):
+        """缓存完整的 DataFrame (写入磁盘并放入进程内 LRU)"""
+        self._write_disk(key, df)
+        self._remember(key, df)
+        self.cleanup()
+
+    def cleanup(self):
+        """删除超过保留时间的磁盘缓存文件"""
+        if not self.ttl:
+            return
+        expires_before = time.time() - self.ttl
+        for entry in os.scandir(self.root):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < expires_before:
+                    os.remove(entry.path)
+            except OSError:
+                pass  # 文件可能已被其他请求删除
+
+    def _remember(self, key, df):
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return  # 超过总容量的 DataFrame 只保留在磁盘上
+
+        cls = type(self)
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                cls._memory_bytes -= old[1]
+            self._memory[key] = (df, nbytes)
+            cls._memory_bytes += nbytes
+            # 超出容量时淘汰最久未使用的条目
+            while cls._memory_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._memory.popitem(last=False)
+                cls._memory_bytes -= evicted_bytes
+
+    def _read_disk(self, key, columns):
+        parquet_path = os.path.join(self.root, f"{key}.parquet")
+        if HAS_PYARROW and os.path.exists(parquet_path):
+            os.utime(parquet_path)
+            # Parquet 支持列裁剪，只读取需要的列
+            if columns is not None:
+                names = set(pq.read_schema(parquet_path).names)
+                columns = [column for column in columns if column in names]
+            return pd.read_parquet(parquet_path, columns=columns)
+
+        pickle_path = os.path.join(self.root, f"{key}.pkl")
+        if os.path.exists(pickle_path):
+            os.utime(pickle_path)
+            return pd.read_pickle(pickle_path)
+        return None
+
+    def _write_disk(self, key, df):
+        if HAS_PYARROW:
+            parquet_path = os.path.join(self.root, f"{key}.parquet")
+            try:
+                df.to_parquet(parquet_path, index=False)
+                return
+            except Exception:
+                # 混合类型的列或非字符串列名无法转换为 Arrow，退回 pickle
+                if os.path.exists(parquet_path):
+                    os.remove(parquet_path)
+
+        pickle_path = os.path.join(self.root, f"{key}.pkl")
+        df.to_pickle(pickle_path, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def select_columns(df, columns):
+    """
+    选取需要的列，忽略不存在的列；返回新对象，调用方新增列时不会影响缓存
+
+    Args:
+        columns: 为 None 时返回全部列的浅拷贝
+    """
+    if columns is None:
+        return df.copy(deep=False)
+    return df[[column for column in columns if column in df.columns]]
@@ -0,0 +1,262 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from ..models import MatchJob, ProcessedFile
+from .excel_service import ExcelService
+
+logger = logging.getLogger(__name__)
+
+# 进程内后台线程池，首次使用时创建 (同时恢复遗留任务)
+_executor = None
+_executor_lock = threading.Lock()
+
+# 进度写入数据库的最小间隔 (秒)
+PROGRESS_INTERVAL = 1.0
+
+# 本进程的启动标识: (进程号, 标识)，fork 出的子进程会重新生成
+_process_token = (None, None)
+
+
+def submit_job(job):
+    """
+    提交处理任务：
+    EXCEL_JOB_RUNNER 为 "thread" (默认) 时在本进程的线程池中执行，
+    为 "worker" 时留在数据库队列中，由 manage.py run_match_worker 领取执行
+    """
+    if getattr(settings, "EXCEL_JOB_RUNNER", "thread") != "thread":
+        return
+    _get_executor().submit(run_job, job.pk)
+
+
+def ensure_started():
+    """
+    "thread" 模式下启动本进程的线程池，首次启动时在线程池中恢复遗留任务 (见 recover_jobs)；
+    不访问数据库，可以在异步视图中直接调用
+    """
+    if getattr(settings, "EXCEL_JOB_RUNNER", "thread") == "thread":
+        _get_executor()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "EXCEL_JOB_WORKERS", 2),
+                thread_name_prefix="match-job",
+            )
+            # 进程重启后线程池是空的，之前提交的任务需要重新提交
+            _executor.submit(_recover_in_thread)
+        return _executor
+
+
+def _recover_in_thread():
+    close_old_connections()
+    try:
+        for job_id in recover_jobs():
+            _executor.submit(run_job, job_id)
+    except Exception:
+        logger.exception("恢复遗留的匹配任务失败")
+    finally:
+        connection.close()
+
+
+def recover_jobs():
+    """
+    处理进程退出后遗留的任务：本机上已退出的执行者领取的处理中任务标记为失败
+    (按进程号和启动标识判断，进程号被复用或容器重启后主机名、进程号相同时也能识别；
+    其他主机的执行者无法判断，保持不变)
+
+    Returns:
+        等待中任务的 ID 列表，"thread" 模式下由调用方重新提交 (领取是原子的，不会重复执行)
+    """
+    prefix = f"{socket.gethostname()}:"
+    running = MatchJob.objects.filter(
+        status=MatchJob.STATUS_RUNNING, runner__startswith=prefix
+    )
+    for job_id, runner in running.values_list("pk", "runner"):
+        pid, _, token = runner[len(prefix) :].partition(":")
+        if pid.isdigit() and not _runner_alive(int(pid), token):
+            logger.warning("匹配任务 %s 的执行进程 %s 已退出", job_id, pid)
+            MatchJob.objects.filter(
+                pk=job_id, status=MatchJob.STATUS_RUNNING, runner=runner
+            ).update(
+                status=MatchJob.STATUS_FAILED,
+                error="处理进程已退出，任务中断，请重新提交",
+                finished_at=timezone.now(),
+            )
+    return list(
+        MatchJob.objects.filter(status=MatchJob.STATUS_PENDING).values_list(
+            "pk", flat=True
+        )
+    )
+
+
+def _runner_id():
+    """执行者标识，格式为 主机名:进程号:启动标识"""
+    return f"{socket.gethostname()}:{os.getpid()}:{_current_token()}"
+
+
+def _current_token():
+    """
+    本进程的启动标识：Linux 上为进程的启动时间 (其他进程也能读取并核对)，
+    其他系统上为进程内生成的随机值
+    """
+    global _process_token
+    pid = os.getpid()
+    if _process_token[0] != pid:
+        _process_token = (pid, _process_start_time(pid) or uuid.uuid4().hex)
+    return _process_token[1]
+
+
+def _process_start_time(pid):
+    """进程的启动时间 (/proc/<pid>/stat 的第 22 个字段，系统启动后的时钟周期数)，无法读取时返回 None"""
+    try:
+        with open(f"/proc/{pid}/stat", encoding="ascii", errors="replace") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # 第 2 个字段是括号中的进程名 (可能含空格)，从最后一个右括号之后开始计数
+    fields = stat.rsplit(")", 1)[-1].split()
+    return fields[19] if len(fields) > 19 else None
+
+
+def _runner_alive(pid, token):
+    """
+    领取任务的执行者是否仍在运行：进程号相同还要核对启动标识，
+    旧记录没有启动标识时只检查进程号
+    """
+    if not token:
+        return _process_alive(pid)
+    if pid == os.getpid():
+        return token == _current_token()
+    if not _process_alive(pid):
+        return False
+    start_time = _process_start_time(pid)
+    # 无法读取启动时间时 (非 Linux) 无法核对，视为存在
+    return start_time is None or start_time == token
+
+
+def _process_alive(pid):
+    """本机上进程号为 pid 的进程是否存在 (Windows 上无法安全检查，视为存在)"""
+    if os.name == "nt":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def claim_next_job():
+    """从数据库队列中领取最早的等待任务，没有任务时返回 None"""
+    pending = MatchJob.objects.filter(status=MatchJob.STATUS_PENDING)
+    for job_id in pending.values_list("pk", flat=True)[:10]:
+        if _claim(job_id):
+            return job_id
+    return None
+
+
+def _claim(job_id):
+    """原子地将任务从等待状态改为处理中，防止同一任务被多个执行者领取"""
+    return (
+        MatchJob.objects.filter(pk=job_id, status=MatchJob.STATUS_PENDING).update(
+            status=MatchJob.STATUS_RUNNING,
+            started_at=timezone.now(),
+            runner=_runner_id(),
+        )
+        == 1
+    )
+
+
+def run_job(job_id, claimed=False):
+    """
+    执行一个处理任务，并把进度、结果或错误写回数据库；
+    领取后的任何异常 (包括读取任务、保存记录) 都会把任务标记为失败，不会停留在处理中
+    """
+    close_old_connections()
+    try:
+        if not claimed and not _claim(job_id):
+            return  # 任务已被其他执行者领取
+        service = None
+        try:
+            job = MatchJob.objects.get(pk=job_id)
+            service = ExcelService()
+            last_update = 0.0
+
+            def report(percent, message):
+                # 限制写库频率，避免频繁更新拖慢处理
+                nonlocal last_update
+                now = time.monotonic()
+                if now - last_update < PROGRESS_INTERVAL:
+                    return
+                last_update = now
+                MatchJob.objects.filter(pk=job_id).update(
+                    progress=percent, message=message[:255]
+                )
+
+            processed_file_path = service.process_excel_file(
+                job.original_file,
+                job.columns_processed,
+                job.threshold,
+                job.processing_mode,
+                job.reference_column,
+                progress_callback=report,
+                output_format=job.output_format,
+                sheets=job.sheets,
+                reference_dictionary=job.reference_dictionary,
+                output_name=_output_name(job),
+            )
+            ProcessedFile.objects.create(
+                original_file=job.original_file,  # 记录的是内容寻址存储中的路径
+                processed_file=processed_file_path,
+                columns_processed=job.columns_processed,
+                processing_mode=job.processing_mode,
+                reference_column=job.reference_column,
+                stats=service.stats,
+            )
+            MatchJob.objects.filter(pk=job_id).update(
+                status=MatchJob.STATUS_SUCCESS,
+                progress=100,
+                message="处理完成",
+                processed_file=processed_file_path,
+                stats=service.stats,
+                finished_at=timezone.now(),
+            )
+        except Exception as e:
+            logger.exception("匹配任务 %s 处理失败", job_id)
+            _mark_failed(job_id, str(e), service.stats if service is not None else {})
+    finally:
+        # 后台线程使用独立的数据库连接，结束时关闭
+        connection.close()
+
+
+def _output_name(job):
+    """
+    任务的结果文件名：上传文件按内容命名，同一文件的多个任务 (不同的列、阈值或模式)
+    会写到同一路径，加上任务 ID 后每个任务的结果互不覆盖，下载删除时也不影响其他任务
+    """
+    name = os.path.splitext(os.path.basename(job.original_file))[0]
+    return f"{name}_{job.pk}"
+
+
+def _mark_failed(job_id, error, stats):
+    """把任务标记为失败；写库本身失败时只记录日志 (进程重启后由 recover_jobs 处理)"""
+    try:
+        MatchJob.objects.filter(pk=job_id).update(
+            status=MatchJob.STATUS_FAILED,
+            error=error,
+            stats=stats,
+            finished_at=timezone.now(),
+        )
+    except Exception:
+        logger.exception("无法记录匹配任务 %s 的失败状态", job_id)
@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from .excel_service import FuzzyMatcher
+from .pattern_store import PatternStore
+from .reference_dictionary import DictionaryStore
+
+
+class MatcherCache:
+    """
+    进程内常驻的匹配器，供匹配接口复用：
+    按列名 (数据库中学习到的模式) 或参照词典名称缓存 FuzzyMatcher，
+    每次请求只检查模式版本 / 词典的预编译目录是否变化，变化时才重新创建匹配器；
+    同一匹配器的调用串行执行 (匹配器的计数和延迟构建的索引不是线程安全的)
+    """
+
+    # 默认最多常驻的匹配器数，可通过 settings.EXCEL_MATCHER_CACHE_ENTRIES 覆盖
+    DEFAULT_MAX_ENTRIES = 64
+
+    # 在所有实例间共享: {(类型, 名称): (版本, 匹配器, 锁)}
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or getattr(
+            settings, "EXCEL_MATCHER_CACHE_ENTRIES", self.DEFAULT_MAX_ENTRIES
+        )
+
+    def match(self, values, threshold=80, column=None, dictionary=None):
+        """
+        用常驻的匹配器匹配一批值
+
+        Args:
+            column: 列名，使用该列已学习的模式
+            dictionary: 参照词典名称，指定时忽略 column
+
+        Returns:
+            FuzzyMatcher.match_details 的结果
+        """
+        matcher, lock = self.get(column=column, dictionary=dictionary)
+        with lock:
+            return matcher.match_details(values, threshold)
+
+    def get(self, column=None, dictionary=None):
+        """获取 (匹配器, 锁)，版本未变化时直接返回常驻的匹配器"""
+        if dictionary:
+            key = ("dictionary", dictionary)
+            compiled = DictionaryStore().load(dictionary)
+            version = compiled.directory
+        elif column:
+            key = ("column", column)
+            version = PatternStore().current_version(column)
+        else:
+            raise ValueError("请指定列名或参照词典")
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1], entry[2]
+
+        if dictionary:
+            matcher = FuzzyMatcher.from_dictionary(compiled)
+        else:
+            matcher = FuzzyMatcher(column_name=column)
+        entry = (version, matcher, threading.Lock())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry[1], entry[2]
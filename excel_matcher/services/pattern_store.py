@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.db.models import F
+from ..models import FuzzyMatchPattern, PatternVersion
+
+
+class PatternStore:
+    """
+    进程内的已编译模式缓存：
+    每列的模式只通过 values_list 从数据库加载一次，编译结果 (模式字典 + 主键桶) 在进程内共享；
+    保存模式时递增该列的版本号，其他请求/进程发现版本变化后重新加载。
+    缓存的编译结果是只读的，匹配器修改模式前需要先复制。
+    按列 LRU 淘汰，长时间运行的进程不会一直保留处理过的所有列。
+    """
+
+    # 默认最多缓存的列数，可通过 settings.EXCEL_PATTERN_CACHE_ENTRIES 覆盖
+    DEFAULT_MAX_ENTRIES = 128
+
+    # 在所有实例间共享: {column_name: (version, compiled)}
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or getattr(
+            settings, "EXCEL_PATTERN_CACHE_ENTRIES", self.DEFAULT_MAX_ENTRIES
+        )
+
+    def get(self, column_name, compile_patterns):
+        """
+        获取该列编译后的模式，版本未变化时直接返回缓存
+
+        Args:
+            column_name: 列名
+            compile_patterns: 编译函数，参数为 {original_pattern: standardized_value}
+        """
+        # 先读取版本号再加载模式：两者之间有新的保存时，缓存的版本偏旧，下次会重新加载
+        version = self.current_version(column_name)
+        with self._lock:
+            entry = self._entries.get(column_name)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(column_name)
+                return entry[1]
+
+        rows = FuzzyMatchPattern.objects.filter(column_name=column_name).values_list(
+            "original_pattern", "standardized_value"
+        )
+        compiled = compile_patterns(dict(rows))
+        with self._lock:
+            self._entries[column_name] = (version, compiled)
+            self._entries.move_to_end(column_name)
+            # 超出容量时淘汰最久未使用的列
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def current_version(self, column_name):
+        """数据库中该列的模式版本号，从未保存过时为 0"""
+        version = (
+            PatternVersion.objects.filter(column_name=column_name)
+            .values_list("version", flat=True)
+            .first()
+        )
+        return version or 0
+
+    def bump_version(self, column_name):
+        """递增该列的模式版本号 (应与模式的写入在同一事务中调用)"""
+        entry, _ = PatternVersion.objects.get_or_create(column_name=column_name)
+        PatternVersion.objects.filter(pk=entry.pk).update(version=F("version") + 1)
+        with self._lock:
+            self._entries.pop(column_name, None)
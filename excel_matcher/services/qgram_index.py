@@ -0,0 +1,127 @@
+from collections import defaultdict
+import numpy as np
+
+
+class QGramIndex:
+    """
+    模式键的 q-gram 倒排索引，主键有拼写错误时也能找到模糊匹配的候选
+
+    字符串首尾各补 q-1 个填充字符后切分为 q-gram，同一 q-gram 的第 k 次出现单独记录，
+    这样两个字符串共有的条目数就是 q-gram 多重集合的交集大小。
+    查询时按阈值推出的最少共有 q-gram 数 (计数过滤) 和最大长度差 (长度过滤) 筛选候选，
+    被过滤掉的模式的 fuzz.ratio 一定低于阈值，不会漏掉匹配。
+    """
+
+    # q-gram 长度：型号类的短字符串用 2 可以容忍更多的编辑
+    Q = 2
+    PAD_START = "\x02"
+    PAD_END = "\x03"
+    # 倒排表总长 × DENSE_RATIO 不小于模式数时用 bincount 计数，否则用排序去重
+    DENSE_RATIO = 16
+
+    def __init__(self, keys, q=None):
+        self.q = q or self.Q
+        self.keys = list(keys)
+        self.lengths = np.fromiter(
+            (len(key) for key in self.keys), dtype=np.int64, count=len(self.keys)
+        )
+        # 出现过的模式长度，用于推出查询至少需要共有的 q-gram 数
+        self._distinct_lengths = np.unique(self.lengths)
+        postings = defaultdict(list)
+        for key_id, key in enumerate(self.keys):
+            for gram in self._grams(key):
+                postings[gram].append(key_id)
+        # 倒排表：{q-gram: 升序的模式序号数组}
+        self.postings = {
+            gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()
+        }
+
+    def _grams(self, value):
+        """切分带填充的 q-gram，重复出现的 q-gram 附加出现次数以区分"""
+        padded = f"{self.PAD_START * (self.q - 1)}{value}{self.PAD_END * (self.q - 1)}"
+        seen = {}
+        grams = []
+        for i in range(len(padded) - self.q + 1):
+            gram = padded[i : i + self.q]
+            count = seen.get(gram, 0)
+            seen[gram] = count + 1
+            grams.append(gram if count == 0 else f"{gram}\x00{count}")
+        return grams
+
+    def candidates(self, value, threshold):
+        """
+        返回 fuzz.ratio(value, 模式键) 可能不低于 threshold 的模式序号 (升序)
+
+        fuzz.ratio = 100 * (1 - d / (|a| + |b|))，d 为插入/删除距离，
+        因此 d <= (|a| + |b|) * (100 - threshold) / 100，且长度差不超过 d；
+        每次编辑最多破坏 q 个 q-gram，共有的 q-gram 至少为 max(|a|, |b|) + q - 1 - q * d。
+        没有任何共有 q-gram 的模式不作为候选。
+        """
+        return self._filter(value, threshold)[0]
+
+    def ranked_candidates(self, value, threshold, limit=None):
+        """
+        candidates 的结果按 fuzz.ratio 的上界从高到低排序 (上界相同时按序号升序)，
+        指定 limit 时只返回上界最高的 limit 个候选
+
+        共有 c 个 q-gram 时 d >= ceil((max(|a|, |b|) + q - 1 - c) / q)，且 d >= ||a| - |b||，
+        代入 fuzz.ratio 的公式即得上界；按上界顺序打分时，已得到的最高分超过剩余候选的上界即可停止。
+
+        Returns:
+            (模式序号数组, 对应的分数上界数组)
+        """
+        ids, counts = self._filter(value, threshold)
+        lengths = self.lengths[ids]
+        distance = np.maximum(
+            np.ceil((np.maximum(len(value), lengths) + self.q - 1 - counts) / self.q),
+            np.abs(lengths - len(value)),
+        )
+        # 加上容差，浮点误差只会让上界偏高
+        bounds = 100 * (1 - distance / (len(value) + lengths)) + 1e-6
+        if limit and len(ids) > limit:
+            top = np.argpartition(-bounds, limit - 1)[:limit]
+            ids, bounds = ids[top], bounds[top]
+        order = np.lexsort((ids, -bounds))
+        return ids[order], bounds[order]
+
+    def _filter(self, value, threshold):
+        """计数过滤和长度过滤，返回 (升序的模式序号数组, 各模式共有的 q-gram 数)"""
+        empty = np.empty(0, dtype=np.int64)
+        min_shared = self._min_shared(len(value), threshold)
+        postings = [
+            self.postings[gram] for gram in self._grams(value) if gram in self.postings
+        ]
+        if min_shared is None or not postings:
+            return empty, empty
+
+        # 统计每个模式共有的 q-gram 数：倒排表总长相对模式数较大时直接计数，否则排序去重
+        ids = np.concatenate(postings)
+        min_shared = max(min_shared, 1)
+        if len(ids) * self.DENSE_RATIO >= len(self.keys):
+            counts = np.bincount(ids, minlength=len(self.keys))
+            candidate_ids = np.flatnonzero(counts >= min_shared)
+            counts = counts[candidate_ids]
+        else:
+            candidate_ids, counts = np.unique(ids, return_counts=True)
+
+        lengths = self.lengths[candidate_ids]
+        max_distance, required = self._bounds(len(value), lengths, threshold)
+        keep = (counts >= required) & (np.abs(lengths - len(value)) <= max_distance)
+        return candidate_ids[keep], counts[keep]
+
+    def _bounds(self, length, lengths, threshold):
+        """
+        查询长度为 length 时，各候选长度下允许的最大插入/删除距离和最少共有 q-gram 数
+        (浮点误差只会让候选变多，不会漏掉匹配)
+        """
+        max_distance = np.floor((length + lengths) * (100 - threshold) / 100 + 1e-9)
+        required = np.maximum(length, lengths) + self.q - 1 - self.q * max_distance
+        return max_distance, required
+
+    def _min_shared(self, length, threshold):
+        """所有可能满足长度过滤的模式中最少需要共有的 q-gram 数，没有这样的模式时返回 None"""
+        max_distance, required = self._bounds(length, self._distinct_lengths, threshold)
+        feasible = np.abs(self._distinct_lengths - length) <= max_distance
+        if not feasible.any():
+            return None
+        return int(required[feasible].min())
@@ -0,0 +1,422 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Mapping
+from itertools import chain
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from ..models import ReferenceDictionary
+
+# 预编译文件的格式版本，格式变化时递增 (旧版本的词典需要重新构建)
+FORMAT_VERSION = 2
+META_FILE = "meta.json"
+
+
+def _hash_key(key):
+    """
+    字符串的 64 位哈希 (blake2b)，与进程和库版本无关，可以写入磁盘；
+    单个键的计算约 1 微秒，匹配接口逐值查找时开销很低
+    """
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return np.uint64(int.from_bytes(digest, "little"))
+
+
+def _hash_keys(keys):
+    return np.fromiter(map(_hash_key, keys), dtype=np.uint64, count=len(keys))
+
+
+def _pack_strings(strings):
+    """把字符串列表编码为 UTF-8 并拼接，返回 (偏移数组, 字节数组)，第 i 个字符串为 [偏移[i], 偏移[i+1])"""
+    encoded = [value.encode("utf-8") for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _sorted_hashes(keys, what):
+    """按哈希排序，返回 (升序哈希数组, 对应的原始序号)；不同的键哈希相同时报错"""
+    hashes = _hash_keys(keys)
+    order = np.argsort(hashes, kind="stable")
+    hashes = hashes[order]
+    if len(hashes) > 1 and (hashes[1:] == hashes[:-1]).any():
+        raise ValueError(f"{what}的哈希发生冲突，请调整标准值后重新构建")
+    return hashes, order
+
+
+def compile_dictionary(patterns, primary_key_index, directory):
+    """
+    将模式字典和主键索引写为可内存映射的 .npy 文件
+
+    模式按原插入顺序编号，键按哈希排序后二分查找；
+    每个主键桶保存为模式编号的连续区间，桶内顺序与主键索引一致 (保证并列最高分时选择相同)
+
+    Args:
+        patterns: {pattern_key: standardized_value}
+        primary_key_index: {primary_key: {pattern_key: standardized_value}}
+        directory: 输出目录 (不存在时创建)
+
+    Returns:
+        元数据字典
+    """
+    os.makedirs(directory, exist_ok=True)
+    keys = list(patterns.keys())
+    standard_codes, standards = pd.factorize(
+        pd.Series(list(patterns.values()), dtype=object)
+    )
+    key_hashes, key_order = _sorted_hashes(keys, "模式")
+
+    # 各桶的模式依次展开后按桶的哈希顺序稳定排序 (桶内顺序不变)
+    bucket_keys = list(primary_key_index.keys())
+    bucket_hashes, bucket_order = _sorted_hashes(bucket_keys, "主键")
+    sizes = np.fromiter(
+        map(len, primary_key_index.values()), dtype=np.int64, count=len(bucket_keys)
+    )
+    members = pd.Index(keys).get_indexer(
+        list(chain.from_iterable(primary_key_index.values()))
+    )
+    rank = np.empty(len(bucket_keys), dtype=np.int64)
+    rank[bucket_order] = np.arange(len(bucket_keys))
+    bucket_entries = members[np.argsort(np.repeat(rank, sizes), kind="stable")].astype(
+        np.int64
+    )
+    bucket_offsets = np.zeros(len(bucket_keys) + 1, dtype=np.int64)
+    np.cumsum(sizes[bucket_order], out=bucket_offsets[1:])
+
+    key_offsets, key_bytes = _pack_strings(keys)
+    standard_offsets, standard_bytes = _pack_strings(list(standards))
+    bucket_key_offsets, bucket_key_bytes = _pack_strings(
+        [bucket_keys[i] for i in bucket_order.tolist()]
+    )
+    arrays = {
+        "key_hashes": key_hashes,
+        "key_order": key_order.astype(np.int64),
+        "key_offsets": key_offsets,
+        "key_bytes": key_bytes,
+        "standard_ids": standard_codes.astype(np.int64),
+        "standard_offsets": standard_offsets,
+        "standard_bytes": standard_bytes,
+        "bucket_hashes": bucket_hashes,
+        "bucket_key_offsets": bucket_key_offsets,
+        "bucket_key_bytes": bucket_key_bytes,
+        "bucket_offsets": bucket_offsets,
+        "bucket_entries": bucket_entries,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), array)
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "patterns": len(keys),
+        "standards": len(standards),
+        "buckets": len(bucket_keys),
+    }
+    # 元数据最后写入，目录中有 meta.json 即表示编译完成
+    with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return meta
+
+
+class CompiledDictionary(Mapping):
+    """
+    以内存映射方式只读加载的预编译参照词典，接口与模式字典 {pattern_key: standardized_value} 相同：
+    加载时只映射文件，不解码字符串，查找时按哈希二分查找并核对键的字节；
+    buckets 提供与主键索引相同的 get 接口，取出的桶在进程内按 LRU 缓存
+    """
+
+    # 进程内缓存的主键桶数
+    BUCKET_CACHE_SIZE = 1024
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError("参照词典的预编译文件格式已过期，请重新构建")
+        for name in (
+            "key_hashes",
+            "key_order",
+            "key_offsets",
+            "key_bytes",
+            "standard_ids",
+            "standard_offsets",
+            "standard_bytes",
+            "bucket_hashes",
+            "bucket_key_offsets",
+            "bucket_key_bytes",
+            "bucket_offsets",
+            "bucket_entries",
+        ):
+            setattr(
+                self,
+                name,
+                # 转为普通 ndarray 视图 (仍由内存映射支持)，避免 memmap 子类的索引开销
+                np.asarray(
+                    np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                ),
+            )
+        self.buckets = DictionaryBuckets(self)
+
+    def __reduce__(self):
+        # 传给子进程时只传目录，子进程重新映射文件
+        return load_compiled, (self.directory,)
+
+    def __len__(self):
+        return len(self.key_order)
+
+    def __iter__(self):
+        for entry in range(len(self)):
+            yield self._key(entry)
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __getitem__(self, key):
+        entry = self._find(key)
+        if entry < 0:
+            raise KeyError(key)
+        return self._standard(entry)
+
+    def values(self):
+        """按模式编号顺序返回全部标准值 (与 keys() 对齐)"""
+        standards = [
+            self._decode(self.standard_bytes, self.standard_offsets, i)
+            for i in range(len(self.standard_offsets) - 1)
+        ]
+        return [standards[i] for i in self.standard_ids.tolist()]
+
+    def lookup_many(self, keys):
+        """
+        批量查找，等价于 keys.map(模式字典)
+
+        Returns:
+            与 keys 索引对齐的 Series，未命中的为 NaN
+        """
+        values = keys.tolist()
+        results = np.full(len(values), np.nan, dtype=object)
+        if not values or not len(self):
+            return pd.Series(results, index=keys.index, dtype=object)
+        hashes = _hash_keys(values)
+        positions = np.searchsorted(self.key_hashes, hashes)
+        positions[positions == len(self)] = 0
+        found = np.flatnonzero(np.asarray(self.key_hashes[positions]) == hashes)
+        entries = np.asarray(self.key_order[positions[found]])
+        for i, entry in zip(found.tolist(), entries.tolist()):
+            if self._key(entry) == values[i]:
+                results[i] = self._standard(entry)
+        return pd.Series(results, index=keys.index, dtype=object)
+
+    def _find(self, key):
+        """键对应的模式编号，不存在时返回 -1"""
+        if not isinstance(key, str) or not len(self):
+            return -1
+        entry = _search(self.key_hashes, self.key_order, key)
+        if entry >= 0 and self._key(entry) == key:
+            return entry
+        return -1
+
+    def _key(self, entry):
+        return self._decode(self.key_bytes, self.key_offsets, entry)
+
+    def _standard(self, entry):
+        standard_id = int(self.standard_ids[entry])
+        return self._decode(self.standard_bytes, self.standard_offsets, standard_id)
+
+    @staticmethod
+    def _decode(blob, offsets, index):
+        return bytes(blob[offsets[index] : offsets[index + 1]]).decode("utf-8")
+
+
+class DictionaryBuckets:
+    """预编译词典的主键索引，get(primary_key) 返回 {pattern_key: standardized_value}"""
+
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.dictionary.bucket_hashes)
+
+    def items(self):
+        """全部主键桶 (复制为普通主键索引时使用)"""
+        d = self.dictionary
+        for index in range(len(self)):
+            primary_key = d._decode(d.bucket_key_bytes, d.bucket_key_offsets, index)
+            yield primary_key, self.get(primary_key)
+
+    def get(self, primary_key, default=None):
+        with self._lock:
+            bucket = self._cache.get(primary_key)
+            if bucket is not None:
+                self._cache.move_to_end(primary_key)
+                return bucket
+
+        d = self.dictionary
+        index = _search(d.bucket_hashes, None, primary_key) if len(self) else -1
+        if index < 0 or (
+            d._decode(d.bucket_key_bytes, d.bucket_key_offsets, index) != primary_key
+        ):
+            return default
+        entries = d.bucket_entries[
+            d.bucket_offsets[index] : d.bucket_offsets[index + 1]
+        ]
+        bucket = {d._key(entry): d._standard(entry) for entry in entries.tolist()}
+        with self._lock:
+            self._cache[primary_key] = bucket
+            while len(self._cache) > d.BUCKET_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return bucket
+
+
+def _search(hashes, order, key):
+    """在升序哈希数组中二分查找键，返回对应的序号 (order 为 None 时返回位置)，不存在时返回 -1"""
+    target = _hash_key(key)
+    position = int(np.searchsorted(hashes, target))
+    if position >= len(hashes) or hashes[position] != target:
+        return -1
+    return position if order is None else int(order[position])
+
+
+# 进程内已加载的词典: {目录: CompiledDictionary}，重新构建的词典使用新目录
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def load_compiled(directory):
+    """映射预编译目录 (同一目录在进程内只加载一次)"""
+    with _loaded_lock:
+        dictionary = _loaded.get(directory)
+        if dictionary is None:
+            dictionary = _loaded[directory] = CompiledDictionary(directory)
+        return dictionary
+
+
+class DictionaryStore:
+    """
+    命名参照词典的存储：标准值列表构建一次，编译结果保存在 MEDIA_ROOT/dictionaries/ 下，
+    任务按名称选择词典，加载时直接内存映射预编译文件，不重新构建；
+    被替换或删除的预编译目录保留一段时间后再清理 (进程池子进程按目录加载词典)
+    """
+
+    DICTIONARY_DIR = "dictionaries"
+    # 旧预编译目录的默认保留时间 (秒)，可通过 settings.EXCEL_DICTIONARY_TTL 覆盖
+    DEFAULT_TTL = 60 * 60
+
+    def __init__(self, root=None, ttl=None):
+        self.root = root or os.path.join(settings.MEDIA_ROOT, self.DICTIONARY_DIR)
+        self.ttl = (
+            ttl
+            if ttl is not None
+            else getattr(settings, "EXCEL_DICTIONARY_TTL", self.DEFAULT_TTL)
+        )
+        os.makedirs(self.root, exist_ok=True)
+
+    def build(self, name, reference_values, source_name="", source_column=""):
+        """
+        构建 (或重新构建) 命名词典，模式与 FuzzyMatcher(reference_values=...) 完全一致
+
+        Args:
+            name: 词典名称
+            reference_values: 标准值序列
+            source_name: 来源文件名
+            source_column: 来源列名
+
+        Returns:
+            ReferenceDictionary 记录
+        """
+        from .excel_service import FuzzyMatcher
+
+        if not name:
+            raise ValueError("请指定参照词典名称")
+        matcher = FuzzyMatcher(reference_values=reference_values)
+        if not matcher.patterns:
+            raise ValueError("参照词典中没有有效的标准值")
+
+        # 每次构建写入新目录，正在使用旧目录的任务不受影响
+        artifact = uuid.uuid4().hex
+        directory = os.path.join(self.root, artifact)
+        try:
+            meta = compile_dictionary(
+                matcher.patterns, matcher.primary_key_index, directory
+            )
+        except Exception:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+
+        old = ReferenceDictionary.objects.filter(name=name).first()
+        record, _ = ReferenceDictionary.objects.update_or_create(
+            name=name,
+            defaults={
+                "source_name": source_name,
+                "source_column": source_column,
+                "standard_count": meta["standards"],
+                "pattern_count": meta["patterns"],
+                "artifact": artifact,
+            },
+        )
+        if old is not None and old.artifact != artifact:
+            self._retire(old.artifact)
+        self.cleanup()
+        return record
+
+    def load(self, name):
+        """按名称加载词典 (内存映射)，不存在时抛出 ValueError"""
+        artifact = (
+            ReferenceDictionary.objects.filter(name=name)
+            .values_list("artifact", flat=True)
+            .first()
+        )
+        if artifact is None:
+            raise ValueError(f"参照词典 '{name}' 不存在")
+        directory = os.path.join(self.root, artifact)
+        if not os.path.exists(os.path.join(directory, META_FILE)):
+            raise ValueError(f"参照词典 '{name}' 的预编译文件不存在，请重新构建")
+        return load_compiled(directory)
+
+    def delete(self, name):
+        """删除词典记录和预编译文件"""
+        record = ReferenceDictionary.objects.filter(name=name).first()
+        if record is None:
+            return False
+        record.delete()
+        self._retire(record.artifact)
+        self.cleanup()
+        return True
+
+    def cleanup(self):
+        """删除不再被词典记录引用、且超过保留时间未修改的预编译目录"""
+        expires_before = time.time() - self.ttl
+        in_use = set(ReferenceDictionary.objects.values_list("artifact", flat=True))
+        for entry in os.scandir(self.root):
+            try:
+                if (
+                    entry.is_dir()
+                    and entry.name not in in_use
+                    and entry.stat().st_mtime < expires_before
+                ):
+                    self._remove(entry.name)
+            except OSError:
+                pass  # 目录可能已被其他进程删除
+
+    def _retire(self, artifact):
+        """
+        标记被替换或删除的预编译目录：不立即删除 (正在运行的任务可能仍要在子进程中按目录加载)，
+        刷新修改时间，保留时间从此时开始计算
+        """
+        try:
+            os.utime(os.path.join(self.root, artifact))
+        except OSError:
+            pass
+
+    def _remove(self, artifact):
+        directory = os.path.join(self.root, artifact)
+        with _loaded_lock:
+            _loaded.pop(directory, None)
+        # 已映射的文件在 Linux 上删除后仍可继续读取
+        shutil.rmtree(directory, ignore_errors=True)
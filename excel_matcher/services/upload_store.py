@@ -0,0 +1,77 @@
+import hashlib
+import os
+import tempfile
+import time
+from django.conf import settings
+
+
+class UploadStore:
+    """按内容寻址的上传文件存储：文件以 SHA-256 摘要命名，过期文件按 TTL 清理"""
+
+    UPLOAD_DIR = "uploads"
+    # 默认保留时间 (秒)，可通过 settings.EXCEL_UPLOAD_TTL 覆盖
+    DEFAULT_TTL = 24 * 60 * 60
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, root=None, ttl=None):
+        self.root = root or os.path.join(settings.MEDIA_ROOT, self.UPLOAD_DIR)
+        self.ttl = (
+            ttl
+            if ttl is not None
+            else getattr(settings, "EXCEL_UPLOAD_TTL", self.DEFAULT_TTL)
+        )
+        os.makedirs(self.root, exist_ok=True)
+
+    def save(self, uploaded_file):
+        """
+        分块写入上传文件并计算摘要，内容相同的文件只保存一份
+
+        Returns:
+            文件内容的 SHA-256 摘要
+        """
+        ext = self._extension(uploaded_file.name)
+        sha256 = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in uploaded_file.chunks(self.CHUNK_SIZE):
+                    sha256.update(chunk)
+                    f.write(chunk)
+            digest = sha256.hexdigest()
+            path = os.path.join(self.root, f"{digest}{ext}")
+            if os.path.exists(path):
+                # 已存在相同内容的文件，直接复用并刷新过期时间
+                os.remove(temp_path)
+                os.utime(path)
+            else:
+                os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.cleanup()
+        return digest
+
+    def get_path(self, digest, filename):
+        """根据摘要和原始文件名获取本地路径，文件不存在 (或已过期清理) 时返回 None"""
+        path = os.path.join(self.root, f"{digest}{self._extension(filename)}")
+        if not os.path.exists(path):
+            return None
+        # 每次访问都刷新修改时间，正在使用的文件不会被清理
+        os.utime(path)
+        return path
+
+    def cleanup(self):
+        """删除超过保留时间未被访问的文件"""
+        expires_before = time.time() - self.ttl
+        for entry in os.scandir(self.root):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < expires_before:
+                    os.remove(entry.path)
+            except OSError:
+                pass  # 文件可能已被其他请求删除
+
+    @staticmethod
+    def _extension(filename):
+        return os.path.splitext(filename)[1].lower()
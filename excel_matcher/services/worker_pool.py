@@ -0,0 +1,31 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+
+
+def worker_count():
+    """进程池的子进程数，默认使用全部 CPU 核心"""
+    return getattr(settings, "EXCEL_MATCHER_WORKERS", None) or os.cpu_count() or 1
+
+
+def create_pool(max_workers):
+    """
+    创建匹配用的进程池
+
+    默认使用 spawn 启动方式：Web 进程中有后台任务线程，fork 可能继承被其他线程持有的锁
+    """
+    context = multiprocessing.get_context(
+        getattr(settings, "EXCEL_MATCHER_MP_CONTEXT", "spawn")
+    )
+    return ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=context, initializer=init_worker
+    )
+
+
+def init_worker():
+    """子进程初始化：spawn 启动的子进程是全新的解释器，需要先完成 Django 初始化"""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "web_django.settings")
+    import django
+
+    django.setup()
@@ -6,10 +6,17 @@ document.addEventListener('DOMContentLoaded', function() {
     const uploadStatus = document.getElementById('upload-status');
     const uploadLoader = document.getElementById('upload-loader');
     
+    // DOM元素 - 参照词典
+    const dictionaryForm = document.getElementById('dictionary-form');
+    const dictionaryStatus = document.getElementById('dictionary-status');
+    const dictionaryLoader = document.getElementById('dictionary-loader');
+    
     // DOM元素 - 模式选择
     const modeSection = document.getElementById('mode-section');
     const modeContinueBtn = document.getElementById('mode-continue-btn');
     const modeRadios = document.querySelectorAll('input[name="processing-mode"]');
+    const sheetSelection = document.getElementById('sheet-selection');
+    const sheetsList = document.getElementById('sheets-list');
     
     // DOM元素 - 列选择
     const columnsSection = document.getElementById('columns-section');
@@ -17,6 +24,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const referenceColumns = document.getElementById('reference-columns');
     const columnsList = document.getElementById('columns-list');
     const referenceColumnSelect = document.getElementById('reference-column-select');
+    const referenceColumnSelection = document.getElementById('reference-column-selection');
+    const referenceDictionarySelect = document.getElementById('reference-dictionary-select');
     const matchColumnsList = document.getElementById('match-columns-list');
     
     // DOM元素 - 阈值设置和处理
@@ -25,6 +34,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const processBtn = document.getElementById('process-btn');
     const processLoader = document.getElementById('process-loader');
     const processStatus = document.getElementById('process-status');
+    const processProgress = document.getElementById('process-progress');
     
     // DOM元素 - 预览功能
     const previewBtn = document.getElementById('preview-btn');
@@ -40,6 +50,12 @@ document.addEventListener('DOMContentLoaded', function() {
     // 状态变量
     let currentMode = 'REFERENCE'; // 默认使用参照标准匹配模式
     let availableColumns = []; // 可用的列
+    let sheetNames = []; // 工作簿中的所有工作表
+    let sheetColumns = {}; // 每个工作表的列名 (多个工作表时)
+    const JOB_POLL_INTERVAL = 1000; // 轮询任务进度的间隔 (毫秒)
+    let previewThreshold = null; // 生成当前预览时的阈值
+    let previewItems = []; // 当前预览中各列的结果和统计元素
+    let noChangesMessage = null;
     
     // 事件监听
     uploadForm.addEventListener('submit', handleFileUpload);
@@ -58,9 +74,15 @@ document.addEventListener('DOMContentLoaded', function() {
     // 标准列选择事件监听
     referenceColumnSelect.addEventListener('change', updateMatchColumnsList);
     
+    // 参照词典
+    dictionaryForm.addEventListener('submit', handleDictionaryUpload);
+    referenceDictionarySelect.addEventListener('change', updateMatchColumnsList);
+    loadDictionaries();
+    
     // 更新阈值显示
     function updateThresholdValue() {
         thresholdValue.textContent = thresholdInput.value;
+        updatePreviewCounts();
     }
     
     // 处理文件上传
@@ -74,8 +96,9 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         // 检查文件类型
-        if (!file.name.endsWith('.xlsx') && !file.name.endsWith('.xls')) {
-            showStatus(uploadStatus, '请上传Excel文件(.xlsx或.xls)', 'error');
+        const allowedExtensions = ['.xlsx', '.xls', '.csv', '.parquet'];
+        if (!allowedExtensions.some(ext => file.name.toLowerCase().endsWith(ext))) {
+            showStatus(uploadStatus, '请上传Excel文件(.xlsx或.xls)、CSV文件或Parquet文件', 'error');
             return;
         }
         
@@ -94,12 +117,20 @@ document.addEventListener('DOMContentLoaded', function() {
             uploadLoader.classList.add('hidden');
             
             if (data.success) {
-                // 显示成功消息
-                showStatus(uploadStatus, '文件上传成功！请选择处理模式。', 'success');
+                // 显示成功消息 (行数来自工作表尺寸的估算)
+                const rowInfo = data.row_estimate !== null && data.row_estimate !== undefined
+                    ? `（约 ${data.row_estimate} 行数据）`
+                    : '';
+                showStatus(uploadStatus, `文件上传成功${rowInfo}！请选择处理模式。`, 'success');
                 
                 // 保存可用列
                 availableColumns = data.columns;
                 
+                // 多个工作表时显示工作表选择
+                sheetNames = data.sheets || [];
+                sheetColumns = data.sheet_columns || {};
+                displaySheets();
+                
                 // 显示模式选择区域
                 modeSection.classList.remove('hidden');
                 
@@ -121,6 +152,58 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // 显示工作表选择，默认只选中第一个工作表
+    function displaySheets() {
+        sheetsList.innerHTML = '';
+        sheetSelection.classList.toggle('hidden', sheetNames.length <= 1);
+        if (sheetNames.length <= 1) {
+            return;
+        }
+        
+        sheetNames.forEach((sheet, index) => {
+            const label = document.createElement('label');
+            const checkbox = document.createElement('input');
+            checkbox.type = 'checkbox';
+            checkbox.name = 'sheet';
+            checkbox.value = sheet;
+            checkbox.checked = index === 0;
+            checkbox.addEventListener('change', updateSheetColumns);
+            
+            label.appendChild(checkbox);
+            label.appendChild(document.createTextNode(' ' + sheet));
+            
+            sheetsList.appendChild(label);
+        });
+    }
+    
+    // 获取选中的工作表，只有一个工作表时返回 null
+    function getSelectedSheets() {
+        if (sheetNames.length <= 1) {
+            return null;
+        }
+        return Array.from(
+            document.querySelectorAll('#sheets-list input[name="sheet"]:checked')
+        ).map(checkbox => checkbox.value);
+    }
+    
+    // 选中的工作表变化后，可用列为这些工作表列名的并集
+    function updateSheetColumns() {
+        const columns = [];
+        getSelectedSheets().forEach(sheet => {
+            (sheetColumns[sheet] || []).forEach(column => {
+                if (!columns.includes(column)) {
+                    columns.push(column);
+                }
+            });
+        });
+        availableColumns = columns;
+        
+        // 已经显示列选择时重新生成
+        if (!columnsSection.classList.contains('hidden')) {
+            handleModeContinue();
+        }
+    }
+    
     // 处理模式选择继续按钮
     function handleModeContinue() {
         // 根据当前模式显示相应的列选择界面
@@ -137,8 +220,8 @@ document.addEventListener('DOMContentLoaded', function() {
             // 填充标准列下拉选择框
             populateReferenceSelect(availableColumns);
             
-            // 初始化匹配列列表为空
-            matchColumnsList.innerHTML = '';
+            // 初始化匹配列列表 (未选择参照词典时为空)
+            updateMatchColumnsList();
         }
         
         // 显示列选择区域
@@ -153,8 +236,75 @@ document.addEventListener('DOMContentLoaded', function() {
         downloadSection.classList.add('hidden');
     }
     
+    // 上传标准值列表并构建参照词典
+    function handleDictionaryUpload(event) {
+        event.preventDefault();
+        
+        const file = document.getElementById('dictionary-file').files[0];
+        const name = document.getElementById('dictionary-name').value.trim();
+        if (!file || !name) {
+            showStatus(dictionaryStatus, '请填写词典名称并选择文件！', 'error');
+            return;
+        }
+        
+        const formData = new FormData(dictionaryForm);
+        dictionaryLoader.classList.remove('hidden');
+        dictionaryStatus.classList.add('hidden');
+        
+        fetch('/excel/dictionaries/', {
+            method: 'POST',
+            body: formData,
+            headers: {
+                'X-CSRFToken': getCookie('csrftoken')
+            }
+        })
+        .then(response => response.json())
+        .then(data => {
+            dictionaryLoader.classList.add('hidden');
+            if (data.success) {
+                showStatus(dictionaryStatus, `${data.message}（${data.standard_count} 个标准值）`, 'success');
+                loadDictionaries();
+            } else {
+                showStatus(dictionaryStatus, '构建失败：' + data.error, 'error');
+            }
+        })
+        .catch(error => {
+            dictionaryLoader.classList.add('hidden');
+            showStatus(dictionaryStatus, '构建出错：' + error.message, 'error');
+        });
+    }
+    
+    // 加载已构建的参照词典列表
+    function loadDictionaries() {
+        fetch('/excel/dictionaries/')
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                return;
+            }
+            const selected = referenceDictionarySelect.value;
+            referenceDictionarySelect.innerHTML = '<option value="">-- 使用文件中的标准列 --</option>';
+            data.dictionaries.forEach(dictionary => {
+                const option = document.createElement('option');
+                option.value = dictionary.name;
+                option.textContent = `${dictionary.name}（${dictionary.standard_count} 个标准值）`;
+                referenceDictionarySelect.appendChild(option);
+            });
+            referenceDictionarySelect.value = selected;
+        })
+        .catch(() => {});
+    }
+    
     // 更新标准列选择后的匹配列列表
     function updateMatchColumnsList() {
+        // 选择了参照词典时不需要标准列，所有列都可以作为匹配列
+        if (referenceDictionarySelect.value) {
+            referenceColumnSelection.classList.add('hidden');
+            displayColumns(matchColumnsList, availableColumns);
+            return;
+        }
+        referenceColumnSelection.classList.remove('hidden');
+        
         const referenceColumn = referenceColumnSelect.value;
         if (!referenceColumn) {
             matchColumnsList.innerHTML = '';
@@ -202,6 +352,7 @@ document.addEventListener('DOMContentLoaded', function() {
     function previewFile() {
         let selectedColumns = [];
         let referenceColumn = null;
+        let referenceDictionary = null;
         
         // 根据当前模式获取选中的列
         if (currentMode === 'SELF_LEARNING') {
@@ -215,10 +366,11 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         } else {
             // 参照标准匹配模式
-            referenceColumn = referenceColumnSelect.value;
+            referenceDictionary = referenceDictionarySelect.value || null;
+            referenceColumn = referenceDictionary ? null : referenceColumnSelect.value;
             
-            if (!referenceColumn) {
-                showStatus(previewStatus, '请选择一个标准参照列！', 'error');
+            if (!referenceDictionary && !referenceColumn) {
+                showStatus(previewStatus, '请选择一个标准参照列或参照词典！', 'error');
                 return;
             }
             
@@ -232,8 +384,14 @@ document.addEventListener('DOMContentLoaded', function() {
                 return;
             }
             
-            // 标准列也需要加入处理列表
-            selectedColumns = [referenceColumn, ...matchColumns];
+            // 标准列也需要加入处理列表 (使用参照词典时没有标准列)
+            selectedColumns = referenceColumn ? [referenceColumn, ...matchColumns] : matchColumns;
+        }
+        
+        const sheets = getSelectedSheets();
+        if (sheets && sheets.length === 0) {
+            showStatus(previewStatus, '请至少选择一个工作表！', 'error');
+            return;
         }
         
         // 获取阈值
@@ -254,7 +412,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 columns_to_match: selectedColumns,
                 threshold: threshold,
                 processing_mode: currentMode,
-                reference_column: referenceColumn
+                reference_column: referenceColumn,
+                reference_dictionary: referenceDictionary,
+                sheets: sheets
             })
         })
         .then(response => response.json())
@@ -263,6 +423,7 @@ document.addEventListener('DOMContentLoaded', function() {
             
             if (data.success) {
                 // 显示预览结果
+                previewThreshold = threshold;
                 renderPreviewResults(data.preview_results);
                 previewResults.classList.remove('hidden');
                 
@@ -284,101 +445,136 @@ document.addEventListener('DOMContentLoaded', function() {
     // 渲染预览结果
     function renderPreviewResults(results) {
         previewContent.innerHTML = '';
-        
-        let hasChanges = false;
+        previewItems = [];
         
         // 对于每个列，显示预览结果
         for (const column in results) {
             const columnResult = results[column];
+            const curve = columnResult.threshold_curve;
             
-            // 只有在有变化时才显示
-            if (columnResult.changed > 0) {
-                hasChanges = true;
-                
-                // 创建列预览项
-                const previewItem = document.createElement('div');
-                previewItem.className = 'preview-item';
-                
-                // 列名标题
-                const heading = document.createElement('h4');
-                heading.textContent = column;
-                previewItem.appendChild(heading);
-                
-                // 统计信息
-                const stats = document.createElement('div');
-                stats.className = 'preview-stats';
-                
-                // 总数
-                const totalStat = document.createElement('div');
-                totalStat.className = 'stat-item';
+            // 任意阈值下都没有变化的列不显示
+            if ((curve ? curve[0] : columnResult.changed) === 0) {
+                continue;
+            }
+            
+            // 创建列预览项
+            const previewItem = document.createElement('div');
+            previewItem.className = 'preview-item';
+            
+            // 列名标题
+            const heading = document.createElement('h4');
+            heading.textContent = column;
+            previewItem.appendChild(heading);
+            
+            // 统计信息
+            const stats = document.createElement('div');
+            stats.className = 'preview-stats';
+            
+            // 总数
+            const totalStat = document.createElement('div');
+            totalStat.className = 'stat-item';
+            if (columnResult.partial) {
+                // 只解析了前几行
+                totalStat.innerHTML = `前 <span class="stat-value">${columnResult.total}</span> 行 (共约 ${columnResult.row_estimate} 行)`;
+            } else {
                 totalStat.innerHTML = `总数: <span class="stat-value">${columnResult.total}</span>`;
-                stats.appendChild(totalStat);
-                
-                // 变化数
-                const changedStat = document.createElement('div');
-                changedStat.className = 'stat-item';
-                changedStat.innerHTML = `标准化数: <span class="stat-value">${columnResult.changed}</span>`;
-                stats.appendChild(changedStat);
-                
-                // 占比
-                const percentStat = document.createElement('div');
-                percentStat.className = 'stat-item';
-                percentStat.innerHTML = `占比: <span class="stat-value">${columnResult.percentage}%</span>`;
-                stats.appendChild(percentStat);
+            }
+            stats.appendChild(totalStat);
+            
+            // 变化数和占比，拖动阈值滑块时按阈值曲线更新
+            const changedStat = document.createElement('div');
+            changedStat.className = 'stat-item';
+            stats.appendChild(changedStat);
+            const percentStat = document.createElement('div');
+            percentStat.className = 'stat-item';
+            stats.appendChild(percentStat);
+            
+            previewItem.appendChild(stats);
+            
+            // 示例
+            if (columnResult.examples.length > 0) {
+                const exampleSection = document.createElement('div');
+                exampleSection.className = 'preview-examples';
                 
-                previewItem.appendChild(stats);
+                const exampleTitle = document.createElement('h5');
+                exampleTitle.textContent = `变化示例 (阈值 ${previewThreshold}):`;
+                exampleSection.appendChild(exampleTitle);
                 
-                // 示例
-                if (columnResult.examples.length > 0) {
-                    const exampleSection = document.createElement('div');
-                    exampleSection.className = 'preview-examples';
+                // 添加每个示例
+                columnResult.examples.forEach(example => {
+                    const exampleItem = document.createElement('div');
+                    exampleItem.className = 'example-item';
                     
-                    const exampleTitle = document.createElement('h5');
-                    exampleTitle.textContent = '变化示例:';
-                    exampleSection.appendChild(exampleTitle);
+                    const originalValue = document.createElement('div');
+                    originalValue.className = 'example-original';
+                    originalValue.textContent = example[0] || '(空值)';
+                    exampleItem.appendChild(originalValue);
                     
-                    // 添加每个示例
-                    columnResult.examples.forEach(example => {
-                        const exampleItem = document.createElement('div');
-                        exampleItem.className = 'example-item';
-                        
-                        const originalValue = document.createElement('div');
-                        originalValue.className = 'example-original';
-                        originalValue.textContent = example[0] || '(空值)';
-                        exampleItem.appendChild(originalValue);
-                        
-                        const arrowIcon = document.createElement('div');
-                        arrowIcon.className = 'arrow-icon';
-                        arrowIcon.textContent = '→';
-                        exampleItem.appendChild(arrowIcon);
-                        
-                        const matchedValue = document.createElement('div');
-                        matchedValue.className = 'example-matched';
-                        matchedValue.textContent = example[1] || '(空值)';
-                        exampleItem.appendChild(matchedValue);
-                        
-                        exampleSection.appendChild(exampleItem);
-                    });
+                    const arrowIcon = document.createElement('div');
+                    arrowIcon.className = 'arrow-icon';
+                    arrowIcon.textContent = '→';
+                    exampleItem.appendChild(arrowIcon);
                     
-                    previewItem.appendChild(exampleSection);
-                }
+                    const matchedValue = document.createElement('div');
+                    matchedValue.className = 'example-matched';
+                    matchedValue.textContent = example[1] || '(空值)';
+                    exampleItem.appendChild(matchedValue);
+                    
+                    exampleSection.appendChild(exampleItem);
+                });
                 
-                previewContent.appendChild(previewItem);
+                previewItem.appendChild(exampleSection);
             }
+            
+            previewContent.appendChild(previewItem);
+            previewItems.push({ result: columnResult, item: previewItem, changedStat, percentStat });
         }
         
-        if (!hasChanges) {
-            const noChangesMsg = document.createElement('div');
-            noChangesMsg.className = 'no-changes-message';
-            noChangesMsg.textContent = '没有发现需要标准化的数据，所有值都已经是标准格式或无法匹配。';
-            previewContent.appendChild(noChangesMsg);
+        noChangesMessage = document.createElement('div');
+        noChangesMessage.className = 'no-changes-message';
+        noChangesMessage.textContent = '没有发现需要标准化的数据，所有值都已经是标准格式或无法匹配。';
+        previewContent.appendChild(noChangesMessage);
+        
+        updatePreviewCounts();
+    }
+    
+    // 按当前阈值更新预览中的变化数和占比 (使用服务器返回的阈值曲线，无需重新请求)
+    function updatePreviewCounts() {
+        if (!noChangesMessage) {
+            return;
         }
+        const threshold = parseInt(thresholdInput.value);
+        let hasChanges = false;
+        
+        previewItems.forEach(({ result, item, changedStat, percentStat }) => {
+            const exact = threshold === previewThreshold || !result.threshold_curve;
+            const changed = exact ? result.changed : result.threshold_curve[threshold];
+            const percentage = exact
+                ? result.percentage
+                : (result.total > 0 ? Math.round(changed / result.total * 1000) / 10 : 0);
+            // 抽样估计的结果显示约数，置信区间只对预览时的阈值有效
+            const prefix = result.sampled ? '约 ' : '';
+            let changedText = `标准化数: <span class="stat-value">${prefix}${changed}</span>`;
+            let percentText = `占比: <span class="stat-value">${prefix}${percentage}%</span>`;
+            if (result.sampled && exact) {
+                changedText += ` (${result.changed_range[0]} ~ ${result.changed_range[1]})`;
+                percentText += ` (${result.percentage_range[0]}% ~ ${result.percentage_range[1]}%)`;
+            }
+            changedStat.innerHTML = changedText;
+            percentStat.innerHTML = percentText;
+            
+            item.classList.toggle('hidden', changed === 0);
+            hasChanges = hasChanges || changed > 0;
+        });
+        
+        noChangesMessage.classList.toggle('hidden', hasChanges);
     }
     
     // 处理文件
     function processFile() {
         let selectedColumns = [];
         let referenceColumn = null;
+        let referenceDictionary = null;
         
         // 根据当前模式获取选中的列
         if (currentMode === 'SELF_LEARNING') {
@@ -392,10 +588,11 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         } else {
             // 参照标准匹配模式
-            referenceColumn = referenceColumnSelect.value;
+            referenceDictionary = referenceDictionarySelect.value || null;
+            referenceColumn = referenceDictionary ? null : referenceColumnSelect.value;
             
-            if (!referenceColumn) {
-                showStatus(processStatus, '请选择一个标准参照列！', 'error');
+            if (!referenceDictionary && !referenceColumn) {
+                showStatus(processStatus, '请选择一个标准参照列或参照词典！', 'error');
                 return;
             }
             
@@ -409,8 +606,14 @@ document.addEventListener('DOMContentLoaded', function() {
                 return;
             }
             
-            // 标准列也需要加入处理列表
-            selectedColumns = [referenceColumn, ...matchColumns];
+            // 标准列也需要加入处理列表 (使用参照词典时没有标准列)
+            selectedColumns = referenceColumn ? [referenceColumn, ...matchColumns] : matchColumns;
+        }
+        
+        const sheets = getSelectedSheets();
+        if (sheets && sheets.length === 0) {
+            showStatus(processStatus, '请至少选择一个工作表！', 'error');
+            return;
         }
         
         // 获取阈值
@@ -419,6 +622,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // 显示加载状态
         processLoader.classList.remove('hidden');
         processStatus.classList.add('hidden');
+        downloadSection.classList.add('hidden');
         
         fetch('/excel/process/', {
             method: 'POST',
@@ -430,30 +634,76 @@ document.addEventListener('DOMContentLoaded', function() {
                 columns_to_match: selectedColumns,
                 threshold: threshold,
                 processing_mode: currentMode,
-                reference_column: referenceColumn
+                reference_column: referenceColumn,
+                reference_dictionary: referenceDictionary,
+                output_format: document.getElementById('output-format').value,
+                sheets: sheets
             })
         })
         .then(response => response.json())
         .then(data => {
+            if (data.success) {
+                // 任务已提交，轮询任务进度
+                updateProcessProgress(0, data.message);
+                pollJob(data.job_id);
+            } else {
+                processLoader.classList.add('hidden');
+                // 显示错误消息
+                showStatus(processStatus, '处理失败：' + data.error, 'error');
+            }
+        })
+        .catch(error => {
             processLoader.classList.add('hidden');
+            showStatus(processStatus, '处理出错：' + error.message, 'error');
+        });
+    }
+    
+    // 轮询后台处理任务的状态
+    function pollJob(jobId) {
+        fetch(`/excel/jobs/${jobId}/`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                finishProcess();
+                showStatus(processStatus, '处理失败：' + data.error, 'error');
+                return;
+            }
             
-            if (data.success) {
+            if (data.status === 'SUCCESS') {
+                finishProcess();
                 // 显示成功消息
                 showStatus(processStatus, '文件处理成功！请点击下载按钮获取处理后的文件，被标准化的单元格已用黄色高亮标记。', 'success');
                 
                 // 显示下载区域
                 downloadSection.classList.remove('hidden');
-            } else {
-                // 显示错误消息
+            } else if (data.status === 'FAILED') {
+                finishProcess();
                 showStatus(processStatus, '处理失败：' + data.error, 'error');
+            } else {
+                // 等待中或处理中，继续轮询
+                updateProcessProgress(data.progress, data.message || '等待处理...');
+                setTimeout(() => pollJob(jobId), JOB_POLL_INTERVAL);
             }
         })
         .catch(error => {
-            processLoader.classList.add('hidden');
-            showStatus(processStatus, '处理出错：' + error.message, 'error');
+            finishProcess();
+            showStatus(processStatus, '查询处理进度出错：' + error.message, 'error');
         });
     }
     
+    // 更新处理进度显示
+    function updateProcessProgress(percent, message) {
+        processProgress.classList.remove('hidden');
+        processProgress.value = percent;
+        showStatus(processStatus, `${message}（${Math.round(percent)}%）`, 'info');
+    }
+    
+    // 处理结束，隐藏加载状态和进度条
+    function finishProcess() {
+        processLoader.classList.add('hidden');
+        processProgress.classList.add('hidden');
+    }
+    
     // 显示状态消息
     function showStatus(element, message, type) {
         element.textContent = message;
@@ -8,5 +8,12 @@ urlpatterns = [
     path("upload/", views.upload_file, name="upload_file"),
     path("process/", views.process_file, name="process_file"),
     path("preview/", views.preview_matching, name="preview_matching"),
+    path("jobs/<int:job_id>/", views.job_status, name="job_status"),
     path("download/", views.download_file, name="download_file"),
+    path(
+        "dictionaries/",
+        views.reference_dictionaries,
+        name="reference_dictionaries",
+    ),
+    path("api/match/", views.match_values, name="match_values"),
 ]
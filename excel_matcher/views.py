@@ -1,14 +1,26 @@
+import io
 import os
 import json
-import tempfile
+import zipfile
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
 from django.http import JsonResponse, HttpResponse, FileResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
-from .models import ProcessedFile
+from .models import MatchJob, ReferenceDictionary
+from .services.async_executor import run_cpu, run_io
 from .services.excel_service import ExcelService
+from .services.job_runner import ensure_started, submit_job
+from .services.matcher_cache import MatcherCache
+from .services.upload_store import UploadStore
 from urllib.parse import quote  # 使用 urllib.parse.quote 替代 urlquote
 
+# 下载文件的 Content-Type
+CONTENT_TYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".zip": "application/zip",
+}
+
 
 def index(request):
     """首页视图，显示文件上传表单"""
@@ -16,78 +28,155 @@ def index(request):
 
 
 @csrf_exempt
-def upload_file(request):
-    """处理Excel文件上传（不再本地保存，仅存内存）"""
-    if request.method == "POST" and request.FILES.get("file"):
-        excel_file = request.FILES["file"]
+async def upload_file(request):
+    """处理Excel文件上传（按内容摘要保存，会话中只记录摘要）"""
+    if request.method != "POST":
+        return JsonResponse({"error": "未找到上传的文件"})
+    try:
+        # 解析请求体、保存文件和读取表头在读写线程池中执行，不占用事件循环
+        digest, result = await run_io(_save_upload, request)
+    except Exception as e:
+        return JsonResponse({"error": str(e)})
+    if digest:
+        # session 中只保存摘要和文件名，并清除旧版本遗留的文件内容和本地路径
+        await sync_to_async(_update_session)(
+            request,
+            {"uploaded_file_digest": digest, "uploaded_file_name": result["filename"]},
+            removed=("uploaded_file_bytes", "uploaded_file_path"),
+        )
+    return JsonResponse(result)
 
-        # 检查文件扩展名
-        if not excel_file.name.endswith((".xlsx", ".xls")):
-            return JsonResponse({"error": "请上传Excel文件(.xlsx或.xls)"})
 
-        try:
-            # 读取文件内容到内存
-            file_bytes = excel_file.read()
-            filename = excel_file.name
-            # 用临时文件获取列名（Windows下需delete=False，手动删除）
-            with tempfile.NamedTemporaryFile(
-                delete=False, suffix=os.path.splitext(filename)[1]
-            ) as tmp:
-                tmp.write(file_bytes)
-                tmp.flush()
-                temp_path = tmp.name
-            try:
-                service = ExcelService()
-                columns = service.get_excel_columns(temp_path)
-            finally:
-                os.remove(temp_path)
-            # 存储文件内容和文件名到session
-            request.session["uploaded_file_bytes"] = (
-                file_bytes.hex()
-            )  # 存为16进制字符串，兼容session
-            request.session["uploaded_file_name"] = filename
-            # 清除旧的本地路径
-            if "uploaded_file_path" in request.session:
-                del request.session["uploaded_file_path"]
-            return JsonResponse(
-                {
-                    "success": True,
-                    "message": "文件上传成功",
-                    "columns": columns,
-                    "filename": filename,
-                }
+def _save_upload(request):
+    """
+    保存上传的文件并读取表头
+
+    Returns:
+        (摘要, 响应数据)；文件缺失或格式不支持时摘要为 None
+    """
+    excel_file = request.FILES.get("file")
+    if not excel_file:
+        return None, {"error": "未找到上传的文件"}
+
+    # 检查文件扩展名
+    if not excel_file.name.lower().endswith((".xlsx", ".xls", ".csv", ".parquet")):
+        return None, {"error": "请上传Excel文件(.xlsx或.xls)、CSV文件或Parquet文件"}
+
+    filename = excel_file.name
+    # 分块写入内容寻址存储，相同内容的文件只保存一份
+    store = UploadStore()
+    digest = store.save(excel_file)
+    file_path = store.get_path(digest, filename)
+
+    # 只读取表头，上传请求的耗时与文件大小无关
+    service = ExcelService()
+    summary = service.get_excel_summary(file_path)
+    # 多个工作表时另外返回每个工作表的列名，供选择工作表后更新列选择
+    sheet_columns = (
+        service.get_sheet_columns(file_path) if len(summary["sheets"]) > 1 else {}
+    )
+    return digest, {
+        "success": True,
+        "message": "文件上传成功",
+        "columns": summary["columns"],
+        "row_estimate": summary["row_estimate"],
+        "sheets": summary["sheets"],
+        "sheet_columns": sheet_columns,
+        "filename": filename,
+    }
+
+
+def _update_session(request, values, removed=()):
+    """写入并删除 session 中的键 (session 后端访问数据库，异步视图中通过 sync_to_async 调用)"""
+    request.session.update(values)
+    for key in removed:
+        request.session.pop(key, None)
+
+
+@csrf_exempt
+async def reference_dictionaries(request):
+    """
+    参照词典：GET 列出已构建的词典；
+    POST 上传标准值列表 (file、name，可选 column，默认第一列) 并构建为命名词典，同名词典会被重新构建
+    """
+    if request.method == "GET":
+        dictionaries = [
+            dictionary
+            async for dictionary in ReferenceDictionary.objects.values(
+                "name",
+                "source_name",
+                "source_column",
+                "standard_count",
+                "updated_at",
             )
-        except Exception as e:
-            return JsonResponse({"error": str(e)})
-    return JsonResponse({"error": "未找到上传的文件"})
+        ]
+        return JsonResponse({"success": True, "dictionaries": dictionaries})
+    if request.method != "POST":
+        return JsonResponse({"error": "无效的请求方法"})
+
+    try:
+        # 解析请求体、保存标准值列表和读取表头在读写线程池中执行
+        params, error = await run_io(_save_dictionary_upload, request)
+        if error:
+            return JsonResponse({"error": error})
+        # 读取、清理和预编译标准值在匹配线程池中执行，不占用事件循环
+        record = await run_cpu(ExcelService().build_reference_dictionary, **params)
+        return JsonResponse(
+            {
+                "success": True,
+                "message": f"参照词典 {record.name} 已构建",
+                "name": record.name,
+                "standard_count": record.standard_count,
+            }
+        )
+    except Exception as e:
+        return JsonResponse({"error": str(e)})
+
+
+def _save_dictionary_upload(request):
+    """
+    保存上传的标准值列表并确定标准值所在的列 (未指定时为第一列)
 
+    Returns:
+        (build_reference_dictionary 的参数, 错误信息)；出错时参数为 None
+    """
+    list_file = request.FILES.get("file")
+    name = request.POST.get("name", "").strip()
+    if not list_file:
+        return None, "未找到上传的文件"
+    if not name:
+        return None, "请填写参照词典名称"
+    if not list_file.name.lower().endswith((".xlsx", ".xls", ".csv", ".parquet")):
+        return None, "请上传Excel文件(.xlsx或.xls)、CSV文件或Parquet文件"
 
-def _ensure_uploaded_file_on_disk(request):
-    """如果上传文件未落盘，则写入临时文件并返回路径"""
-    file_path = request.session.get("uploaded_file_path")
-    if file_path and os.path.exists(file_path):
-        return file_path
-    file_hex = request.session.get("uploaded_file_bytes")
+    store = UploadStore()
+    file_path = store.get_path(store.save(list_file), list_file.name)
+    column = request.POST.get("column", "").strip()
+    if not column:
+        columns = ExcelService().get_excel_columns(file_path)
+        if not columns:
+            return None, "文件中没有可用的列"
+        column = columns[0]
+    return {
+        "name": name,
+        "filepath": file_path,
+        "column": column,
+        "source_name": list_file.name,
+    }, None
+
+
+def _get_uploaded_file_path(request):
+    """根据 session 中的摘要获取已上传文件的本地路径，找不到时返回 None"""
+    digest = request.session.get("uploaded_file_digest")
     filename = request.session.get("uploaded_file_name")
-    if file_hex and filename:
-        file_bytes = bytes.fromhex(file_hex)
-        # 只在 processed 目录下生成临时文件
-        processed_dir = os.path.join(settings.MEDIA_ROOT, "processed")
-        os.makedirs(processed_dir, exist_ok=True)
-        temp_path = os.path.join(processed_dir, f"temp_{filename}")
-        with open(temp_path, "wb") as f:
-            f.write(file_bytes)
-        # 存回session，后续可直接用
-        request.session["uploaded_file_path"] = temp_path
-        return temp_path
-    return None
+    if not digest or not filename:
+        return None
+    return UploadStore().get_path(digest, filename)
 
 
 @csrf_exempt
-def preview_matching(request):
+async def preview_matching(request):
     """预览Excel文件的匹配结果"""
-    file_path = None
-    is_temp_file = False
     if request.method == "POST":
         try:
             data = json.loads(request.body)
@@ -95,58 +184,57 @@ def preview_matching(request):
             threshold = int(data.get("threshold", 80))
             processing_mode = data.get("processing_mode", "SELF_LEARNING")
             reference_column = data.get("reference_column")
-            # 获取本地文件路径（如无则写入临时文件）
-            file_path = _ensure_uploaded_file_on_disk(request)
-            if file_path and os.path.basename(file_path).startswith("temp_"):
-                is_temp_file = True
-            if not file_path or not os.path.exists(file_path):
+            # 参照词典名称，指定时代替标准列
+            reference_dictionary = data.get("reference_dictionary") or None
+            # 要处理的工作表，未指定时只处理第一个工作表
+            sheets = data.get("sheets") or None
+            # 预览的时间预算 (秒)，未指定时使用 settings.EXCEL_PREVIEW_TIME_BUDGET
+            time_budget = data.get("time_budget")
+            if time_budget is not None:
+                time_budget = float(time_budget)
+            # 获取已上传文件的本地路径
+            file_path = await sync_to_async(_get_uploaded_file_path)(request)
+            if not file_path:
                 return JsonResponse({"error": "找不到上传的文件，请重新上传"})
             if not columns_to_match:
                 return JsonResponse({"error": "请选择至少一个需要匹配的列"})
-            if processing_mode == "REFERENCE" and (
-                not reference_column or reference_column not in columns_to_match
+            if (
+                processing_mode == "REFERENCE"
+                and not reference_dictionary
+                and (not reference_column or reference_column not in columns_to_match)
             ):
                 return JsonResponse(
-                    {"error": "参照标准匹配模式需要选择一个有效的标准列"}
+                    {"error": "参照标准匹配模式需要选择一个有效的标准列或参照词典"}
                 )
             service = ExcelService()
-            preview_results = service.preview_matches(
+            # 读取和匹配在匹配线程池中执行，超出并发上限的请求排队等待
+            preview_results = await run_cpu(
+                service.preview_matches,
                 file_path,
                 columns_to_match,
                 threshold,
                 processing_mode,
                 reference_column,
+                time_budget=time_budget,
+                sheets=sheets,
+                reference_dictionary=reference_dictionary,
             )
             return JsonResponse(
                 {
                     "success": True,
                     "message": "预览生成成功",
                     "preview_results": preview_results,
+                    "stats": service.stats,
                 }
             )
         except Exception as e:
             return JsonResponse({"error": f"生成预览时出错: {str(e)}"})
-        finally:
-            # 确保由 _ensure_uploaded_file_on_disk 创建的临时文件被删除
-            if is_temp_file and file_path and os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    # 从 session 中也移除路径，避免后续误用
-                    if (
-                        "uploaded_file_path" in request.session
-                        and request.session["uploaded_file_path"] == file_path
-                    ):
-                        del request.session["uploaded_file_path"]
-                except Exception:
-                    pass  # Ignore errors during cleanup
     return JsonResponse({"error": "无效的请求方法"})
 
 
 @csrf_exempt
-def process_file(request):
-    """处理Excel文件的模糊匹配"""
-    file_path = None
-    is_temp_file = False
+async def process_file(request):
+    """提交Excel文件的模糊匹配处理任务 (在后台执行)"""
     if request.method == "POST":
         try:
             data = json.loads(request.body)
@@ -154,83 +242,222 @@ def process_file(request):
             threshold = int(data.get("threshold", 80))
             processing_mode = data.get("processing_mode", "SELF_LEARNING")
             reference_column = data.get("reference_column")
-            # 获取本地文件路径（如无则写入临时文件）
-            file_path = _ensure_uploaded_file_on_disk(request)
-            if file_path and os.path.basename(file_path).startswith("temp_"):
-                is_temp_file = True
-            if not file_path or not os.path.exists(file_path):
+            # 参照词典名称，指定时代替标准列
+            reference_dictionary = data.get("reference_dictionary") or None
+            output_format = data.get("output_format", "xlsx")
+            # 要处理的工作表，未指定时只处理第一个工作表
+            sheets = data.get("sheets") or None
+            # 获取已上传文件的本地路径
+            file_path = await sync_to_async(_get_uploaded_file_path)(request)
+            if not file_path:
                 return JsonResponse({"error": "找不到上传的文件，请重新上传"})
             if not columns_to_match:
                 return JsonResponse({"error": "请选择至少一个需要匹配的列"})
-            if processing_mode == "REFERENCE" and (
-                not reference_column or reference_column not in columns_to_match
+            if (
+                processing_mode == "REFERENCE"
+                and not reference_dictionary
+                and (not reference_column or reference_column not in columns_to_match)
             ):
                 return JsonResponse(
-                    {"error": "参照标准匹配模式需要选择一个有效的标准列"}
+                    {"error": "参照标准匹配模式需要选择一个有效的标准列或参照词典"}
                 )
-            service = ExcelService()
-            processed_file_path = service.process_excel_file(
-                file_path,
-                columns_to_match,
-                threshold,
-                processing_mode,
-                reference_column,
-            )
-            ProcessedFile.objects.create(
-                original_file=file_path,  # 记录的是临时文件路径或原始路径
-                processed_file=processed_file_path,
+            if (
+                processing_mode == "REFERENCE"
+                and reference_dictionary
+                and not await ReferenceDictionary.objects.filter(
+                    name=reference_dictionary
+                ).aexists()
+            ):
+                return JsonResponse(
+                    {"error": f"参照词典 '{reference_dictionary}' 不存在"}
+                )
+            if output_format not in ExcelService.OUTPUT_FORMATS:
+                return JsonResponse({"error": f"不支持的输出格式: {output_format}"})
+            if sheets and len(set(sheets)) > 1 and output_format != "xlsx":
+                return JsonResponse({"error": "处理多个工作表时只支持 xlsx 输出格式"})
+            # 创建后台任务，前端轮询任务状态获取进度
+            job = await MatchJob.objects.acreate(
+                original_file=file_path,
+                original_name=await sync_to_async(request.session.get)(
+                    "uploaded_file_name", ""
+                ),
                 columns_processed=columns_to_match,
+                threshold=threshold,
                 processing_mode=processing_mode,
                 reference_column=reference_column,
+                output_format=output_format,
+                sheets=sheets,
+                reference_dictionary=reference_dictionary,
             )
-            request.session["processed_file_path"] = processed_file_path
+            submit_job(job)
+            await sync_to_async(_update_session)(request, {"match_job_id": job.pk})
             return JsonResponse(
                 {
                     "success": True,
-                    "message": "文件处理成功",
-                    "processed_file": os.path.basename(processed_file_path),
+                    "message": "处理任务已提交",
+                    "job_id": job.pk,
                 }
             )
         except Exception as e:
             return JsonResponse({"error": f"处理文件时出错: {str(e)}"})
-        finally:
-            # 确保由 _ensure_uploaded_file_on_disk 创建的临时文件被删除
-            if is_temp_file and file_path and os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    # 从 session 中也移除路径
-                    if (
-                        "uploaded_file_path" in request.session
-                        and request.session["uploaded_file_path"] == file_path
-                    ):
-                        del request.session["uploaded_file_path"]
-                except Exception:
-                    pass  # Ignore errors during cleanup
     return JsonResponse({"error": "无效的请求方法"})
 
 
-def download_file(request):
-    """下载处理后的Excel文件，文件名为源文件名+_processed，下载后立即删除文件"""
-    file_path = request.session.get("processed_file_path")
+@csrf_exempt
+async def match_values(request):
+    """
+    匹配接口：POST JSON {"values": [...], "column": 列名 或 "dictionary": 参照词典名称, "threshold": 80}，
+    返回每个值的标准化结果、分数和匹配方式 (exact/signature/fuzzy/none)；
+    匹配器常驻在进程内，不会每次请求都重新加载模式。
+    延迟目标 (p99 约 10 ms) 针对每批不超过 50 个值，耗时随批量大致线性增长
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "无效的请求方法"}, status=405)
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            return JsonResponse({"error": "请求体必须是 JSON 对象"}, status=400)
+        values = data.get("values")
+        if not isinstance(values, list):
+            return JsonResponse({"error": "values 必须是列表"}, status=400)
+        max_values = getattr(settings, "EXCEL_MATCH_API_MAX_VALUES", 1000)
+        if len(values) > max_values:
+            return JsonResponse(
+                {"error": f"单次最多匹配 {max_values} 个值"}, status=400
+            )
+        column = data.get("column")
+        dictionary = data.get("dictionary")
+        if any(
+            name is not None and not isinstance(name, str)
+            for name in (column, dictionary)
+        ):
+            return JsonResponse(
+                {"error": "column 和 dictionary 必须是字符串"}, status=400
+            )
+        if not column and not dictionary:
+            return JsonResponse({"error": "请指定列名或参照词典"}, status=400)
+        threshold = data.get("threshold", 80)
+        # bool 是 int 的子类，需要单独排除
+        if (
+            not isinstance(threshold, int)
+            or isinstance(threshold, bool)
+            or not 0 <= threshold <= 100
+        ):
+            return JsonResponse(
+                {"error": "threshold 必须是 0-100 之间的整数"}, status=400
+            )
+        # 小批量匹配耗时很短，在读写线程池中执行，不排在耗时的预览后面；
+        # 首次使用时加载模式或词典也在线程池中完成
+        matches = await run_io(
+            MatcherCache().match,
+            values,
+            threshold,
+            column=column,
+            dictionary=dictionary,
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(
+        {
+            "success": True,
+            "results": [
+                {
+                    "value": value,
+                    "standardized": standard,
+                    "changed": changed,
+                    "score": score,
+                    "match_type": match_type,
+                }
+                for value, (standard, changed, score, match_type) in zip(
+                    values, matches
+                )
+            ],
+        }
+    )
+
+
+async def job_status(request, job_id):
+    """查询后台处理任务的状态和进度"""
+    # 进程重启后第一次轮询时恢复遗留任务，等待中的任务不会一直无人处理
+    ensure_started()
+    job = await MatchJob.objects.filter(pk=job_id).afirst()
+    if job is None:
+        return JsonResponse({"error": "找不到处理任务"}, status=404)
+    return JsonResponse(
+        {
+            "success": True,
+            "job_id": job.pk,
+            "status": job.status,
+            "progress": job.progress,
+            "message": job.message,
+            "error": job.error,
+            "processed_file": (
+                os.path.basename(job.processed_file) if job.processed_file else None
+            ),
+            "stats": job.stats,
+        }
+    )
+
+
+async def download_file(request):
+    """
+    下载处理后的文件，文件名为源文件名+_processed，下载后立即删除文件
+    CSV/Parquet 结果与其变化标记文件一起打包为 zip 下载
+    """
+    file_path = None
+    job_id = await sync_to_async(request.session.get)("match_job_id")
+    if job_id:
+        job = await MatchJob.objects.filter(
+            pk=job_id, status=MatchJob.STATUS_SUCCESS
+        ).afirst()
+        file_path = job.processed_file if job else None
     if not file_path or not os.path.exists(file_path):
         return HttpResponse("找不到处理后的文件，请重新处理", status=404)
-    original_filename = request.session.get("uploaded_file_name", "result.xlsx")
-    name, ext = os.path.splitext(original_filename)
-    download_filename = f"{name}_processed{ext}"
-    # 先读取文件内容到内存
-    with open(file_path, "rb") as f:
-        file_data = f.read()
-    # 删除本地文件
-    try:
-        os.remove(file_path)
-    except Exception:
-        pass
+    original_filename = await sync_to_async(request.session.get)(
+        "uploaded_file_name", "result.xlsx"
+    )
+    # 读取 (打包) 和删除结果文件在读写线程池中执行
+    file_data, download_filename = await run_io(
+        _read_result, file_path, os.path.splitext(original_filename)[0]
+    )
+    ext = os.path.splitext(download_filename)[1]
     response = HttpResponse(
         file_data,
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        content_type=CONTENT_TYPES.get(ext, "application/octet-stream"),
     )
     # 对文件名进行 URL 编码以提高兼容性
     encoded_filename = quote(download_filename)  # 使用 quote 替代 urlquote
     # 设置 Content-Disposition，使用编码后的文件名
     response["Content-Disposition"] = f'attachment; filename="{encoded_filename}"'
     return response
+
+
+def _read_result(file_path, name):
+    """
+    读取结果文件 (有变化标记文件时一起打包为 zip) 并删除本地文件
+
+    Returns:
+        (文件内容, 下载文件名)
+    """
+    # 扩展名以结果文件为准
+    ext = os.path.splitext(file_path)[1]
+    download_filename = f"{name}_processed{ext}"
+    changes_path = ExcelService.changes_path(file_path)
+    # 先读取文件内容到内存
+    if os.path.exists(changes_path):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.write(file_path, download_filename)
+            archive.write(changes_path, f"{name}_processed_changes{ext}")
+        file_data = buffer.getvalue()
+        download_filename = f"{name}_processed.zip"
+    else:
+        with open(file_path, "rb") as f:
+            file_data = f.read()
+    # 删除本地文件
+    for path in (file_path, changes_path):
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+    return file_data, download_filename
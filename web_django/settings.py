@@ -127,3 +127,54 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Excel 模糊匹配设置
+# 上传文件按内容摘要保存在 MEDIA_ROOT/uploads/，超过该时间 (秒) 未访问的文件会被清理
+EXCEL_UPLOAD_TTL = 24 * 60 * 60
+# 解析后的 DataFrame 进程内缓存上限 (字节)，磁盘缓存保存在 MEDIA_ROOT/cache/frames/
+EXCEL_FRAME_CACHE_BYTES = 256 * 1024 * 1024
+# 处理结果使用 write_only 工作簿单次流式写出并直接高亮；设为 False 时先用 pandas 写出再重新加载添加高亮
+EXCEL_STREAMING_WRITE = True
+# 后台处理任务的执行方式："thread" 在 Web 进程的线程池中执行；"worker" 由 manage.py run_match_worker 执行
+EXCEL_JOB_RUNNER = "thread"
+# "thread" 模式下的并发任务数
+EXCEL_JOB_WORKERS = 2
+# 多列匹配时进程池的子进程数，为 None 时使用全部 CPU 核心；设为 1 时不使用进程池
+EXCEL_MATCHER_WORKERS = None
+# 行数 × 待匹配列数达到该值时才使用进程池并行匹配各列
+EXCEL_PARALLEL_MIN_CELLS = 200_000
+# 进程池的启动方式 ("spawn" / "fork" / "forkserver")
+EXCEL_MATCHER_MP_CONTEXT = "spawn"
+# 预览匹配的时间预算 (秒)，超出后按已匹配的样本估计修改数；为 0 时不限制
+EXCEL_PREVIEW_TIME_BUDGET = 0.8
+# 预览时每列最多匹配的唯一值数，超出时高频值全部匹配、其余随机抽样；为 0 时不限制
+EXCEL_PREVIEW_SAMPLE_SIZE = 50_000
+# 有时间预算时预览最多解析的数据行数 (未缓存的工作表)，超出部分不读取；为 0 时完整读取
+EXCEL_PREVIEW_READ_ROWS = 10_000
+# 模糊匹配的候选筛选方式："primary_key" 只与开头字母数字序列相同的模式比较；
+# "qgram" 用 q-gram 倒排索引筛选候选，主键有拼写错误时也能匹配 (候选通常更多，速度较慢)；
+# 预编译的参照词典总是按主键筛选
+EXCEL_MATCHER_BLOCKING = "primary_key"
+# 重新构建或删除参照词典后，旧的预编译目录 (MEDIA_ROOT/dictionaries/) 保留的时间 (秒)，
+# 正在运行的任务在此期间仍可加载旧词典
+EXCEL_DICTIONARY_TTL = 60 * 60
+# .xlsx 文件的数据行数达到该值时改用流式处理 (分块读取、直接写出，内存占用与文件大小无关)；为 0 时不使用
+EXCEL_STREAMING_READ_ROWS = 200_000
+# 匹配接口 (/excel/api/match/) 单次请求最多的值数
+EXCEL_MATCH_API_MAX_VALUES = 1000
+# 匹配接口在每个进程中常驻的匹配器数 (按列名或参照词典)，超出时淘汰最久未使用的
+EXCEL_MATCHER_CACHE_ENTRIES = 64
+# 每个进程中缓存已编译模式的列数，超出时淘汰最久未使用的列
+EXCEL_PATTERN_CACHE_ENTRIES = 128
+# 异步视图中执行预览匹配的线程数，超出的请求排队等待
+EXCEL_ASYNC_WORKERS = 4
+# 异步视图中保存上传文件、读取处理结果的线程数，超出的请求排队等待
+EXCEL_ASYNC_IO_WORKERS = 16
+
+# 预览和处理的分阶段耗时 (读取、加载模式、学习、匹配、写出、高亮) 和匹配计数以 INFO 级别写入 excel_matcher 日志
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {"excel_matcher": {"handlers": ["console"], "level": "INFO"}},
+}